@@ -1,21 +1,36 @@
 
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select, union_all, literal, null, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt
 from passlib.context import CryptContext
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+import hashlib
 import os
+import time
 
 from . import models
-from .database import get_db
+from .routing import get_db
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'farmachelo-secret-key-2025')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
+# Entradas del LRU de tokens verificados por worker (0 lo desactiva)
+JWT_TOKEN_CACHE_SIZE = int(os.environ.get('JWT_TOKEN_CACHE_SIZE', '10000'))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Coste de bcrypt. min = max = default: al cambiarlo, los hashes viejos se rehacen en el siguiente login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 class OptionalHTTPBearer(HTTPBearer):
     async def __call__(self, request: Request):
@@ -25,6 +40,60 @@ class OptionalHTTPBearer(HTTPBearer):
 
 security = OptionalHTTPBearer()
 
+class Principal(NamedTuple):
+    """Fila de users o admin_users con el mismo formato; role indica la tabla de origen"""
+    id: str
+    email: str
+    name: str
+    phone: Optional[str]
+    address: Optional[str]
+    password: str
+    is_verified: bool
+    is_admin: bool
+    created_at: datetime
+    role: str
+
+    @property
+    def model(self):
+        return models.AdminUser if self.role == "admin" else models.User
+
+def _principal_union(user_filter, admin_filter):
+    users = select(
+        models.User.id, models.User.email, models.User.name, models.User.phone, models.User.address,
+        models.User.password, models.User.is_verified, models.User.is_admin, models.User.created_at,
+        literal("user").label("role")
+    ).where(user_filter)
+    admins = select(
+        models.AdminUser.id, models.AdminUser.email, models.AdminUser.name, null().label("phone"), null().label("address"),
+        models.AdminUser.password, true().label("is_verified"), true().label("is_admin"), models.AdminUser.created_at,
+        literal("admin").label("role")
+    ).where(admin_filter)
+    return union_all(users, admins)
+
+async def _load_principals(db: AsyncSession, query) -> List[Principal]:
+    result = await db.execute(query)
+    return [
+        Principal(**{**row._asdict(), "is_verified": bool(row.is_verified), "is_admin": bool(row.is_admin)})
+        for row in result.all()
+    ]
+
+async def get_principal_by_email(db: AsyncSession, email: str) -> Optional[Principal]:
+    """
+    Una consulta (UNION ALL sobre los índices únicos de email) para users y admin_users.
+    Si el email está en las dos tablas gana users, como en el login anterior.
+    """
+    principals = await _load_principals(db, _principal_union(models.User.email == email, models.AdminUser.email == email))
+    principals.sort(key=lambda principal: principal.role != "user")
+    return principals[0] if principals else None
+
+async def get_principal_by_id(db: AsyncSession, user_id: str, admin_only: bool = False) -> Optional[Principal]:
+    """Una consulta por clave primaria sobre users y admin_users"""
+    principals = await _load_principals(db, _principal_union(models.User.id == user_id, models.AdminUser.id == user_id))
+    if admin_only:
+        principals = [principal for principal in principals if principal.is_admin]
+    principals.sort(key=lambda principal: principal.role != "user")
+    return principals[0] if principals else None
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -39,55 +108,98 @@ def create_jwt_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
-) -> str:
-    if credentials is None:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+class VerifiedTokenCache:
+    """LRU acotado de JWT ya verificados: sha256(token) -> (user_id, exp)"""
+
+    def __init__(self, max_size: int = JWT_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, token_hash: str) -> Optional[str]:
+        entry = self._entries.get(token_hash)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, exp = entry
+        if exp <= time.time():
+            # exp se respeta igual que al decodificar: fuera de la caché y a verificar de nuevo
+            del self._entries[token_hash]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token_hash)
+        self.hits += 1
+        return user_id
+
+    def put(self, token_hash: str, user_id: str, exp: float):
+        if self.max_size <= 0:
+            return
+        self._entries[token_hash] = (user_id, exp)
+        self._entries.move_to_end(token_hash)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+token_cache = VerifiedTokenCache()
+
+def decode_token(token: str) -> str:
+    """user_id de un JWT válido; la firma HMAC solo se verifica si el token no está en la caché"""
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    user_id = token_cache.get(token_hash)
+    if user_id is not None:
+        return user_id
     
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    token_cache.put(token_hash, user_id, float(payload.get("exp", float("inf"))))
+    return user_id
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> str:
+    # Sin sesión de BD: autenticar no saca ninguna conexión del pool
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return decode_token(credentials.credentials)
 
 async def get_current_admin(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> models.User:
     if credentials is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        if user and user.is_admin:
-            return user
-        
-        admin_user = db.query(models.AdminUser).filter(models.AdminUser.id == user_id).first()
-        if admin_user:
-            return models.User(
-                id=admin_user.id,
-                email=admin_user.email,
-                name=admin_user.name,
-                is_verified=True,
-                is_admin=True,
-                created_at=admin_user.created_at
-            )
-            
-        raise HTTPException(status_code=403, detail="Admin privileges required")
-        
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = decode_token(credentials.credentials)
+    principal = await get_principal_by_id(db, user_id, admin_only=True)
+    if principal:
+        return models.User(
+            id=principal.id,
+            email=principal.email,
+            name=principal.name,
+            phone=principal.phone,
+            address=principal.address,
+            is_verified=principal.is_verified,
+            is_admin=True,
+            created_at=principal.created_at
+        )
+    
+    raise HTTPException(status_code=403, detail="Admin privileges required")
@@ -0,0 +1,37 @@
+# backfill_order_items.py
+import sync_mode
+sync_mode.use_sync_engine()
+
+from sqlalchemy import text
+from database import SessionLocal
+
+def backfill_order_items():
+    """Añade name/unit_price a order_items y copia los valores actuales del producto en las filas antiguas"""
+    db = SessionLocal()
+    try:
+        columns = {row[0] for row in db.execute(text("SHOW COLUMNS FROM order_items"))}
+        if "name" not in columns:
+            print("➕ Añadiendo columna order_items.name...")
+            db.execute(text("ALTER TABLE order_items ADD COLUMN name VARCHAR(255) NULL"))
+        if "unit_price" not in columns:
+            print("➕ Añadiendo columna order_items.unit_price...")
+            # Centavos, como products.price (migrations/0002_money_cents.sql)
+            db.execute(text("ALTER TABLE order_items ADD COLUMN unit_price BIGINT NULL"))
+
+        result = db.execute(text("""
+            UPDATE order_items oi
+            JOIN products p ON p.id = oi.product_id
+            SET oi.name = COALESCE(oi.name, p.name),
+                oi.unit_price = COALESCE(oi.unit_price, p.price)
+            WHERE oi.name IS NULL OR oi.unit_price IS NULL
+        """))
+        db.commit()
+        print(f"✅ {result.rowcount} líneas de pedido completadas")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill_order_items()
@@ -0,0 +1,102 @@
+# benchmark_ids.py
+# Inserción masiva de pedidos con ids uuid4 frente a UUIDv7 (ids.new_uuid) en tablas temporales.
+#   python benchmark_ids.py            (BENCH_ORDERS, BENCH_ITEMS_PER_ORDER y BENCH_BATCH para ajustar)
+from datetime import datetime, timezone
+import os
+import time
+import timeit
+import uuid
+
+import sync_mode
+sync_mode.use_sync_engine()
+
+from sqlalchemy import text
+from database import engine, MYSQL_DB
+from ids import new_uuid
+
+BENCH_ORDERS = int(os.environ.get('BENCH_ORDERS', '100000'))
+BENCH_ITEMS_PER_ORDER = int(os.environ.get('BENCH_ITEMS_PER_ORDER', '3'))
+BENCH_BATCH = int(os.environ.get('BENCH_BATCH', '1000'))
+
+GENERATORS = {
+    "uuid4": uuid.uuid4,
+    "uuidv7": new_uuid,
+}
+
+def _create_tables(connection, suffix):
+    # Mismo esquema que orders/order_items tras la migración a BINARY(16)
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS bench_order_items_{suffix}, bench_orders_{suffix}")
+    connection.exec_driver_sql(f"""
+        CREATE TABLE bench_orders_{suffix} (
+            id BINARY(16) NOT NULL PRIMARY KEY,
+            user_id BINARY(16) NOT NULL,
+            total_amount DOUBLE NOT NULL,
+            status VARCHAR(50),
+            created_at DATETIME NOT NULL,
+            INDEX ix_user_created_at (user_id, created_at DESC, id DESC)
+        ) ENGINE=InnoDB
+    """)
+    connection.exec_driver_sql(f"""
+        CREATE TABLE bench_order_items_{suffix} (
+            id BINARY(16) NOT NULL PRIMARY KEY,
+            order_id BINARY(16) NOT NULL,
+            product_id BINARY(16) NOT NULL,
+            quantity INT NOT NULL,
+            INDEX ix_order_id (order_id)
+        ) ENGINE=InnoDB
+    """)
+
+def _insert_orders(connection, suffix, generate):
+    users = [uuid.uuid4().bytes for _ in range(1000)]
+    products = [uuid.uuid4().bytes for _ in range(200)]
+    started = time.perf_counter()
+    for offset in range(0, BENCH_ORDERS, BENCH_BATCH):
+        orders, items = [], []
+        for index in range(offset, min(offset + BENCH_BATCH, BENCH_ORDERS)):
+            order_id = generate().bytes
+            orders.append((order_id, users[index % len(users)], 25000.0, "pending", datetime.now(timezone.utc)))
+            for line in range(BENCH_ITEMS_PER_ORDER):
+                items.append((generate().bytes, order_id, products[(index + line) % len(products)], 1))
+        # INSERT multi-fila (executemany de PyMySQL) y un commit por lote
+        connection.exec_driver_sql(
+            f"INSERT INTO bench_orders_{suffix} (id, user_id, total_amount, status, created_at) "
+            f"VALUES (%s, %s, %s, %s, %s)", orders
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO bench_order_items_{suffix} (id, order_id, product_id, quantity) VALUES (%s, %s, %s, %s)", items
+        )
+        connection.commit()
+    return time.perf_counter() - started
+
+def _table_sizes(connection, suffix):
+    sizes = {}
+    for table in (f"bench_orders_{suffix}", f"bench_order_items_{suffix}"):
+        connection.exec_driver_sql(f"ANALYZE TABLE {table}").all()
+        data, index = connection.execute(text("""
+            SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table
+        """), {"schema": MYSQL_DB, "table": table}).one()
+        sizes[table] = (data, index)
+    return sizes
+
+def benchmark():
+    print(f"🧪 {BENCH_ORDERS} pedidos x {BENCH_ITEMS_PER_ORDER} líneas, lotes de {BENCH_BATCH}")
+    for name, generate in GENERATORS.items():
+        cost = timeit.timeit(lambda: str(generate()), number=100000) / 100000 * 1e6
+        print(f"⏱️ {name}: {cost:.2f} µs por id generado")
+
+    with engine.connect() as connection:
+        for name, generate in GENERATORS.items():
+            _create_tables(connection, name)
+            try:
+                elapsed = _insert_orders(connection, name, generate)
+                rows = BENCH_ORDERS * (1 + BENCH_ITEMS_PER_ORDER)
+                print(f"✅ {name}: {rows} filas en {elapsed:.2f} s ({rows / elapsed:,.0f} filas/s, "
+                      f"{BENCH_ORDERS / elapsed:,.0f} pedidos/s)")
+                for table, (data, index) in _table_sizes(connection, name).items():
+                    print(f"    {table:32} datos {data / 1024 / 1024:8.2f} MB   índices {index / 1024 / 1024:8.2f} MB")
+            finally:
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS bench_order_items_{name}, bench_orders_{name}")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,224 @@
+"""Caché compartida entre workers (Redis) con un sustituto en memoria e invalidación por pub/sub."""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from itertools import chain
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+from . import models, catalog_events
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis es opcional: sin él se usa la caché en memoria
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory').lower()
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+CACHE_PREFIX = os.environ.get('CACHE_PREFIX', 'farmachelo:')
+CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', '300'))
+INVALIDATION_CHANNEL = "invalidate"
+
+# Identifica a este worker para ignorar sus propios mensajes de invalidación
+WORKER_ID = uuid.uuid4().hex
+
+MessageHandler = Callable[[str], None]
+
+class CacheBackend:
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: int = CACHE_DEFAULT_TTL):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str):
+        raise NotImplementedError
+
+    async def listen(self, channel: str, handler: MessageHandler):
+        """Bloquea entregando cada mensaje del canal a handler"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """Sustituto local (un proceso). Las instancias que comparten `broker` simulan varios workers."""
+
+    def __init__(self, broker: Optional[Dict[str, List[asyncio.Queue]]] = None):
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._broker = broker if broker is not None else {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int = CACHE_DEFAULT_TTL):
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        for queue in self._broker.get(channel, []):
+            queue.put_nowait(message)
+
+    async def listen(self, channel: str, handler: MessageHandler):
+        queue: asyncio.Queue = asyncio.Queue()
+        self._broker.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                handler(await queue.get())
+        finally:
+            self._broker[channel].remove(queue)
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str = REDIS_URL, prefix: str = CACHE_PREFIX):
+        if aioredis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: int = CACHE_DEFAULT_TTL):
+        await self._client.set(self._prefix + key, value, ex=ttl)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*(self._prefix + key for key in keys))
+
+    async def publish(self, channel: str, message: str):
+        await self._client.publish(self._prefix + channel, message)
+
+    async def listen(self, channel: str, handler: MessageHandler):
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self._prefix + channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        handler(message["data"].decode())
+            except (OSError, aioredis.RedisError) as e:
+                logger.error(f"Redis pub/sub disconnected, retrying: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def close(self):
+        await self._client.close()
+
+def create_cache_backend() -> CacheBackend:
+    if CACHE_BACKEND == "redis":
+        return RedisCacheBackend()
+    return MemoryCacheBackend()
+
+cache_backend = create_cache_backend()
+
+# ==================== LECTURAS CACHEADAS ====================
+
+async def cached_json(key: str, loader: Callable[[], Awaitable[object]], ttl: int = CACHE_DEFAULT_TTL):
+    """Devuelve el valor compartido de key o lo carga con loader y lo guarda. None no se guarda."""
+    try:
+        raw = await cache_backend.get(key)
+    except Exception as e:
+        logger.error(f"Cache read failed for {key}: {str(e)}")
+        raw = None
+    if raw is not None:
+        return json.loads(raw)
+    value = await loader()
+    if value is not None:
+        await store_json(key, value, ttl)
+    return value
+
+async def store_json(key: str, value, ttl: int = CACHE_DEFAULT_TTL):
+    try:
+        await cache_backend.set(key, json.dumps(value, default=str).encode(), ttl)
+    except Exception as e:
+        logger.error(f"Cache write failed for {key}: {str(e)}")
+
+def product_key(product_id: str) -> str:
+    return f"product:{product_id}"
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+CATALOG_KEY = "catalog"
+
+# ==================== INVALIDACIÓN ENTRE WORKERS ====================
+
+_listener: Optional[asyncio.Task] = None
+_background_tasks = set()
+
+def _run_in_background(coro):
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Sin event loop (scripts síncronos): no hay workers que avisar
+        coro.close()
+        return
+    task = loop.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _broadcast_product_changes(changes: List[catalog_events.ProductChange]):
+    try:
+        await cache_backend.delete(CATALOG_KEY, *(product_key(change.id) for change in changes))
+        await cache_backend.publish(INVALIDATION_CHANNEL, json.dumps({
+            "origin": WORKER_ID,
+            "products": [change._asdict() for change in changes],
+        }))
+    except Exception as e:
+        logger.error(f"Error broadcasting catalog invalidation: {str(e)}")
+
+def _handle_invalidation(message: str):
+    payload = json.loads(message)
+    if payload.get("origin") == WORKER_ID:
+        return
+    changes = [catalog_events.ProductChange(**change) for change in payload.get("products", [])]
+    if changes:
+        catalog_events.publish(changes)
+        # Borra también copias que otro worker pudo escribir justo antes del commit
+        _run_in_background(cache_backend.delete(*(product_key(change.id) for change in changes)))
+
+def ensure_listening():
+    """Arranca (una vez por worker) la escucha de invalidaciones de otros workers"""
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(
+            cache_backend.listen(INVALIDATION_CHANNEL, _handle_invalidation)
+        )
+
+catalog_events.set_broadcaster(lambda changes: _run_in_background(_broadcast_product_changes(changes)))
+
+@event.listens_for(Session, "after_flush")
+def _track_user_changes(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (models.User, models.AdminUser)):
+            session.info.setdefault("user_cache_keys", set()).add(user_key(obj.id))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users_on_commit(session):
+    keys = session.info.pop("user_cache_keys", None)
+    if keys:
+        _run_in_background(cache_backend.delete(*keys))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_changes(session):
+    session.info.pop("user_cache_keys", None)
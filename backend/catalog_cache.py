@@ -0,0 +1,145 @@
+"""Caché por worker del catálogo activo: snapshot versionado con TTL, invalidación y reconstrucción única."""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import bisect
+import os
+import time
+
+from . import models, schemas, catalog_events
+from .http_cache import make_etag
+from .cache_backend import CATALOG_KEY, cached_json, store_json, ensure_listening
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '60'))
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    built_at: float
+    products: List[schemas.ProductResponse]
+    keys: List[Tuple[str, str]]
+    by_id: Dict[str, schemas.ProductResponse]
+    by_category: Dict[str, Tuple[List[schemas.ProductResponse], List[Tuple[str, str]]]]
+    etag: str
+    product_etags: Dict[str, str]
+
+    def page(
+        self,
+        category: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+    ) -> Tuple[List[schemas.ProductResponse], bool, int]:
+        """Página ordenada por (name, id) a partir de un cursor keyset: (productos, hay más, total)"""
+        if category:
+            products, keys = self.by_category.get(category, ([], []))
+        else:
+            products, keys = self.products, self.keys
+        start = bisect.bisect_right(keys, after) if after else 0
+        page = products[start:start + limit]
+        return page, start + limit < len(products), len(products)
+
+def build_snapshot(version: int, products: List[schemas.ProductResponse]) -> CatalogSnapshot:
+    products = sorted(products, key=lambda product: (product.name, product.id))
+    by_category: Dict[str, Tuple[List[schemas.ProductResponse], List[Tuple[str, str]]]] = {}
+    for product in products:
+        category_products, category_keys = by_category.setdefault(product.category, ([], []))
+        category_products.append(product)
+        category_keys.append((product.name, product.id))
+    # ETag por contenido: igual en todos los workers mientras el catálogo no cambie
+    product_etags = {product.id: make_etag(product.model_dump_json()) for product in products}
+    return CatalogSnapshot(
+        version=version,
+        built_at=time.monotonic(),
+        products=products,
+        keys=[(product.name, product.id) for product in products],
+        by_id={product.id: product for product in products},
+        by_category=by_category,
+        etag=make_etag(*product_etags.values()),
+        product_etags=product_etags,
+    )
+
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 1
+        self._lock = asyncio.Lock()
+        self._bypass_shared = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.rebuilds = 0
+        self.invalidations = 0
+        self.last_rebuild_ms = 0.0
+
+    def invalidate(self):
+        self._version += 1
+        # La copia compartida puede ser anterior al cambio: la próxima reconstrucción lee MySQL
+        self._bypass_shared = True
+        self.invalidations += 1
+
+    def peek(self) -> Optional[CatalogSnapshot]:
+        """Snapshot vigente sin contar acceso ni reconstruir"""
+        return self._snapshot if self._fresh() else None
+
+    async def _load_from_db(self, db: AsyncSession) -> List[dict]:
+        result = await db.execute(select(models.Product).filter(models.Product.active == True))
+        return [schemas.ProductResponse.from_orm(row).model_dump(mode="json") for row in result.scalars().all()]
+
+    def _fresh(self) -> bool:
+        snapshot = self._snapshot
+        return (
+            snapshot is not None
+            and snapshot.version == self._version
+            and time.monotonic() - snapshot.built_at < self.ttl
+        )
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        ensure_listening()
+        if self._fresh():
+            self.hits += 1
+            return self._snapshot
+        # Single-flight: solo quien obtiene el lock consulta MySQL; el resto reutiliza su resultado
+        async with self._lock:
+            if self._fresh():
+                self.coalesced += 1
+                return self._snapshot
+            self.misses += 1
+            version = self._version
+            bypass_shared, self._bypass_shared = self._bypass_shared, False
+            started = time.perf_counter()
+            if bypass_shared:
+                # Justo después de un cambio una réplica puede ir atrasada: se lee del primario
+                use_primary = getattr(db, "use_primary", None)
+                if use_primary is not None:
+                    await use_primary()
+                rows = await self._load_from_db(db)
+                await store_json(CATALOG_KEY, rows, int(self.ttl))
+            else:
+                rows = await cached_json(CATALOG_KEY, lambda: self._load_from_db(db), int(self.ttl))
+            snapshot = build_snapshot(version, [schemas.ProductResponse.model_validate(row) for row in rows])
+            self.last_rebuild_ms = (time.perf_counter() - started) * 1000
+            self.rebuilds += 1
+            self._snapshot = snapshot
+            return snapshot
+
+    def stats(self) -> Dict[str, object]:
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "rebuilds": self.rebuilds,
+            "invalidations": self.invalidations,
+            "version": self._version,
+            "products": len(snapshot.products) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - snapshot.built_at, 3) if snapshot else None,
+            "ttl_seconds": self.ttl,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 3),
+        }
+
+catalog_cache = CatalogCache()
+
+@catalog_events.subscribe
+def _invalidate_on_product_change(changes):
+    catalog_cache.invalidate()
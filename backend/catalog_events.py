@@ -0,0 +1,77 @@
+"""Notificación de cambios de productos confirmados (commit) a los índices y cachés del catálogo."""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+from itertools import chain
+import logging
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+class ProductChange(NamedTuple):
+    id: str
+    name: Optional[str]
+    category: Optional[str]
+    active: bool
+    deleted: bool
+    # Solo cambió el stock (UPDATE en bloque de inventory): nombre y categoría no se conocen
+    stock_only: bool = False
+
+_subscribers: List[Callable[[List[ProductChange]], None]] = []
+_broadcaster: Optional[Callable[[List[ProductChange]], None]] = None
+
+def subscribe(callback: Callable[[List[ProductChange]], None]):
+    """Registra un callback que recibe los productos cambiados en cada commit"""
+    _subscribers.append(callback)
+    return callback
+
+def set_broadcaster(callback: Callable[[List[ProductChange]], None]):
+    """Reenvía a los demás workers los cambios confirmados en este proceso"""
+    global _broadcaster
+    _broadcaster = callback
+
+def publish(changes: List[ProductChange]):
+    for callback in _subscribers:
+        try:
+            callback(changes)
+        except Exception as e:
+            logger.error(f"Error applying catalog change: {str(e)}")
+
+def track_stock_changes(session, product_ids: Iterable[str]):
+    """
+    Registra productos cuyo stock cambió con un UPDATE en bloque (Core), que no pasa por
+    after_flush; se publican con el commit igual que los cambios del ORM
+    """
+    pending: Dict[str, ProductChange] = session.info.setdefault("product_changes", {})
+    for product_id in product_ids:
+        pending.setdefault(product_id, ProductChange(
+            id=product_id, name=None, category=None, active=True, deleted=False, stock_only=True
+        ))
+
+@event.listens_for(Session, "after_flush")
+def _track_product_changes(session, flush_context):
+    pending: Dict[str, ProductChange] = session.info.setdefault("product_changes", {})
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, models.Product):
+            continue
+        deleted = obj in session.deleted
+        pending[obj.id] = ProductChange(
+            id=obj.id,
+            name=obj.name,
+            category=obj.category,
+            active=bool(obj.active) if obj.active is not None else True,
+            deleted=deleted,
+        )
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    changes = session.info.pop("product_changes", None)
+    if changes:
+        publish(list(changes.values()))
+        if _broadcaster is not None:
+            _broadcaster(list(changes.values()))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("product_changes", None)
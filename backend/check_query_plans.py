@@ -0,0 +1,224 @@
+# check_query_plans.py
+# Uso (desde la raíz del repositorio): python -m backend.check_query_plans
+# Ejecuta los endpoints y funciones reales (routers, inventory, idempotency) dentro de una transacción
+# que se deshace al final, captura con before_cursor_execute cada sentencia que envían a MySQL y hace
+# EXPLAIN de las SELECT/UPDATE/DELETE capturadas: no hay consultas copiadas a mano que puedan desfasarse.
+# Falla con cualquier recorrido completo que no esté en FULL_SCAN_ALLOWLIST.
+import asyncio
+import sys
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from backend import auth, idempotency, inventory, models, schemas
+from backend.catalog_cache import catalog_cache
+from backend.ids import new_id
+from backend.routers import authentication, cart, orders, payments, products
+
+EXPLAINED_STATEMENTS = ("SELECT", "UPDATE", "DELETE", "WITH")
+IDEMPOTENCY_ENDPOINT = "check_query_plans"
+# Únicos recorridos completos aceptados, (escenario, tabla) -> motivo; cualquier otro type=ALL falla
+FULL_SCAN_ALLOWLIST: Dict[Tuple[str, str], str] = {
+    ("products: catálogo", "products"): "el snapshot del catálogo carga todos los productos activos",
+}
+
+class Fixture(NamedTuple):
+    user_id: str
+    email: str
+    product_id: str
+    order_id: str
+
+class CapturedStatement(NamedTuple):
+    scenario: str
+    statement: str
+    parameters: object
+
+async def _pending_order(db: AsyncSession, fixture: Fixture) -> str:
+    """Pedido pendiente con una línea y su reserva activa, como lo deja el checkout"""
+    order_id = new_id()
+    db.add(models.Order(id=order_id, user_id=fixture.user_id, total_amount=1000, status="pending"))
+    await db.flush()
+    db.add(models.OrderItem(
+        id=new_id(), order_id=order_id, product_id=fixture.product_id, quantity=1, name="Query plans", unit_price=1000
+    ))
+    db.add(models.StockReservation(
+        id=new_id(), order_id=order_id, product_id=fixture.product_id, quantity=1, status="active",
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=inventory.STOCK_RESERVATION_TTL)
+    ))
+    await db.commit()
+    return order_id
+
+async def _create_fixture(db: AsyncSession) -> Fixture:
+    now = datetime.now(timezone.utc)
+    user_id, product_id = new_id(), new_id()
+    email = f"query-plans-{user_id}@example.com"
+    db.add(models.User(id=user_id, email=email, name="Query plans", password="x"))
+    db.add(models.Product(
+        id=product_id, name="Query plans", description="", price=1000, category="over_counter", stock=100
+    ))
+    # Una clave vencida (barrido) y otra abandonada en curso (toma de control en idempotency.run)
+    db.add(models.IdempotencyKey(
+        id=idempotency._record_id(user_id, IDEMPOTENCY_ENDPOINT, "expired"), user_id=user_id,
+        endpoint=IDEMPOTENCY_ENDPOINT, request_hash="0" * 64, status="completed", status_code=200,
+        response_body="{}", created_at=now - timedelta(days=2), expires_at=now - timedelta(days=1)
+    ))
+    db.add(models.IdempotencyKey(
+        id=idempotency._record_id(user_id, IDEMPOTENCY_ENDPOINT, "stale"), user_id=user_id,
+        endpoint=IDEMPOTENCY_ENDPOINT, request_hash="0" * 64, status="in_progress",
+        created_at=now - timedelta(hours=1), expires_at=now + timedelta(days=1)
+    ))
+    await db.commit()
+    fixture = Fixture(user_id, email, product_id, "")
+    fixture = fixture._replace(order_id=await _pending_order(db, fixture))
+    # El snapshot del catálogo se relee de la base para que incluya el producto de prueba
+    catalog_cache.invalidate()
+    return fixture
+
+async def _view_cart(db: AsyncSession, fixture: Fixture):
+    return await cart._enrich_cart(await cart._get_or_create_cart(fixture.user_id, db), db)
+
+def _add_cart_item(db: AsyncSession, fixture: Fixture):
+    return cart.add_cart_item(schemas.CartItemModel(product_id=fixture.product_id, quantity=1), fixture.user_id, db)
+
+async def _pay_intent(db: AsyncSession, fixture: Fixture, order_id: Optional[str] = None):
+    intent = await payments.create_payment_intent(
+        schemas.PaymentIntentCreate(amount=1000, order_id=order_id), fixture.user_id, db
+    )
+    card = schemas.PaymentCard(
+        cardNumber="4111111111111111", expiryDate="12/99", cvv="123", cardholderName="Query plans", country="CO"
+    )
+    return await payments._process_payment(
+        schemas.PaymentRequest(email=fixture.email, card=card, amount=1000, payment_intent_id=intent.id),
+        fixture.user_id, db
+    )
+
+async def _process_payment(db: AsyncSession, fixture: Fixture):
+    return await _pay_intent(db, fixture, await _pending_order(db, fixture))
+
+async def _process_cart_payment(db: AsyncSession, fixture: Fixture):
+    # El carrito tiene una línea de cantidad 1 ("cart: añadir de nuevo"): se convierte en pedido antes de cobrar
+    return await _pay_intent(db, fixture)
+
+async def _confirm_order_payment(db: AsyncSession, fixture: Fixture):
+    return await inventory.confirm_order_payment(db, await _pending_order(db, fixture), fixture.user_id, "TXN_QUERY_PLANS")
+
+async def _release_order(db: AsyncSession, fixture: Fixture):
+    return await inventory.release_order(db, await _pending_order(db, fixture), "cancelled")
+
+async def _no_op():
+    return {}
+
+SCENARIOS: List[Tuple[str, Callable[[AsyncSession, Fixture], Awaitable]]] = [
+    ("auth: principal por email", lambda db, fx: auth.get_principal_by_email(db, fx.email)),
+    ("auth: perfil por id", lambda db, fx: authentication._load_user_profile(fx.user_id, db)),
+    ("products: catálogo", lambda db, fx: catalog_cache.get(db)),
+    ("products: detalle", lambda db, fx: products._load_product(fx.product_id, db)),
+    ("cart: ver", _view_cart),
+    ("cart: añadir línea", _add_cart_item),
+    ("cart: cambiar cantidad", lambda db, fx: cart.update_cart_item(fx.product_id, {"quantity": 2}, fx.user_id, db)),
+    ("cart: cantidad 0", lambda db, fx: cart.update_cart_item(fx.product_id, {"quantity": 0}, fx.user_id, db)),
+    ("cart: quitar línea", lambda db, fx: cart.delete_cart_item(fx.product_id, fx.user_id, db)),
+    ("cart: añadir de nuevo", _add_cart_item),
+    ("orders: historial", lambda db, fx: orders.get_user_orders(
+        Response(), before=f"{datetime.now(timezone.utc).isoformat()},{fx.order_id}",
+        limit=orders.ORDERS_PAGE_SIZE, current_user_id=fx.user_id, db=db
+    )),
+    ("orders: resumen", lambda db, fx: orders.get_order_summary(fx.order_id, fx.user_id, db)),
+    ("payments: intento del carrito", lambda db, fx: payments.create_payment_intent(
+        schemas.PaymentIntentCreate(amount=1000), fx.user_id, db
+    )),
+    ("payments: cobro", _process_payment),
+    ("payments: cobro del carrito", _process_cart_payment),
+    ("payments: checkout", lambda db, fx: payments._create_checkout_session(
+        schemas.CheckoutRequest(
+            cart_items=[schemas.CartItemModel(product_id=fx.product_id, quantity=1)], origin_url="http://localhost"
+        ), fx.user_id, db
+    )),
+    ("inventory: confirmar pago", _confirm_order_payment),
+    ("inventory: liberar pedido", _release_order),
+    ("inventory: reservas vencidas", lambda db, fx: inventory.release_expired(db)),
+    ("idempotency: clave abandonada", lambda db, fx: idempotency.run(
+        db, "stale", fx.user_id, IDEMPOTENCY_ENDPOINT, schemas.CartItemModel(product_id=fx.product_id, quantity=1), _no_op
+    )),
+    ("idempotency: claves vencidas", lambda db, fx: idempotency.release_expired(db)),
+]
+
+async def capture_statements(engine: AsyncEngine) -> List[CapturedStatement]:
+    """
+    Ejecuta SCENARIOS en una transacción que se deshace al terminar (los commit de los routers
+    solo liberan SAVEPOINTs) y devuelve la primera aparición de cada SELECT/UPDATE/DELETE
+    """
+    captured: Dict[str, CapturedStatement] = {}
+    scenario = "fixture"
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        keyword = statement.lstrip().split(None, 1)[0].upper()
+        if keyword in EXPLAINED_STATEMENTS and not executemany and statement not in captured:
+            captured[statement] = CapturedStatement(scenario, statement, parameters)
+
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        db = AsyncSession(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            fixture = await _create_fixture(db)
+            for scenario, run in SCENARIOS:
+                try:
+                    await run(db, fixture)
+                except HTTPException as e:
+                    # Respuesta de error del endpoint: sus consultas ya se capturaron
+                    print(f"⚠️ {scenario}: HTTP {e.status_code} {e.detail}")
+                    await db.rollback()
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+            await db.close()
+            await transaction.rollback()
+    return list(captured.values())
+
+def full_scans(captured: CapturedStatement, rows: List[dict]) -> List[str]:
+    """Tablas del esquema que la sentencia recorre enteras (type=ALL) y no están en FULL_SCAN_ALLOWLIST"""
+    return [
+        row["table"] for row in rows
+        # <union1,2>, <derived2>...: tablas temporales de MySQL, no tablas del esquema
+        if row["type"] == "ALL" and not (row["table"] or "").startswith("<")
+        and (captured.scenario, row["table"]) not in FULL_SCAN_ALLOWLIST
+    ]
+
+async def check_query_plans(engine: AsyncEngine) -> int:
+    """
+    EXPLAIN de cada sentencia capturada. Falla cada recorrido completo (type=ALL) que no esté en
+    FULL_SCAN_ALLOWLIST, aunque haya índices posibles: si el optimizador no los usa, hay que
+    revisar el índice o la consulta. Devuelve el número de recorridos no permitidos.
+    """
+    failures = 0
+    statements = await capture_statements(engine)
+    async with engine.connect() as connection:
+        for captured in statements:
+            name = f"{captured.scenario}: {' '.join(captured.statement.split())[:80]}"
+            result = await connection.exec_driver_sql(f"EXPLAIN {captured.statement}", captured.parameters)
+            scans = full_scans(captured, result.mappings().all())
+            for table in scans:
+                failures += 1
+                print(f"❌ {name}: recorrido completo de {table}")
+            if not scans:
+                print(f"✅ {name}")
+        await connection.rollback()
+    return failures
+
+async def _main() -> int:
+    from backend.database import async_engine
+
+    try:
+        return await check_query_plans(async_engine)
+    finally:
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    failures = asyncio.run(_main())
+    if failures:
+        print(f"❌ {failures} recorridos completos fuera de FULL_SCAN_ALLOWLIST")
+        sys.exit(1)
+    print("✅ Ninguna sentencia recorre una tabla entera fuera de FULL_SCAN_ALLOWLIST")
@@ -1,7 +1,7 @@
 # create_admin.py
 import mysql.connector
 import hashlib
-import uuid
+from ids import new_uuid
 from datetime import datetime, timezone
 
 def ensure_admin_exists():
@@ -24,7 +24,8 @@ def ensure_admin_exists():
         existing_admin = cursor.fetchone()
         
         if not existing_admin:
-            admin_id = str(uuid.uuid4())
+            # admin_users.id es BINARY(16) (models.BinaryUUID)
+            admin_id = new_uuid().bytes
             hashed_password = hashlib.sha256(admin_password.encode()).hexdigest()
             created_at = datetime.now(timezone.utc)
             
@@ -1,29 +1,235 @@
-
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError, InterfaceError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import logging
+import time
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+logger = logging.getLogger(__name__)
+
 MYSQL_USER = os.environ.get('MYSQL_USER', 'root')
 MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', 'Cod1029144695')
 MYSQL_HOST = os.environ.get('MYSQL_HOST', 'localhost')
 MYSQL_PORT = os.environ.get('MYSQL_PORT', '3306')
 MYSQL_DB = os.environ.get('MYSQL_DB', 'farmachelo_db')
 
+# Driver asíncrono para la API (aiomysql o asyncmy)
+MYSQL_ASYNC_DRIVER = os.environ.get('MYSQL_ASYNC_DRIVER', 'aiomysql')
+# DB_MODE=sync deja solo el engine síncrono (scripts: sync_mode.use_sync_engine())
+DB_MODE = os.environ.get('DB_MODE', 'async').lower()
+
 SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"mysql+{MYSQL_ASYNC_DRIVER}://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+
+# Pool por worker (cada proceso de uvicorn tiene el suyo): total = workers * (size + overflow)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+# Por debajo del wait_timeout de MySQL para no reutilizar conexiones que el servidor ya cerró
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+# Réplicas de lectura: URLs async separadas por comas (mysql+aiomysql://... o sqlite+aiosqlite:///...)
+DB_REPLICA_URLS = [url.strip() for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url.strip()]
+# Segundos que una réplica caída queda fuera del round-robin
+DB_REPLICA_RETRY_AFTER = float(os.environ.get('DB_REPLICA_RETRY_AFTER', '30'))
+
+# pool_metrics registra aquí el observador de esperas: (nombre del pool, segundos esperando conexión)
+pool_wait_observer: Optional[Callable[[str, float], None]] = None
+
+class _TimedPoolMixin:
+    metrics_name = "db"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if pool_wait_observer is not None:
+                pool_wait_observer(self.metrics_name, time.perf_counter() - started)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics_name = "sync"
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=TimedQueuePool, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
+# Claves de session.info: ruta que abrió la sesión (métricas del pool) y réplica asignada
+SESSION_ROUTE_KEY = "route"
+REPLICA_KEY = "replica"
+
+class ReplicaRouter:
+    """Round-robin entre réplicas sanas; la que falla queda fuera DB_REPLICA_RETRY_AFTER segundos"""
+
+    def __init__(self, engines: List[AsyncEngine]):
+        self.engines = engines
+        self._next = 0
+        self._down_until: Dict[int, float] = {}
+        self.reads = [0] * len(engines)
+        self.failovers = 0
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """Siguiente réplica disponible, o None para leer del primario"""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = self._next % len(self.engines)
+            self._next += 1
+            if self._down_until.get(index, 0.0) <= now:
+                self.reads[index] += 1
+                return self.engines[index]
+        return None
+
+    def mark_down(self, replica: AsyncEngine):
+        self._down_until[self.engines.index(replica)] = time.monotonic() + DB_REPLICA_RETRY_AFTER
+        self.failovers += 1
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        return {
+            "replicas": [
+                {
+                    "url": engine.url.render_as_string(hide_password=True),
+                    "reads": self.reads[index],
+                    "available": self._down_until.get(index, 0.0) <= now,
+                }
+                for index, engine in enumerate(self.engines)
+            ],
+            "failovers": self.failovers,
+        }
+
+class RoutingSession(Session):
+    """Envía los SELECT a la réplica asignada en session.info; escrituras y flush van al primario"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get(REPLICA_KEY)
+        if replica is not None and not self._flushing and (clause is None or clause.is_select):
+            return replica.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+class ReadAsyncSession(AsyncSession):
+    """Si la réplica no responde, la marca como caída y repite la lectura en el primario"""
+
+    async def execute(self, *args, **kwargs):
+        try:
+            return await super().execute(*args, **kwargs)
+        except (OperationalError, InterfaceError) as e:
+            replica = self.info.pop(REPLICA_KEY, None)
+            if replica is None:
+                raise
+            logger.warning(f"Read replica failed, falling back to primary: {str(e)}")
+            replica_router.mark_down(replica)
+            await self.rollback()
+            return await super().execute(*args, **kwargs)
+
+async_engine = None
+AsyncSessionLocal = None
+ReadSessionLocal = None
+replica_engines: List[AsyncEngine] = []
+replica_router: Optional[ReplicaRouter] = None
+if DB_MODE != 'sync':
+    async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=TimedAsyncAdaptedQueuePool, **POOL_OPTIONS)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    replica_engines = [
+        create_async_engine(
+            url,
+            poolclass=type(f"ReplicaPool{index}", (TimedAsyncAdaptedQueuePool,), {"metrics_name": f"replica{index}"}),
+            **POOL_OPTIONS
+        )
+        for index, url in enumerate(DB_REPLICA_URLS)
+    ]
+    replica_router = ReplicaRouter(replica_engines) if replica_engines else None
+    ReadSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        class_=ReadAsyncSession,
+        sync_session_class=RoutingSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+class LazyAsyncSession:
+    """
+    Proxy de AsyncSession que no la crea hasta el primer uso: las rutas que fallan antes
+    (auth, validación) nunca tocan el pool. La conexión se devuelve al terminar cada
+    transacción (commit/rollback) y, como tarde, en cuanto el endpoint retorna.
+    Con read_only las lecturas van a una réplica (si hay) salvo que se pida use_primary().
+    """
+
+    def __init__(self, factory, route: str, read_only: bool = False):
+        self._factory = factory
+        self._route = route
+        self._read_only = read_only
+        self._primary = not read_only
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory()
+            self._session.info[SESSION_ROUTE_KEY] = self._route
+            if not self._primary and replica_router is not None:
+                replica = replica_router.pick()
+                if replica is not None:
+                    self._session.info[REPLICA_KEY] = replica
+        return getattr(self._session, name)
+
+    async def use_primary(self):
+        """Las lecturas siguientes van al primario (read-your-writes, reconstrucciones tras un cambio)"""
+        self._primary = True
+        if self._session is not None and self._session.info.pop(REPLICA_KEY, None) is not None:
+            await self._session.close()
+
+    async def release(self):
+        """Termina la transacción en curso y devuelve la conexión; la sesión sigue siendo usable"""
+        if self._session is not None:
+            await self._session.close()
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def insert_on_conflict(db, model, values, conflict_columns, update):
+    """INSERT ... ON DUPLICATE KEY UPDATE en MySQL (ON CONFLICT en SQLite/PostgreSQL).
+    update recibe la fila propuesta (inserted/excluded) y devuelve los valores a actualizar."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(**values)
+        return stmt.on_duplicate_key_update(**update(stmt.inserted))
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    stmt = insert(model).values(**values)
+    return stmt.on_conflict_do_update(index_elements=conflict_columns, set_=update(stmt.excluded))
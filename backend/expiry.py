@@ -0,0 +1,38 @@
+"""Vencimientos: fechas de MySQL en UTC y barridos oportunistas de los registros vencidos."""
+from typing import Any, Awaitable, Callable, Optional
+from datetime import datetime, timezone
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def as_utc(value: datetime) -> datetime:
+    # MySQL devuelve DATETIME sin zona horaria: se guardan en UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def is_expired(expires_at: datetime, now: Optional[datetime] = None) -> bool:
+    return as_utc(expires_at) <= (now or datetime.now(timezone.utc))
+
+class PeriodicSweep:
+    """
+    Barrido oportunista que dispara una petición: ejecuta release(db) como mucho una vez cada
+    interval segundos por worker. Un error se registra y se descarta: el barrido nunca debe
+    tumbar la petición que lo dispara.
+    """
+    def __init__(self, name: str, interval: float, release: Callable[[Any], Awaitable[int]]):
+        self.name = name
+        self.interval = interval
+        self.release = release
+        self._last_run = 0.0
+
+    async def __call__(self, db) -> int:
+        now = time.monotonic()
+        if now - self._last_run < self.interval:
+            return 0
+        self._last_run = now
+        try:
+            return await self.release(db)
+        except Exception as e:
+            logger.error(f"Error sweeping {self.name}: {str(e)}")
+            await db.rollback()
+            return 0
@@ -0,0 +1,207 @@
+"""Cabecera Idempotency-Key: la primera respuesta se guarda y los reintentos la reciben sin repetir el trabajo."""
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Awaitable, Callable, Dict, Optional
+from datetime import datetime, timezone, timedelta
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from . import models
+from .expiry import PeriodicSweep, as_utc, is_expired
+
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+# Un registro en curso más antiguo que esto se considera abandonado (worker caído)
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '60'))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '10'))
+IDEMPOTENCY_POLL_INTERVAL = float(os.environ.get('IDEMPOTENCY_POLL_INTERVAL', '0.2'))
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.environ.get('IDEMPOTENCY_SWEEP_INTERVAL', '300'))
+IDEMPOTENCY_SWEEP_BATCH = int(os.environ.get('IDEMPOTENCY_SWEEP_BATCH', '500'))
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# Peticiones en curso en este worker: los duplicados esperan el evento en lugar de sondear MySQL
+_inflight: Dict[str, asyncio.Event] = {}
+
+def _record_id(user_id: str, endpoint: str, key: str) -> str:
+    return hashlib.sha256(f"{user_id}|{endpoint}|{key}".encode()).hexdigest()
+
+def _request_hash(payload: BaseModel) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+def _is_stale(row, now: datetime) -> bool:
+    if is_expired(row.expires_at, now):
+        return True
+    return row.status == "in_progress" and as_utc(row.created_at) + timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT) <= now
+
+async def _load(db: AsyncSession, record_id: str):
+    # Columnas sueltas (no la entidad) para no leer valores viejos del identity map
+    result = await db.execute(
+        select(
+            models.IdempotencyKey.request_hash,
+            models.IdempotencyKey.status,
+            models.IdempotencyKey.status_code,
+            models.IdempotencyKey.response_body,
+            models.IdempotencyKey.created_at,
+            models.IdempotencyKey.expires_at,
+        ).filter(models.IdempotencyKey.id == record_id)
+    )
+    row = result.first()
+    # Cierra la transacción de lectura: con REPEATABLE READ el siguiente sondeo no vería el commit del otro
+    await db.commit()
+    return row
+
+async def _claim(db: AsyncSession, record_id: str, user_id: str, endpoint: str, request_hash: str) -> bool:
+    now = datetime.now(timezone.utc)
+    db.add(models.IdempotencyKey(
+        id=record_id,
+        user_id=user_id,
+        endpoint=endpoint,
+        request_hash=request_hash,
+        status="in_progress",
+        created_at=now,
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL),
+    ))
+    try:
+        await db.commit()
+        return True
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+async def _release(db: AsyncSession, record_id: str):
+    """Borra el registro para que un reintento vuelva a ejecutar la petición"""
+    await db.rollback()
+    await db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.id == record_id))
+    await db.commit()
+
+async def _take_over(db: AsyncSession, record_id: str, row) -> bool:
+    """
+    Borra un registro abandonado o vencido solo si sigue siendo el que se leyó (mismo estado y
+    created_at): si otra petición ya lo sustituyó por su propio registro, rowcount es 0 y no se toca
+    """
+    result = await db.execute(
+        delete(models.IdempotencyKey)
+        .where(
+            models.IdempotencyKey.id == record_id,
+            models.IdempotencyKey.status == row.status,
+            models.IdempotencyKey.created_at == row.created_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def _complete(db: AsyncSession, record_id: str, status_code: int, body: Any):
+    record = await db.get(models.IdempotencyKey, record_id)
+    if record is None:
+        return
+    record.status = "completed"
+    record.status_code = status_code
+    record.response_body = json.dumps(body)
+    await db.commit()
+
+def _replay(row) -> JSONResponse:
+    return JSONResponse(
+        status_code=row.status_code,
+        content=json.loads(row.response_body),
+        headers={REPLAY_HEADER: "true"},
+    )
+
+async def _execute(db: AsyncSession, record_id: str, handler: Callable[[], Awaitable[Any]]):
+    event = _inflight[record_id] = asyncio.Event()
+    try:
+        try:
+            result = await handler()
+        except HTTPException as e:
+            # Los errores del cliente se repiten igual; los del servidor dejan reintentar
+            if e.status_code >= 500:
+                await _release(db, record_id)
+            else:
+                await _complete(db, record_id, e.status_code, {"detail": e.detail})
+            raise
+        except Exception:
+            await _release(db, record_id)
+            raise
+        await _complete(db, record_id, 200, jsonable_encoder(result))
+        return result
+    finally:
+        _inflight.pop(record_id, None)
+        event.set()
+
+async def _wait(record_id: str, deadline: float):
+    timeout = max(0.0, min(IDEMPOTENCY_POLL_INTERVAL, deadline - time.monotonic()))
+    event = _inflight.get(record_id)
+    if event is None:
+        # La petición original corre en otro worker: sondeo
+        await asyncio.sleep(timeout)
+        return
+    try:
+        await asyncio.wait_for(event.wait(), timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        pass
+
+async def run(
+    db: AsyncSession,
+    key: Optional[str],
+    user_id: str,
+    endpoint: str,
+    payload: BaseModel,
+    handler: Callable[[], Awaitable[Any]],
+):
+    """
+    Ejecuta handler una sola vez por (usuario, endpoint, Idempotency-Key). Los duplicados reciben
+    la respuesta guardada; si la original sigue en curso esperan hasta IDEMPOTENCY_WAIT_TIMEOUT.
+    """
+    if not key:
+        return await handler()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key demasiado larga")
+
+    await sweep_expired(db)
+    record_id = _record_id(user_id, endpoint, key)
+    request_hash = _request_hash(payload)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+
+    claim = True
+    while True:
+        if claim and await _claim(db, record_id, user_id, endpoint, request_hash):
+            return await _execute(db, record_id, handler)
+        claim = True
+
+        row = await _load(db, record_id)
+        if row is None:
+            # La original falló y liberó la clave entre el INSERT y la lectura
+            continue
+        if _is_stale(row, datetime.now(timezone.utc)):
+            # Solo quien borró el registro observado reclama la clave; si otra petición se adelantó, se relee el suyo
+            claim = await _take_over(db, record_id, row)
+            continue
+        if row.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otra petición")
+        if row.status == "completed":
+            return _replay(row)
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Una petición con esta Idempotency-Key sigue en curso")
+        await _wait(record_id, deadline)
+
+async def release_expired(db: AsyncSession, limit: int = IDEMPOTENCY_SWEEP_BATCH) -> int:
+    result = await db.execute(
+        select(models.IdempotencyKey.id)
+        .filter(models.IdempotencyKey.expires_at < datetime.now(timezone.utc))
+        .limit(limit)
+    )
+    record_ids = result.scalars().all()
+    if record_ids:
+        await db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.id.in_(record_ids)))
+    await db.commit()
+    return len(record_ids)
+
+# Limpieza oportunista de claves vencidas, como mucho una vez cada IDEMPOTENCY_SWEEP_INTERVAL por worker
+sweep_expired = PeriodicSweep("idempotency keys", IDEMPOTENCY_SWEEP_INTERVAL, release_expired)
@@ -0,0 +1,45 @@
+"""Identificadores UUIDv7 (RFC 9562): ordenados por tiempo para que los INSERT caigan al final del índice clúster."""
+import secrets
+import threading
+import time
+import uuid
+
+# Solo biblioteca estándar: lo importan tanto el paquete (from .ids) como los scripts (from ids)
+
+_COUNTER_MAX = 0xFFF
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+def _next_timestamp():
+    """(milisegundos, contador de 12 bits) estrictamente crecientes dentro del proceso"""
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Arranca en la mitad baja: deja sitio a más de 2048 ids en el mismo milisegundo
+            _counter = secrets.randbits(11)
+        elif _counter < _COUNTER_MAX:
+            # Mismo milisegundo (o reloj que retrocede): sigue el contador
+            _counter += 1
+        else:
+            # Contador agotado: se adelanta el reloj lógico un milisegundo
+            _last_ms += 1
+            _counter = secrets.randbits(11)
+        return _last_ms, _counter
+
+def new_uuid() -> uuid.UUID:
+    ms, counter = _next_timestamp()
+    value = (
+        (ms & 0xFFFF_FFFF_FFFF) << 80  # unix_ts_ms, 48 bits
+        | 0x7 << 76                    # versión 7
+        | counter << 64                # rand_a usado como contador monótono
+        | 0b10 << 62                   # variante RFC 9562
+        | secrets.randbits(62)         # rand_b
+    )
+    return uuid.UUID(int=value)
+
+def new_id() -> str:
+    """Id de fila: texto de 36 caracteres, como str(uuid.uuid4())"""
+    return str(new_uuid())
@@ -0,0 +1,173 @@
+"""Reservas de stock para el checkout: descuento condicional en una sola sentencia y liberación por TTL."""
+from sqlalchemy import select, update, insert, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Iterable, List
+from datetime import datetime, timezone, timedelta
+import logging
+import os
+
+from . import models, catalog_events
+from .expiry import PeriodicSweep
+from .ids import new_id
+
+logger = logging.getLogger(__name__)
+
+STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', '900'))
+RESERVATION_SWEEP_INTERVAL = float(os.environ.get('RESERVATION_SWEEP_INTERVAL', '30'))
+RESERVATION_SWEEP_BATCH = int(os.environ.get('RESERVATION_SWEEP_BATCH', '50'))
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids: List[str]):
+        super().__init__(f"Insufficient stock for products: {', '.join(product_ids)}")
+        self.product_ids = product_ids
+
+def quantity_case(quantities: Dict[str, int]):
+    # CASE WHEN id = ... THEN cantidad: la comparación con la columna aplica su tipo (BINARY(16)) al id
+    return case(*((models.Product.id == product_id, quantity) for product_id, quantity in quantities.items()))
+
+def quantities_by_product(items: Iterable) -> Dict[str, int]:
+    """Cantidad total por producto de unas líneas con product_id y quantity (al menos 1 por línea)"""
+    quantities: Dict[str, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + max(1, item.quantity)
+    return quantities
+
+async def reserve_stock(db: AsyncSession, order_id: str, items: Iterable) -> Dict[str, int]:
+    """
+    Descuenta el stock de todas las líneas con un único
+    UPDATE products SET stock = stock - CASE id ... WHERE id IN (...) AND stock >= CASE id ...
+    y registra las reservas del pedido. No hay SELECT ... FOR UPDATE: los bloqueos de fila
+    duran solo hasta el commit del checkout. Si algún producto no alcanza lanza InsufficientStock
+    (el llamador debe hacer rollback).
+    """
+    quantities = quantities_by_product(items)
+    if not quantities:
+        return quantities
+
+    requested = quantity_case(quantities)
+    result = await db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id.in_(list(quantities)),
+            models.Product.active == True,
+            models.Product.stock >= requested,
+        )
+        .values(stock=models.Product.stock - requested)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        # Solo en el camino de error: averiguar qué productos no alcanzaron
+        available = await db.execute(
+            select(models.Product.id, models.Product.stock)
+            .filter(models.Product.id.in_(list(quantities)), models.Product.active == True)
+        )
+        stock = dict(available.all())
+        raise InsufficientStock(sorted(
+            product_id for product_id, quantity in quantities.items()
+            if stock.get(product_id, 0) < quantity
+        ) or sorted(quantities))
+    # Snapshot del catálogo, caché compartida y ETags se invalidan con el commit
+    catalog_events.track_stock_changes(db, quantities)
+
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=STOCK_RESERVATION_TTL)
+    await db.execute(insert(models.StockReservation), [
+        {
+            "id": new_id(),
+            "order_id": order_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "status": "active",
+            "expires_at": expires_at,
+        }
+        for product_id, quantity in quantities.items()
+    ])
+    return quantities
+
+async def confirm_order_payment(db: AsyncSession, order_id: str, user_id: str, transaction_id: str) -> bool:
+    """
+    Marca como pagado un pedido pendiente y consolida sus reservas. Devuelve False si el pedido
+    ya no estaba pendiente (por ejemplo, lo expiró el barrido mientras se cobraba).
+    """
+    result = await db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.user_id == user_id, models.Order.status == "pending")
+        .values(status="paid", payment_session_id=transaction_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        return False
+    await db.execute(
+        update(models.StockReservation)
+        .where(models.StockReservation.order_id == order_id, models.StockReservation.status == "active")
+        .values(status="committed")
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+async def release_order(db: AsyncSession, order_id: str, order_status: str) -> bool:
+    """
+    Devuelve al stock las reservas activas de un pedido pendiente y lo pasa a order_status.
+    El pedido se actualiza primero (igual que al confirmar el pago), así un pago y una
+    liberación concurrentes nunca se cruzan: el que llega segundo ve rowcount 0.
+    """
+    result = await db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.status == "pending")
+        .values(status=order_status)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        return False
+
+    result = await db.execute(
+        select(models.StockReservation.product_id, models.StockReservation.quantity)
+        .filter(models.StockReservation.order_id == order_id, models.StockReservation.status == "active")
+    )
+    quantities: Dict[str, int] = {}
+    for product_id, quantity in result.all():
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        return True
+
+    await db.execute(
+        update(models.StockReservation)
+        .where(models.StockReservation.order_id == order_id, models.StockReservation.status == "active")
+        .values(status="released")
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(models.Product)
+        .where(models.Product.id.in_(list(quantities)))
+        .values(stock=models.Product.stock + quantity_case(quantities))
+        .execution_options(synchronize_session=False)
+    )
+    catalog_events.track_stock_changes(db, quantities)
+    return True
+
+async def release_expired(db: AsyncSession, limit: int = RESERVATION_SWEEP_BATCH) -> int:
+    """Expira los pedidos pendientes con reservas vencidas; cada pedido en su propia transacción"""
+    result = await db.execute(
+        select(models.StockReservation.order_id)
+        .filter(
+            models.StockReservation.status == "active",
+            models.StockReservation.expires_at < datetime.now(timezone.utc),
+        )
+        .distinct()
+        .limit(limit)
+    )
+    order_ids = result.scalars().all()
+    await db.commit()
+
+    released = 0
+    for order_id in order_ids:
+        try:
+            if await release_order(db, order_id, "expired"):
+                released += 1
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error releasing reservations for order {order_id}: {str(e)}")
+            await db.rollback()
+    return released
+
+# Barrido oportunista, como mucho una vez cada RESERVATION_SWEEP_INTERVAL segundos por worker
+sweep_expired = PeriodicSweep("expired reservations", RESERVATION_SWEEP_INTERVAL, release_expired)
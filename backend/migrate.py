@@ -0,0 +1,44 @@
+# migrate.py
+# Uso (desde la raíz del repositorio):
+#   python -m backend.migrate upgrade          aplica las migraciones pendientes (base vacía: esquema completo)
+#   python -m backend.migrate status           versión actual y migraciones pendientes
+#   python -m backend.migrate stamp <versión>  registra como aplicadas hasta <versión> sin ejecutarlas
+import logging
+import sys
+
+from backend import sync_mode
+sync_mode.use_sync_engine()
+
+from backend import models
+from backend.database import engine
+from backend.schema_migrations import available_migrations, current_version, upgrade, stamp
+
+def _create_schema(connection):
+    models.Base.metadata.create_all(bind=connection)
+
+def print_status():
+    with engine.connect() as connection:
+        version = current_version(connection)
+    print(f"📌 Versión actual: {version if version is not None else '(sin migrar)'}")
+    for migration in available_migrations():
+        mark = "✅" if version is not None and migration.version <= version else "⏳"
+        print(f"  {mark} {migration.path.name}")
+
+def main(args):
+    if args == ["upgrade"]:
+        applied = upgrade(engine, _create_schema)
+        for migration in applied:
+            print(f"✅ {migration.path.name}")
+        print_status()
+    elif args == ["status"]:
+        print_status()
+    elif len(args) == 2 and args[0] == "stamp" and args[1].isdigit():
+        stamp(engine, int(args[1]))
+        print_status()
+    else:
+        print("Uso: python -m backend.migrate {upgrade|status|stamp <versión>}")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main(sys.argv[1:])
@@ -0,0 +1,296 @@
+# migrate_binary_uuids.py
+# Convierte las claves VARCHAR(36) de una base existente a BINARY(16) (models.BinaryUUID).
+#
+#   python migrate_binary_uuids.py sizes     tamaño actual de los índices
+#   python migrate_binary_uuids.py prepare   en línea: columnas <col>_bin, triggers y relleno por lotes
+#   python migrate_binary_uuids.py cutover   ventana corta con la API parada: intercambio de columnas,
+#                                            índices y claves foráneas; después se despliega la API nueva
+#
+# prepare guarda el tamaño de los índices en index_sizes_before.json y cutover lo compara con el final.
+import json
+import os
+import sys
+from pathlib import Path
+
+import sync_mode
+sync_mode.use_sync_engine()
+
+from sqlalchemy import text
+from database import engine, MYSQL_DB
+
+UUID_COLUMNS = {
+    "users": ["id"],
+    "admin_users": ["id"],
+    "products": ["id"],
+    "carts": ["id", "user_id"],
+    "cart_items": ["id", "cart_id", "product_id"],
+    "orders": ["id", "user_id"],
+    "order_items": ["id", "order_id", "product_id"],
+    "payment_transactions": ["id", "user_id", "order_id"],
+    "payment_intents": ["id", "user_id", "cart_id", "order_id"],
+    "stock_reservations": ["id", "order_id", "product_id"],
+    "idempotency_keys": ["user_id"],
+}
+BATCH_SIZE = int(os.environ.get('UUID_MIGRATION_BATCH', '1000'))
+SIZES_FILE = Path(os.environ.get('UUID_MIGRATION_SIZES_FILE', 'index_sizes_before.json'))
+UUID_PATTERN = '^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+
+def _bin(column: str) -> str:
+    return f"{column}_bin"
+
+def _to_binary(expression: str) -> str:
+    return f"UNHEX(REPLACE({expression}, '-', ''))"
+
+def _trigger_name(table: str, event: str) -> str:
+    return f"{table}_uuid_bin_{event}"
+
+def _pending_columns(connection):
+    """{tabla: [columnas]} que siguen siendo VARCHAR/CHAR(36); las ya convertidas o de otro tipo se saltan"""
+    rows = connection.execute(text("""
+        SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = :schema AND DATA_TYPE IN ('varchar', 'char') AND CHARACTER_MAXIMUM_LENGTH = 36
+    """), {"schema": MYSQL_DB}).all()
+    existing = {(table, column) for table, column in rows}
+    pending = {}
+    for table, columns in UUID_COLUMNS.items():
+        columns = [column for column in columns if (table, column) in existing]
+        if columns:
+            pending[table] = columns
+    return pending
+
+def index_sizes(connection):
+    """{tabla: {índice: bytes}} según las estadísticas persistentes de InnoDB (tras ANALYZE TABLE)"""
+    tables = list(UUID_COLUMNS)
+    existing = set(connection.execute(text(
+        "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = :schema"
+    ), {"schema": MYSQL_DB}).scalars())
+    tables = [table for table in tables if table in existing]
+    for table in tables:
+        connection.exec_driver_sql(f"ANALYZE TABLE `{table}`").all()
+    page_size = connection.execute(text("SELECT @@innodb_page_size")).scalar()
+    rows = connection.execute(text("""
+        SELECT table_name, index_name, stat_value FROM mysql.innodb_index_stats
+        WHERE database_name = :schema AND stat_name = 'size'
+    """), {"schema": MYSQL_DB}).all()
+    sizes = {}
+    for table, index, pages in rows:
+        if table in tables:
+            sizes.setdefault(table, {})[index] = pages * page_size
+    return sizes
+
+def print_sizes(sizes, before=None):
+    def mb(size):
+        return f"{size / 1024 / 1024:10.2f} MB"
+    for table in sorted(sizes):
+        print(f"📦 {table}")
+        for index, size in sorted(sizes[table].items()):
+            previous = (before or {}).get(table, {}).get(index)
+            change = f"  (antes {mb(previous).strip()})" if previous is not None else ""
+            print(f"    {index:45} {mb(size)}{change}")
+    total = sum(size for indexes in sizes.values() for size in indexes.values())
+    print(f"Σ índices: {mb(total).strip()}")
+    if before:
+        total_before = sum(size for indexes in before.values() for size in indexes.values())
+        print(f"Σ antes:   {mb(total_before).strip()}")
+
+def _validate(connection, pending):
+    invalid = []
+    for table, columns in pending.items():
+        for column in columns:
+            count = connection.execute(text(
+                f"SELECT COUNT(*) FROM `{table}` WHERE `{column}` IS NOT NULL AND `{column}` NOT REGEXP :pattern"
+            ), {"pattern": UUID_PATTERN}).scalar()
+            if count:
+                invalid.append(f"{table}.{column}: {count} valores que no son UUID")
+    return invalid
+
+def _create_triggers(connection, table, columns):
+    # Mantienen <col>_bin al día mientras la API sigue escribiendo durante el relleno
+    assignments = "; ".join(f"SET NEW.`{_bin(column)}` = {_to_binary(f'NEW.`{column}`')}" for column in columns)
+    for event, timing in (("bi", "INSERT"), ("bu", "UPDATE")):
+        name = _trigger_name(table, event)
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS `{name}`")
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER `{name}` BEFORE {timing} ON `{table}` FOR EACH ROW BEGIN {assignments}; END"
+        )
+
+def _backfill(connection, table, columns):
+    """Rellena <col>_bin en lotes de BATCH_SIZE filas recorriendo la clave primaria; un commit por lote"""
+    primary_key = connection.execute(text("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table AND CONSTRAINT_NAME = 'PRIMARY'
+    """), {"schema": MYSQL_DB, "table": table}).scalar()
+    assignments = ", ".join(f"`{_bin(column)}` = {_to_binary(f'`{column}`')}" for column in columns)
+    last, updated = None, 0
+    while True:
+        query = f"SELECT `{primary_key}` FROM `{table}`"
+        if last is not None:
+            query += f" WHERE `{primary_key}` > :last"
+        keys = connection.execute(
+            text(f"{query} ORDER BY `{primary_key}` LIMIT :batch"), {"last": last, "batch": BATCH_SIZE}
+        ).scalars().all()
+        if not keys:
+            break
+        condition = f"`{primary_key}` <= :upper" + (f" AND `{primary_key}` > :last" if last is not None else "")
+        result = connection.execute(
+            text(f"UPDATE `{table}` SET {assignments} WHERE {condition}"), {"last": last, "upper": keys[-1]}
+        )
+        connection.commit()
+        updated += result.rowcount
+        last = keys[-1]
+    return updated
+
+def prepare():
+    with engine.connect() as connection:
+        pending = _pending_columns(connection)
+        if not pending:
+            print("✅ No queda ninguna clave VARCHAR(36) por convertir")
+            return
+        invalid = _validate(connection, pending)
+        if invalid:
+            for message in invalid:
+                print(f"❌ {message}")
+            print("❌ Corrige esos valores antes de migrar. Abortando.")
+            sys.exit(1)
+
+        sizes = index_sizes(connection)
+        SIZES_FILE.write_text(json.dumps(sizes, indent=2))
+        print("📏 Índices antes de la migración:")
+        print_sizes(sizes)
+
+        for table, columns in pending.items():
+            existing = set(connection.execute(text(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table"
+            ), {"schema": MYSQL_DB, "table": table}).scalars())
+            additions = [f"ADD COLUMN `{_bin(column)}` BINARY(16) NULL" for column in columns if _bin(column) not in existing]
+            if additions:
+                # Columna nullable al final: MySQL 8 la añade con ALGORITHM=INSTANT
+                connection.exec_driver_sql(f"ALTER TABLE `{table}` {', '.join(additions)}")
+            _create_triggers(connection, table, columns)
+            connection.commit()
+            print(f"🔄 {table}: {_backfill(connection, table, columns)} filas rellenadas ({', '.join(columns)})")
+    print("✅ Preparado. Ejecuta 'cutover' con la API parada y despliega después la versión con BinaryUUID.")
+
+def _foreign_keys(connection, pending):
+    """Claves foráneas en las que participa alguna columna a convertir (como origen o como destino)"""
+    rows = connection.execute(text("""
+        SELECT k.CONSTRAINT_NAME, k.TABLE_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME,
+               r.UPDATE_RULE, r.DELETE_RULE
+        FROM information_schema.KEY_COLUMN_USAGE k
+        JOIN information_schema.REFERENTIAL_CONSTRAINTS r
+          ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME AND r.TABLE_NAME = k.TABLE_NAME
+        WHERE k.TABLE_SCHEMA = :schema AND k.REFERENCED_TABLE_NAME IS NOT NULL
+        ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+    """), {"schema": MYSQL_DB}).mappings().all()
+    foreign_keys = {}
+    for row in rows:
+        if row["COLUMN_NAME"] in pending.get(row["TABLE_NAME"], []) or \
+                row["REFERENCED_COLUMN_NAME"] in pending.get(row["REFERENCED_TABLE_NAME"], []):
+            foreign_keys[(row["TABLE_NAME"], row["CONSTRAINT_NAME"])] = row
+    return list(foreign_keys.values())
+
+def _indexes(connection, table, columns):
+    """Definición de los índices de la tabla que contienen alguna columna a convertir"""
+    rows = connection.execute(text("""
+        SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME, COLLATION, SUB_PART
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """), {"schema": MYSQL_DB, "table": table}).mappings().all()
+    indexes = {}
+    for row in rows:
+        indexes.setdefault(row["INDEX_NAME"], []).append(row)
+    definitions = []
+    for name, parts in indexes.items():
+        if not any(part["COLUMN_NAME"] in columns for part in parts):
+            continue
+        keys = []
+        for part in parts:
+            key = f"`{part['COLUMN_NAME']}`"
+            if part["SUB_PART"] and part["COLUMN_NAME"] not in columns:
+                key += f"({part['SUB_PART']})"
+            if part["COLLATION"] == "D":
+                key += " DESC"
+            keys.append(key)
+        if name == "PRIMARY":
+            definitions.append(("DROP PRIMARY KEY", f"ADD PRIMARY KEY ({', '.join(keys)})"))
+        else:
+            unique = "UNIQUE " if not parts[0]["NON_UNIQUE"] else ""
+            definitions.append((f"DROP INDEX `{name}`", f"ADD {unique}INDEX `{name}` ({', '.join(keys)})"))
+    return definitions
+
+def cutover():
+    with engine.connect() as connection:
+        pending = _pending_columns(connection)
+        if not pending:
+            print("✅ No queda ninguna clave VARCHAR(36) por convertir")
+            return
+        # Filas que pudieran haber quedado sin rellenar
+        for table, columns in pending.items():
+            for column in columns:
+                connection.execute(text(
+                    f"UPDATE `{table}` SET `{_bin(column)}` = {_to_binary(f'`{column}`')} "
+                    f"WHERE `{column}` IS NOT NULL AND `{_bin(column)}` IS NULL"
+                ))
+        connection.commit()
+
+        foreign_keys = _foreign_keys(connection, pending)
+        connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 0")
+        for row in foreign_keys:
+            connection.exec_driver_sql(f"ALTER TABLE `{row['TABLE_NAME']}` DROP FOREIGN KEY `{row['CONSTRAINT_NAME']}`")
+            print(f"➖ {row['TABLE_NAME']}.{row['CONSTRAINT_NAME']}")
+
+        for table, columns in pending.items():
+            for event in ("bi", "bu"):
+                connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS `{_trigger_name(table, event)}`")
+            nullable = dict(connection.execute(text("""
+                SELECT COLUMN_NAME, IS_NULLABLE FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table
+            """), {"schema": MYSQL_DB, "table": table}).all())
+            indexes = _indexes(connection, table, columns)
+            # 1) las columnas de texto pasan a <col>_str (solo metadatos); 2) en un único ALTER en línea se rehacen
+            # los índices sobre <col>_bin renombrada a <col>. Quitar la clave primaria sin añadir otra en la misma
+            # sentencia obligaría a ALGORITHM=COPY.
+            connection.exec_driver_sql(
+                f"ALTER TABLE `{table}` " + ", ".join(f"RENAME COLUMN `{column}` TO `{column}_str`" for column in columns)
+            )
+            changes = [
+                f"CHANGE COLUMN `{_bin(column)}` `{column}` BINARY(16) {'NULL' if nullable[column] == 'YES' else 'NOT NULL'}"
+                for column in columns
+            ]
+            connection.exec_driver_sql(
+                f"ALTER TABLE `{table}` "
+                + ", ".join(
+                    [drop for drop, _ in indexes]
+                    + [f"DROP COLUMN `{column}_str`" for column in columns]
+                    + changes
+                    + [add for _, add in indexes]
+                )
+                + ", ALGORITHM=INPLACE, LOCK=NONE"
+            )
+            print(f"✅ {table}: {', '.join(columns)} -> BINARY(16)")
+
+        for row in foreign_keys:
+            connection.exec_driver_sql(
+                f"ALTER TABLE `{row['TABLE_NAME']}` ADD CONSTRAINT `{row['CONSTRAINT_NAME']}` "
+                f"FOREIGN KEY (`{row['COLUMN_NAME']}`) REFERENCES `{row['REFERENCED_TABLE_NAME']}` (`{row['REFERENCED_COLUMN_NAME']}`) "
+                f"ON DELETE {row['DELETE_RULE']} ON UPDATE {row['UPDATE_RULE']}"
+            )
+            print(f"➕ {row['TABLE_NAME']}.{row['CONSTRAINT_NAME']}")
+        connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 1")
+        connection.commit()
+
+        before = json.loads(SIZES_FILE.read_text()) if SIZES_FILE.exists() else None
+        print("📏 Índices después de la migración:")
+        print_sizes(index_sizes(connection), before)
+
+def sizes():
+    with engine.connect() as connection:
+        print_sizes(index_sizes(connection))
+
+if __name__ == "__main__":
+    commands = {"sizes": sizes, "prepare": prepare, "cutover": cutover}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print(f"Uso: python {sys.argv[0]} {{{'|'.join(commands)}}}")
+        sys.exit(2)
+    commands[sys.argv[1]]()
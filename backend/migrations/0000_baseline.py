@@ -0,0 +1,125 @@
+"""
+Esquema anterior al runner (create_all al arrancar): crea en una base antigua las tablas y columnas
+que añadieron las versiones de la API sin migraciones, para que 0001 en adelante encuentren lo que
+esperan. Importes en DOUBLE, como entonces (0002 los pasa a centavos); las claves toman el tipo
+actual de users.id, VARCHAR(36) o BINARY(16) si migrate_binary_uuids.py ya se ejecutó.
+Cada paso comprueba antes si ya existe: repetirla tras un fallo a medias es seguro.
+Las líneas de pedido antiguas se completan después con backfill_order_items.py.
+"""
+from sqlalchemy import text
+
+TABLES = {
+    "orders": """
+        CREATE TABLE IF NOT EXISTS orders (
+            id {key} NOT NULL PRIMARY KEY,
+            user_id {key} NOT NULL,
+            total_amount DOUBLE NOT NULL,
+            status VARCHAR(50) NULL,
+            payment_session_id VARCHAR(255) NULL,
+            created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) ENGINE=InnoDB
+    """,
+    "order_items": """
+        CREATE TABLE IF NOT EXISTS order_items (
+            id {key} NOT NULL PRIMARY KEY,
+            order_id {key} NOT NULL,
+            product_id {key} NOT NULL,
+            quantity INT NOT NULL,
+            prescription_file TEXT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        ) ENGINE=InnoDB
+    """,
+    "payment_transactions": """
+        CREATE TABLE IF NOT EXISTS payment_transactions (
+            id {key} NOT NULL PRIMARY KEY,
+            transaction_id VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            user_id {key} NULL,
+            amount DOUBLE NOT NULL,
+            currency VARCHAR(10) NULL,
+            card_last_four VARCHAR(4) NULL,
+            card_type VARCHAR(50) NULL,
+            status VARCHAR(50) NULL,
+            order_id {key} NULL,
+            created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (order_id) REFERENCES orders (id)
+        ) ENGINE=InnoDB
+    """,
+    "payment_intents": """
+        CREATE TABLE IF NOT EXISTS payment_intents (
+            id {key} NOT NULL PRIMARY KEY,
+            user_id {key} NOT NULL,
+            amount DOUBLE NOT NULL,
+            currency VARCHAR(10) NOT NULL,
+            cart_id {key} NULL,
+            cart_version VARCHAR(64) NULL,
+            order_id {key} NULL,
+            status VARCHAR(20) NOT NULL,
+            expires_at DATETIME NOT NULL,
+            created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (cart_id) REFERENCES carts (id),
+            FOREIGN KEY (order_id) REFERENCES orders (id)
+        ) ENGINE=InnoDB
+    """,
+    "stock_reservations": """
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            id {key} NOT NULL PRIMARY KEY,
+            order_id {key} NOT NULL,
+            product_id {key} NOT NULL,
+            quantity INT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            expires_at DATETIME NOT NULL,
+            created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX ix_stock_reservations_order_status (order_id, status),
+            INDEX ix_stock_reservations_status_expires (status, expires_at),
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        ) ENGINE=InnoDB
+    """,
+    "idempotency_keys": """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            id VARCHAR(64) NOT NULL PRIMARY KEY,
+            user_id {key} NOT NULL,
+            endpoint VARCHAR(100) NOT NULL,
+            request_hash VARCHAR(64) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            status_code INT NULL,
+            response_body TEXT NULL,
+            created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            INDEX ix_idempotency_keys_expires_at (expires_at)
+        ) ENGINE=InnoDB
+    """,
+}
+
+# Copia del producto en la línea del pedido (precio en pesos hasta 0002)
+COLUMNS = [
+    ("order_items", "name", "VARCHAR(255) NULL"),
+    ("order_items", "unit_price", "DOUBLE NULL"),
+]
+
+def _key_type(connection) -> str:
+    # Las claves foráneas exigen el mismo tipo (y en VARCHAR la misma colación) que users.id
+    column_type, collation = connection.execute(text("""
+        SELECT COLUMN_TYPE, COLLATION_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users' AND COLUMN_NAME = 'id'
+    """)).one()
+    return f"{column_type} COLLATE {collation}" if collation else column_type
+
+def _has_column(connection, table: str, column: str) -> bool:
+    return connection.execute(text("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column
+    """), {"table": table, "column": column}).scalar() > 0
+
+def upgrade(connection):
+    key = _key_type(connection)
+    for ddl in TABLES.values():
+        connection.exec_driver_sql(ddl.format(key=key))
+    for table, column, definition in COLUMNS:
+        if not _has_column(connection, table, column):
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
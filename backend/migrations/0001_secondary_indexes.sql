@@ -0,0 +1,71 @@
+-- 0001_secondary_indexes.sql
+-- Índices secundarios para los accesos por clave foránea y las claves únicas de models.py.
+-- Una base vacía ya se crea con estos índices; en una base existente los añade esta migración.
+--   python -m backend.migrate upgrade
+-- ALGORITHM=INPLACE, LOCK=NONE: se crean en línea, sin bloquear escrituras (MySQL 8).
+
+-- Un carrito por usuario: los carritos duplicados se funden en el más antiguo
+UPDATE cart_items ci
+JOIN carts c ON c.id = ci.cart_id
+JOIN (SELECT user_id, MIN(id) AS keep_id FROM carts GROUP BY user_id HAVING COUNT(*) > 1) k ON k.user_id = c.user_id
+SET ci.cart_id = k.keep_id
+WHERE c.id <> k.keep_id;
+
+UPDATE payment_intents pi
+JOIN carts c ON c.id = pi.cart_id
+JOIN (SELECT user_id, MIN(id) AS keep_id FROM carts GROUP BY user_id HAVING COUNT(*) > 1) k ON k.user_id = c.user_id
+SET pi.cart_id = k.keep_id
+WHERE c.id <> k.keep_id;
+
+DELETE c FROM carts c
+JOIN (SELECT user_id, MIN(id) AS keep_id FROM carts GROUP BY user_id HAVING COUNT(*) > 1) k ON k.user_id = c.user_id
+WHERE c.id <> k.keep_id;
+
+-- Una línea por producto y carrito: se suman las cantidades en la más antigua
+UPDATE cart_items ci
+JOIN (
+    SELECT cart_id, product_id, MIN(id) AS keep_id, SUM(quantity) AS quantity
+    FROM cart_items GROUP BY cart_id, product_id HAVING COUNT(*) > 1
+) d ON d.keep_id = ci.id
+SET ci.quantity = d.quantity;
+
+DELETE ci FROM cart_items ci
+JOIN (
+    SELECT cart_id, product_id, MIN(id) AS keep_id
+    FROM cart_items GROUP BY cart_id, product_id HAVING COUNT(*) > 1
+) d ON d.cart_id = ci.cart_id AND d.product_id = ci.product_id
+WHERE ci.id <> d.keep_id;
+
+-- carts: la clave única sustituye al índice que MySQL creó para la FK
+ALTER TABLE carts
+    ADD UNIQUE INDEX uq_carts_user_id (user_id),
+    DROP INDEX user_id,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- cart_items: (cart_id, product_id) cubre también los accesos solo por cart_id
+ALTER TABLE cart_items
+    ADD UNIQUE INDEX uq_cart_items_cart_product (cart_id, product_id),
+    DROP INDEX cart_id,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- products: listado activo, por categoría y ordenado por nombre
+ALTER TABLE products
+    ADD INDEX ix_products_active_category_name (active, category, name),
+    ADD INDEX ix_products_active_name (active, name),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- orders: historial del usuario, más reciente primero (paginación por cursor)
+ALTER TABLE orders
+    ADD INDEX ix_orders_user_created_at (user_id, created_at DESC, id DESC),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- order_items: selectinload de Order.items
+ALTER TABLE order_items
+    ADD INDEX ix_order_items_order_id (order_id),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- payment_transactions: búsqueda por referencia de la pasarela y por pedido
+ALTER TABLE payment_transactions
+    ADD UNIQUE INDEX ux_payment_transactions_transaction_id (transaction_id),
+    ADD INDEX ix_payment_transactions_order_id (order_id),
+    ALGORITHM=INPLACE, LOCK=NONE;
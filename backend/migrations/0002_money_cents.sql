@@ -0,0 +1,27 @@
+-- 0002_money_cents.sql
+-- Importes en centavos enteros (BIGINT, models.Money): precios, totales e importes de pago.
+--   python -m backend.migrate upgrade
+-- Los valores cambian de unidad (pesos -> centavos): aplicar con la API parada y desplegar
+-- a continuación la versión con models.Money.
+-- Paso intermedio a DECIMAL(20,2): redondea DOUBLE al centavo y deja sitio para multiplicar por 100
+-- sin desbordar el DECIMAL(10,2) original.
+
+ALTER TABLE products MODIFY price DECIMAL(20,2) NOT NULL;
+UPDATE products SET price = ROUND(price * 100);
+ALTER TABLE products MODIFY price BIGINT NOT NULL;
+
+ALTER TABLE orders MODIFY total_amount DECIMAL(20,2) NOT NULL;
+UPDATE orders SET total_amount = ROUND(total_amount * 100);
+ALTER TABLE orders MODIFY total_amount BIGINT NOT NULL;
+
+ALTER TABLE order_items MODIFY unit_price DECIMAL(20,2) NULL;
+UPDATE order_items SET unit_price = ROUND(unit_price * 100) WHERE unit_price IS NOT NULL;
+ALTER TABLE order_items MODIFY unit_price BIGINT NULL;
+
+ALTER TABLE payment_transactions MODIFY amount DECIMAL(20,2) NOT NULL;
+UPDATE payment_transactions SET amount = ROUND(amount * 100);
+ALTER TABLE payment_transactions MODIFY amount BIGINT NOT NULL;
+
+ALTER TABLE payment_intents MODIFY amount DECIMAL(20,2) NOT NULL;
+UPDATE payment_intents SET amount = ROUND(amount * 100);
+ALTER TABLE payment_intents MODIFY amount BIGINT NOT NULL;
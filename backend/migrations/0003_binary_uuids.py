@@ -0,0 +1,23 @@
+"""
+Claves UUID en BINARY(16) (models.BinaryUUID). La conversión de una base existente se hace en línea,
+por fases, con migrate_binary_uuids.py; esta migración solo comprueba que se completó.
+"""
+from sqlalchemy import text, bindparam
+
+UUID_TABLES = (
+    "users", "admin_users", "products", "carts", "cart_items", "orders", "order_items",
+    "payment_transactions", "payment_intents", "stock_reservations", "idempotency_keys",
+)
+
+def upgrade(connection):
+    pending = connection.execute(text("""
+        SELECT CONCAT(TABLE_NAME, '.', COLUMN_NAME) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :tables
+          AND (COLUMN_NAME = 'id' OR COLUMN_NAME LIKE '%\\_id')
+          AND DATA_TYPE IN ('varchar', 'char') AND CHARACTER_MAXIMUM_LENGTH = 36
+    """).bindparams(bindparam("tables", expanding=True)), {"tables": list(UUID_TABLES)}).scalars().all()
+    if pending:
+        raise RuntimeError(
+            f"Claves todavía en VARCHAR(36): {', '.join(pending)}. Conviértelas antes con "
+            f"'python migrate_binary_uuids.py prepare' y 'python migrate_binary_uuids.py cutover' (desde backend/)"
+        )
@@ -0,0 +1,12 @@
+-- 0004_cart_version.sql
+-- Contador de versión del carrito: cada cambio de líneas lo incrementa y los intentos de pago
+-- lo congelan (payment_intents.cart_version). carts.updated_at tiene precisión de segundos y
+-- dos cambios en el mismo segundo daban la misma versión. La copia en payment_intents pasa a INT;
+-- los intentos con una versión antigua (texto de updated_at) quedan en NULL y se rechazan al cobrar.
+--   python -m backend.migrate upgrade
+
+ALTER TABLE carts ADD COLUMN version INT NOT NULL DEFAULT 0, ALGORITHM=INSTANT;
+
+UPDATE payment_intents SET cart_version = NULL WHERE cart_version NOT REGEXP '^[0-9]+$';
+
+ALTER TABLE payment_intents MODIFY cart_version INT NULL;
@@ -1,13 +1,58 @@
 
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, DateTime, Text, ForeignKey, Index, UniqueConstraint, BINARY
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
+import uuid
 from .database import Base
+from .money import to_cents, from_cents
+
+class BinaryUUID(TypeDecorator):
+    """
+    UUID guardado como BINARY(16) (16 bytes por clave en lugar de hasta 144 en VARCHAR(36) utf8mb4).
+    La aplicación y schemas.py siguen viendo el texto de 36 caracteres.
+    """
+    impl = BINARY
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(16)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, uuid.UUID):
+            return value.bytes
+        try:
+            return uuid.UUID(str(value)).bytes
+        except ValueError:
+            # Un id mal formado (de la URL, por ejemplo) no coincide con ninguna fila
+            return None
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return str(uuid.UUID(bytes=bytes(value)))
+
+class Money(TypeDecorator):
+    """
+    Importe guardado en centavos (BIGINT). En Python es un Decimal en pesos, así que
+    SUM(precio * cantidad) se calcula en MySQL sobre enteros, sin errores de redondeo.
+    Las expresiones calculadas (SUM, *) deben envolverse en type_coerce(..., Money()).
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
 
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String(36), primary_key=True, index=True)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     name = Column(String(255), nullable=False)
     phone = Column(String(50), nullable=True)
@@ -20,7 +65,7 @@ class User(Base):
 class AdminUser(Base):
     __tablename__ = "admin_users"
     
-    id = Column(String(36), primary_key=True, index=True)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     name = Column(String(255), nullable=False)
     password = Column(String(255), nullable=False)
@@ -30,10 +75,10 @@ class AdminUser(Base):
 class Product(Base):
     __tablename__ = "products"
     
-    id = Column(String(36), primary_key=True, index=True)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
-    price = Column(Float, nullable=False)
+    price = Column(Money(), nullable=False)
     category = Column(String(50), nullable=False)
     stock = Column(Integer, nullable=False)
     image_url = Column(Text, nullable=True)
@@ -41,52 +86,145 @@ class Product(Base):
     active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Catálogo paginado: WHERE active [AND category] ORDER BY name, id
+        Index("ix_products_active_category_name", "active", "category", "name"),
+        Index("ix_products_active_name", "active", "name"),
+    )
+
 class Cart(Base):
     __tablename__ = "carts"
     
-    id = Column(String(36), primary_key=True, index=True)
-    user_id = Column(String(36), ForeignKey('users.id'), nullable=False)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
+    user_id = Column(BinaryUUID(), ForeignKey('users.id'), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Se incrementa en SQL con cada cambio de líneas: versión exacta para los intentos de pago
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Un carrito por usuario (_get_or_create_cart hace upsert sobre esta clave)
+        UniqueConstraint("user_id", name="uq_carts_user_id"),
+    )
 
 class CartItem(Base):
     __tablename__ = "cart_items"
     
-    id = Column(String(36), primary_key=True, index=True)
-    cart_id = Column(String(36), ForeignKey('carts.id'), nullable=False)
-    product_id = Column(String(36), ForeignKey('products.id'), nullable=False)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
+    cart_id = Column(BinaryUUID(), ForeignKey('carts.id'), nullable=False)
+    product_id = Column(BinaryUUID(), ForeignKey('products.id'), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
     prescription_file = Column(Text, nullable=True)
 
+    __table_args__ = (
+        # Una fila por producto y carrito: permite INSERT ... ON DUPLICATE KEY UPDATE
+        UniqueConstraint("cart_id", "product_id", name="uq_cart_items_cart_product"),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
     
-    id = Column(String(36), primary_key=True, index=True)
-    user_id = Column(String(36), ForeignKey('users.id'), nullable=False)
-    total_amount = Column(Float, nullable=False)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
+    user_id = Column(BinaryUUID(), ForeignKey('users.id'), nullable=False)
+    total_amount = Column(Money(), nullable=False)
     status = Column(String(50), default="pending")
     payment_session_id = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    items = relationship("OrderItem", back_populates="order")
+
+# Historial de pedidos: WHERE user_id ORDER BY created_at DESC, id DESC (keyset)
+Index("ix_orders_user_created_at", Order.user_id, Order.created_at.desc(), Order.id.desc())
+
 class OrderItem(Base):
     __tablename__ = "order_items"
     
-    id = Column(String(36), primary_key=True, index=True)
-    order_id = Column(String(36), ForeignKey('orders.id'), nullable=False)
-    product_id = Column(String(36), ForeignKey('products.id'), nullable=False)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
+    order_id = Column(BinaryUUID(), ForeignKey('orders.id'), nullable=False)
+    product_id = Column(BinaryUUID(), ForeignKey('products.id'), nullable=False)
     quantity = Column(Integer, nullable=False)
     prescription_file = Column(Text, nullable=True)
+    # Copia del producto al comprar: las lecturas del pedido no necesitan JOIN con products
+    name = Column(String(255), nullable=True)
+    unit_price = Column(Money(), nullable=True)
+
+    order = relationship("Order", back_populates="items")
+    product = relationship("Product")
+
+    __table_args__ = (
+        # selectinload de Order.items: WHERE order_id IN (...)
+        Index("ix_order_items_order_id", "order_id"),
+    )
 
 class PaymentTransaction(Base):
     __tablename__ = "payment_transactions"
     
-    id = Column(String(36), primary_key=True, index=True)
+    id = Column(BinaryUUID(), primary_key=True, index=True)
     transaction_id = Column(String(255), nullable=False)
     email = Column(String(255), nullable=False)
-    user_id = Column(String(36), ForeignKey('users.id'), nullable=True)
-    amount = Column(Float, nullable=False)
+    user_id = Column(BinaryUUID(), ForeignKey('users.id'), nullable=True)
+    amount = Column(Money(), nullable=False)
     currency = Column(String(10), default="COP")
     card_last_four = Column(String(4), nullable=True)
     card_type = Column(String(50), nullable=True)
     status = Column(String(50), default="pending")
-    order_id = Column(String(36), ForeignKey('orders.id'), nullable=True)
+    order_id = Column(BinaryUUID(), ForeignKey('orders.id'), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ux_payment_transactions_transaction_id", "transaction_id", unique=True),
+        Index("ix_payment_transactions_order_id", "order_id"),
+    )
+
+class PaymentIntent(Base):
+    __tablename__ = "payment_intents"
+
+    id = Column(BinaryUUID(), primary_key=True, index=True)
+    user_id = Column(BinaryUUID(), ForeignKey('users.id'), nullable=False)
+    # Importe y moneda congelados al iniciar el pago
+    amount = Column(Money(), nullable=False)
+    currency = Column(String(10), nullable=False, default="COP")
+    # Versión del carrito (carts.version) al crear el intento; None si se paga un pedido
+    cart_id = Column(BinaryUUID(), ForeignKey('carts.id'), nullable=True)
+    cart_version = Column(Integer, nullable=True)
+    order_id = Column(BinaryUUID(), ForeignKey('orders.id'), nullable=True)
+    # requires_payment -> succeeded
+    status = Column(String(20), nullable=False, default="requires_payment")
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    id = Column(BinaryUUID(), primary_key=True, index=True)
+    order_id = Column(BinaryUUID(), ForeignKey('orders.id'), nullable=False)
+    product_id = Column(BinaryUUID(), ForeignKey('products.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # active -> committed (pago aprobado) | released (pedido expirado o pago rechazado)
+    status = Column(String(20), nullable=False, default="active")
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_stock_reservations_order_status", "order_id", "status"),
+        # Barrido de reservas vencidas: WHERE status = 'active' AND expires_at < now
+        Index("ix_stock_reservations_status_expires", "status", "expires_at"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256(user_id, endpoint, Idempotency-Key): una sola lectura por clave primaria
+    id = Column(String(64), primary_key=True)
+    user_id = Column(BinaryUUID(), nullable=False)
+    endpoint = Column(String(100), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    # in_progress -> completed
+    status = Column(String(20), nullable=False, default="in_progress")
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
@@ -0,0 +1,18 @@
+"""Importes exactos: en MySQL se guardan en centavos (BIGINT) y en Python son Decimal con dos decimales."""
+from decimal import Decimal, ROUND_HALF_UP
+
+# Solo biblioteca estándar: lo importan tanto el paquete (from .money) como los scripts (from money)
+
+CENT = Decimal("0.01")
+
+def to_cents(amount) -> int:
+    """Pesos (Decimal, int o el float que manda el cliente) -> centavos enteros"""
+    # str() evita arrastrar el error binario del float: 0.1 + 0.2 -> "0.30000000000000004" -> 30
+    return int((Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100).to_integral_value())
+
+def from_cents(cents: int) -> Decimal:
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+def same_amount(a, b) -> bool:
+    """Comparación exacta al centavo (sin tolerancias sobre floats)"""
+    return to_cents(a) == to_cents(b)
@@ -0,0 +1,88 @@
+"""bcrypt fuera del event loop: pool acotado de hilos (o procesos) con límite de cola y rehash transparente."""
+from fastapi import HTTPException
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+from . import auth
+
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+# Hashes en cola o en curso por worker antes de responder 503
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 8)))
+# thread (bcrypt libera el GIL) o process
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread').lower()
+
+def _hash(password: str) -> str:
+    return auth.pwd_context.hash(password)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return auth.pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if PASSWORD_HASH_EXECUTOR == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        # El contador solo se toca desde el event loop: no necesita lock
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado, intenta de nuevo en unos segundos",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(válida, nuevo hash). El nuevo hash solo viene si el coste configurado cambió."""
+        valid, new_hash = await self._run(_verify_and_update, plain_password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "executor": PASSWORD_HASH_EXECUTOR,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_ms": round(self.total_ms / self.completed, 3) if self.completed else 0.0,
+            "bcrypt_rounds": auth.BCRYPT_ROUNDS,
+        }
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,145 @@
+"""Métricas del pool de conexiones: estado en vivo, esperas, conexiones nuevas y retención por ruta."""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from typing import Deque, Dict, List, Optional
+from collections import deque
+import bisect
+import time
+
+from . import database
+from .database import SESSION_ROUTE_KEY
+
+_CHECKOUT_KEY = "connection_checked_out_at"
+
+class RouteHoldStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "transactions": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "total_ms": round(self.total_ms, 3),
+        }
+
+_hold_by_route: Dict[str, RouteHoldStats] = {}
+
+def record_hold(route: str, elapsed_ms: float):
+    _hold_by_route.setdefault(route, RouteHoldStats()).record(elapsed_ms)
+
+def hold_stats() -> Dict[str, Dict[str, object]]:
+    return {route: stats.as_dict() for route, stats in sorted(_hold_by_route.items())}
+
+@event.listens_for(Session, "after_begin")
+def _mark_checkout(session, transaction, connection):
+    # La sesión saca la conexión del pool al empezar la transacción
+    session.info.setdefault(_CHECKOUT_KEY, time.perf_counter())
+
+@event.listens_for(Session, "after_transaction_end")
+def _record_checkin(session, transaction):
+    # Al terminar la transacción raíz la conexión vuelve al pool
+    if transaction.parent is not None:
+        return
+    started = session.info.pop(_CHECKOUT_KEY, None)
+    if started is not None:
+        record_hold(session.info.get(SESSION_ROUTE_KEY, "(sin ruta)"), (time.perf_counter() - started) * 1000)
+
+# Límites superiores (ms) del histograma de espera por una conexión
+WAIT_BUCKETS_MS: List[float] = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+CONNECT_RATE_WINDOW = 60.0
+
+class PoolStats:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_count = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self._recent_connects: Deque[float] = deque()
+
+    def observe_wait(self, seconds: float):
+        elapsed_ms = seconds * 1000
+        self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS_MS, elapsed_ms)] += 1
+        self.wait_count += 1
+        self.wait_total_ms += elapsed_ms
+        self.wait_max_ms = max(self.wait_max_ms, elapsed_ms)
+        if seconds >= self.engine.pool.timeout():
+            self.timeouts += 1
+
+    def observe_connect(self):
+        now = time.monotonic()
+        self.connects += 1
+        self._recent_connects.append(now)
+        self._trim(now)
+
+    def observe_invalidation(self):
+        self.invalidations += 1
+
+    def _trim(self, now: float):
+        while self._recent_connects and now - self._recent_connects[0] > CONNECT_RATE_WINDOW:
+            self._recent_connects.popleft()
+
+    def as_dict(self) -> Dict[str, object]:
+        pool = self.engine.pool
+        self._trim(time.monotonic())
+        # Histograma acumulado (le = "menor o igual que"), como en Prometheus
+        cumulative, histogram = 0, {}
+        for limit, count in zip([*WAIT_BUCKETS_MS, "+Inf"], self.wait_buckets):
+            cumulative += count
+            histogram[str(limit)] = cumulative
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": database.DB_MAX_OVERFLOW,
+            "timeout_seconds": pool.timeout(),
+            "recycle_seconds": database.DB_POOL_RECYCLE,
+            "pre_ping": database.DB_POOL_PRE_PING,
+            "connects_total": self.connects,
+            "connects_per_second": round(len(self._recent_connects) / CONNECT_RATE_WINDOW, 3),
+            "invalidations": self.invalidations,
+            "wait_timeouts": self.timeouts,
+            "wait_ms": {
+                "count": self.wait_count,
+                "avg": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0.0,
+                "max": round(self.wait_max_ms, 3),
+                "buckets_le": histogram,
+            },
+        }
+
+_pools: Dict[str, PoolStats] = {}
+
+def _instrument(name: str, engine: Optional[Engine]):
+    if engine is None:
+        return
+    stats = _pools[name] = PoolStats(engine)
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: stats.observe_connect())
+    # Conexiones descartadas (pre-ping fallido, errores de desconexión)
+    event.listen(engine, "invalidate", lambda dbapi_connection, connection_record, exception: stats.observe_invalidation())
+
+def _observe_wait(name: str, seconds: float):
+    stats = _pools.get(name)
+    if stats is not None:
+        stats.observe_wait(seconds)
+
+def pool_stats() -> Dict[str, Dict[str, object]]:
+    return {name: stats.as_dict() for name, stats in _pools.items()}
+
+_instrument("sync", database.engine)
+_instrument("async", database.async_engine.sync_engine if database.async_engine is not None else None)
+for _index, _replica in enumerate(database.replica_engines):
+    _instrument(f"replica{_index}", _replica.sync_engine)
+database.pool_wait_observer = _observe_wait
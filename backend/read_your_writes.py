@@ -0,0 +1,43 @@
+"""Read-your-writes: tras modificar su carrito o sus pedidos, un usuario lee del primario durante una ventana."""
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+import os
+
+from . import auth, database
+from . import cache_backend as shared_cache
+from .routing import get_read_db
+
+logger = logging.getLogger(__name__)
+
+# Debe cubrir el retraso de replicación habitual
+READ_YOUR_WRITES_WINDOW = int(os.environ.get('READ_YOUR_WRITES_WINDOW', '5'))
+
+def _write_key(user_id: str) -> str:
+    return f"ryw:{user_id}"
+
+async def mark_write(user_id: str):
+    """Llamar después del commit de cualquier cambio del usuario que lean los endpoints de réplica"""
+    if not database.replica_engines:
+        return
+    # En la caché compartida: la siguiente petición puede caer en otro worker
+    await shared_cache.store_json(_write_key(user_id), 1, READ_YOUR_WRITES_WINDOW)
+
+async def recently_wrote(user_id: str) -> bool:
+    if not database.replica_engines:
+        return False
+    try:
+        return await shared_cache.cache_backend.get(_write_key(user_id)) is not None
+    except Exception as e:
+        # Ante la duda, primario
+        logger.error(f"Read-your-writes lookup failed: {str(e)}")
+        return True
+
+async def get_user_read_db(
+    current_user_id: str = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+) -> AsyncSession:
+    """get_read_db para datos del usuario: primario si escribió hace menos de READ_YOUR_WRITES_WINDOW"""
+    if await recently_wrote(current_user_id):
+        await db.use_primary()
+    return db
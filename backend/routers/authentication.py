@@ -1,81 +1,86 @@
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import uuid
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import models, schemas, auth
-from ..database import get_db
+from ..routing import get_db, SessionReleasingRoute
+from ..ids import new_id
+from ..cache_backend import cached_json, user_key
+from ..password_hasher import password_hasher
 
-router = APIRouter()
+router = APIRouter(route_class=SessionReleasingRoute)
 
 @router.post("/auth/register")
-async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+async def register(user_data: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.User).filter(models.User.email == user_data.email))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    # bcrypt corre en el pool de hashing, no en el event loop
+    hashed_password = await password_hasher.hash(user_data.password)
     user = models.User(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         email=user_data.email,
         name=user_data.name,
         phone=user_data.phone,
         address=user_data.address,
-        password=auth.hash_password(user_data.password),
+        password=hashed_password,
         is_admin=False
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     token = auth.create_jwt_token(user.id)
     
     return {"user": schemas.UserResponse.from_orm(user), "token": token}
 
+def _principal_response(principal: auth.Principal) -> schemas.UserResponse:
+    return schemas.UserResponse(
+        id=principal.id,
+        email=principal.email,
+        name=principal.name,
+        phone=principal.phone,
+        address=principal.address,
+        is_verified=principal.is_verified,
+        is_admin=principal.is_admin,
+        created_at=principal.created_at
+    )
+
 @router.post("/auth/login")
-async def login(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == login_data.email).first()
-    if user and auth.verify_password(login_data.password, user.password):
-        token = auth.create_jwt_token(user.id)
-        return {"user": schemas.UserResponse.from_orm(user), "token": token}
+async def login(login_data: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    # Una consulta indexada sobre users y admin_users y como mucho una verificación bcrypt
+    principal = await auth.get_principal_by_email(db, login_data.email)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    admin_user = db.query(models.AdminUser).filter(models.AdminUser.email == login_data.email).first()
-    if admin_user and auth.verify_password(login_data.password, admin_user.password):
-        user_response = schemas.UserResponse(
-            id=admin_user.id,
-            email=admin_user.email,
-            name=admin_user.name,
-            phone=None,
-            address=None,
-            is_verified=True,
-            is_admin=True,
-            created_at=admin_user.created_at
-        )
-        token = auth.create_jwt_token(admin_user.id)
-        return {"user": user_response, "token": token}
+    valid, new_hash = await password_hasher.verify(login_data.password, principal.password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # BCRYPT_ROUNDS cambió: se guarda el hash con el coste nuevo
+        model = principal.model
+        await db.execute(update(model).where(model.id == principal.id).values(password=new_hash))
+        await db.commit()
     
-    raise HTTPException(status_code=401, detail="Invalid email or password")
+    token = auth.create_jwt_token(principal.id)
+    return {"user": _principal_response(principal), "token": token}
+
+async def _load_user_profile(user_id: str, db: AsyncSession):
+    principal = await auth.get_principal_by_id(db, user_id)
+    if principal is None:
+        return None
+    return _principal_response(principal).model_dump(mode="json")
 
 @router.get("/auth/me", response_model=schemas.UserResponse)
 async def get_current_user_info(
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(models.User).filter(models.User.id == current_user_id).first()
-    if user:
-        return schemas.UserResponse.from_orm(user)
-    
-    admin_user = db.query(models.AdminUser).filter(models.AdminUser.id == current_user_id).first()
-    if admin_user:
-        return schemas.UserResponse(
-            id=admin_user.id,
-            email=admin_user.email,
-            name=admin_user.name,
-            phone=None,
-            address=None,
-            is_verified=True,
-            is_admin=True,
-            created_at=admin_user.created_at
-        )
-    
-    raise HTTPException(status_code=404, detail="User not found")
+    profile = await cached_json(user_key(current_user_id), lambda: _load_user_profile(current_user_id, db))
+    if profile is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profile
@@ -1,39 +1,56 @@
-
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any
+from datetime import datetime, timezone
+
+from .. import models, schemas, auth, read_your_writes
+from ..database import insert_on_conflict
+from ..routing import get_db, SessionReleasingRoute
+from ..ids import new_id
+from ..catalog_cache import catalog_cache
+from ..http_cache import make_etag, is_not_modified, not_modified_response, set_cache_headers
 
-from .. import models, schemas, auth
-from ..database import get_db
+router = APIRouter(route_class=SessionReleasingRoute)
 
-router = APIRouter()
+CART_CACHE_CONTROL = "private, no-cache"
 
-async def _get_or_create_cart(user_id: str, db: Session) -> models.Cart:
-    cart = db.query(models.Cart).filter(models.Cart.user_id == user_id).first()
+async def _get_or_create_cart(user_id: str, db: AsyncSession) -> models.Cart:
+    result = await db.execute(select(models.Cart).filter(models.Cart.user_id == user_id))
+    cart = result.scalars().first()
     if not cart:
-        cart = models.Cart(id=str(uuid.uuid4()), user_id=user_id)
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
+        # carts.user_id es único: dos peticiones simultáneas no crean dos carritos
+        await db.execute(insert_on_conflict(
+            db, models.Cart,
+            {"id": new_id(), "user_id": user_id, "updated_at": datetime.now(timezone.utc)},
+            ["user_id"],
+            lambda inserted: {"user_id": inserted.user_id}
+        ))
+        await db.commit()
+        result = await db.execute(select(models.Cart).filter(models.Cart.user_id == user_id))
+        cart = result.scalars().first()
     return cart
 
-async def _enrich_cart(cart: models.Cart, db: Session) -> Dict[str, Any]:
-    cart_items = db.query(models.CartItem).filter(models.CartItem.cart_id == cart.id).all()
+async def _enrich_cart(cart: models.Cart, db: AsyncSession) -> Dict[str, Any]:
+    # Un solo JOIN: el número de consultas no crece con el tamaño del carrito
+    result = await db.execute(
+        select(models.CartItem, models.Product)
+        .join(models.Product, models.Product.id == models.CartItem.product_id)
+        .filter(models.CartItem.cart_id == cart.id)
+    )
     enriched_items = []
     
-    for item in cart_items:
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-        if product:
-            enriched_items.append({
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-                "prescription_file": item.prescription_file,
-                "name": product.name,
-                "price": float(product.price),
-                "image_url": product.image_url,
-                "requires_prescription": product.requires_prescription,
-                "id": item.product_id
-            })
+    for item, product in result.all():
+        enriched_items.append({
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "prescription_file": item.prescription_file,
+            "name": product.name,
+            "price": float(product.price),
+            "image_url": product.image_url,
+            "requires_prescription": product.requires_prescription,
+            "id": item.product_id
+        })
     
     return {
         "id": cart.id,
@@ -44,43 +61,51 @@ async def _enrich_cart(cart: models.Cart, db: Session) -> Dict[str, Any]:
 
 @router.get("/cart", response_model=schemas.CartResponse)
 async def get_cart(
+    request: Request,
+    response: Response,
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     cart = await _get_or_create_cart(current_user_id, db)
+    # Los items muestran nombre y precio actuales, así que el ETag también depende del catálogo
+    snapshot = await catalog_cache.get(db)
+    # carts.version distingue dos cambios en el mismo segundo (updated_at no tiene más precisión)
+    etag = make_etag(cart.id, str(cart.version), cart.updated_at.isoformat() if cart.updated_at else "", snapshot.etag)
+    if is_not_modified(request, etag, cart.updated_at):
+        return not_modified_response(etag, CART_CACHE_CONTROL, cart.updated_at)
+    set_cache_headers(response, etag, CART_CACHE_CONTROL, cart.updated_at)
     return await _enrich_cart(cart, db)
 
 @router.post("/cart/items")
 async def add_cart_item(
     cart_item: schemas.CartItemModel,
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    product = db.query(models.Product).filter(models.Product.id == cart_item.product_id, models.Product.active == True).first()
-    if not product:
+    snapshot = await catalog_cache.get(db)
+    if cart_item.product_id not in snapshot.by_id:
         raise HTTPException(status_code=404, detail="Product not found")
 
     cart = await _get_or_create_cart(current_user_id, db)
     
-    existing_item = db.query(models.CartItem).filter(
-        models.CartItem.cart_id == cart.id,
-        models.CartItem.product_id == cart_item.product_id
-    ).first()
-    
-    if existing_item:
-        existing_item.quantity += max(1, cart_item.quantity)
-    else:
-        new_item = models.CartItem(
-            id=str(uuid.uuid4()),
-            cart_id=cart.id,
-            product_id=cart_item.product_id,
-            quantity=max(1, cart_item.quantity),
-            prescription_file=cart_item.prescription_file
-        )
-        db.add(new_item)
+    # Una sola sentencia: inserta la línea o suma la cantidad si ya existe (sin duplicados por doble clic)
+    await db.execute(insert_on_conflict(
+        db, models.CartItem,
+        {
+            "id": new_id(),
+            "cart_id": cart.id,
+            "product_id": cart_item.product_id,
+            "quantity": max(1, cart_item.quantity),
+            "prescription_file": cart_item.prescription_file
+        },
+        ["cart_id", "product_id"],
+        lambda inserted: {"quantity": models.CartItem.quantity + inserted.quantity}
+    ))
     
     cart.updated_at = datetime.now(timezone.utc)
-    db.commit()
+    cart.version = models.Cart.version + 1
+    await db.commit()
+    await read_your_writes.mark_write(current_user_id)
     
     return await _enrich_cart(cart, db)
 
@@ -89,28 +114,27 @@ async def update_cart_item(
     product_id: str, 
     payload: Dict[str, int], 
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     quantity = int(payload.get("quantity", 1))
     if quantity < 0:
         quantity = 0
     
     cart = await _get_or_create_cart(current_user_id, db)
-    cart_item = db.query(models.CartItem).filter(
-        models.CartItem.cart_id == cart.id,
-        models.CartItem.product_id == product_id
-    ).first()
-    
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Item not found in cart")
-    
+    item_filter = (models.CartItem.cart_id == cart.id, models.CartItem.product_id == product_id)
     if quantity == 0:
-        db.delete(cart_item)
+        result = await db.execute(delete(models.CartItem).where(*item_filter))
     else:
-        cart_item.quantity = quantity
+        result = await db.execute(update(models.CartItem).where(*item_filter).values(quantity=quantity))
+    
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Item not found in cart")
     
     cart.updated_at = datetime.now(timezone.utc)
-    db.commit()
+    cart.version = models.Cart.version + 1
+    await db.commit()
+    await read_your_writes.mark_write(current_user_id)
     
     return await _enrich_cart(cart, db)
 
@@ -118,17 +142,18 @@ async def update_cart_item(
 async def delete_cart_item(
     product_id: str, 
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     cart = await _get_or_create_cart(current_user_id, db)
-    cart_item = db.query(models.CartItem).filter(
+    result = await db.execute(delete(models.CartItem).where(
         models.CartItem.cart_id == cart.id,
         models.CartItem.product_id == product_id
-    ).first()
+    ))
     
-    if cart_item:
-        db.delete(cart_item)
+    if result.rowcount:
         cart.updated_at = datetime.now(timezone.utc)
-        db.commit()
+        cart.version = models.Cart.version + 1
+        await db.commit()
+        await read_your_writes.mark_write(current_user_id)
     
     return await _enrich_cart(cart, db)
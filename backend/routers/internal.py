@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from typing import Dict, Any
+
+from .. import models, auth, pool_metrics
+from ..database import replica_router
+from ..routing import SessionReleasingRoute
+from ..catalog_cache import catalog_cache
+from ..password_hasher import password_hasher
+
+router = APIRouter(route_class=SessionReleasingRoute)
+
+@router.get("/internal/metrics")
+async def get_internal_metrics(
+    current_admin: models.User = Depends(auth.get_current_admin)
+) -> Dict[str, Any]:
+    """
+    Métricas internas del worker para dimensionar cachés y pools de conexiones
+    """
+    return {
+        "catalog_cache": catalog_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "token_cache": auth.token_cache.stats(),
+        "db_pool": pool_metrics.pool_stats(),
+        "db_replicas": replica_router.stats() if replica_router is not None else None,
+        "db_hold_by_route": pool_metrics.hold_stats(),
+    }
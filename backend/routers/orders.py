@@ -1,34 +1,68 @@
-
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, or_, and_, func, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from datetime import datetime
 
 from .. import models, schemas, auth
-from ..database import get_db
+from ..routing import SessionReleasingRoute
+from ..read_your_writes import get_user_read_db
+from ..catalog_cache import catalog_cache
+
+router = APIRouter(route_class=SessionReleasingRoute)
 
-router = APIRouter()
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+
+def _parse_before_cursor(before: str):
+    """Cursor keyset con formato <created_at ISO>,<order_id>"""
+    try:
+        created_at, order_id = before.rsplit(",", 1)
+        return datetime.fromisoformat(created_at), order_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'before' cursor")
 
 @router.get("/orders", response_model=List[schemas.OrderResponse])
 async def get_user_orders(
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    orders = db.query(models.Order).filter(models.Order.user_id == current_user_id).order_by(models.Order.created_at.desc()).all()
+    # Pedidos e items en 2 consultas en total (selectinload); nombre y precio vienen de order_items.
+    # Una fila de más indica si hay otra página sin pedirla aparte
+    query = (
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .filter(models.Order.user_id == current_user_id)
+        .order_by(models.Order.created_at.desc(), models.Order.id.desc())
+        .limit(limit + 1)
+    )
+    if before:
+        before_created_at, before_id = _parse_before_cursor(before)
+        query = query.filter(or_(
+            models.Order.created_at < before_created_at,
+            and_(models.Order.created_at == before_created_at, models.Order.id < before_id)
+        ))
+    
+    result = await db.execute(query)
+    orders = result.scalars().all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
     
     orders_response = []
     for order in orders:
-        order_items = db.query(models.OrderItem).filter(models.OrderItem.order_id == order.id).all()
         items = []
-        for item in order_items:
-            product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-            if product:
-                items.append({
-                    "product_id": item.product_id,
-                    "quantity": item.quantity,
-                    "prescription_file": item.prescription_file,
-                    "name": product.name,
-                    "price": product.price
-                })
+        for item in order.items:
+            items.append({
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "prescription_file": item.prescription_file,
+                "name": item.name,
+                "price": float(item.unit_price) if item.unit_price is not None else None
+            })
         
         orders_response.append(schemas.OrderResponse(
             id=order.id,
@@ -40,49 +74,68 @@ async def get_user_orders(
             created_at=order.created_at
         ))
     
+    if has_more:
+        last = orders[-1]
+        response.headers["X-Next-Before"] = f"{last.created_at.isoformat()},{last.id}"
+    
     return orders_response
 
 @router.get("/orders/summary/{order_id}")
 async def get_order_summary(
     order_id: str, 
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
     """
     Obtener resumen de un pedido para procesar pago
     """
     try:
-        order = db.query(models.Order).filter(models.Order.id == order_id, models.Order.user_id == current_user_id).first()
-        if not order:
+        # Una consulta: las líneas con su subtotal y el total del pedido, SUM(precio * cantidad) OVER (), en MySQL
+        line_total = models.OrderItem.unit_price * models.OrderItem.quantity
+        result = await db.execute(
+            select(
+                models.Order.status,
+                models.OrderItem.product_id,
+                models.OrderItem.name,
+                models.OrderItem.quantity,
+                models.OrderItem.unit_price,
+                type_coerce(line_total, models.Money()).label("line_total"),
+                type_coerce(func.sum(line_total).over(), models.Money()).label("order_total"),
+            )
+            .outerjoin(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+            .filter(models.Order.id == order_id, models.Order.user_id == current_user_id)
+        )
+        rows = result.all()
+        if not rows:
             raise HTTPException(status_code=404, detail="Pedido no encontrado")
         
-        order_items = db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).all()
+        # Precio y nombre congelados en la compra; descripción e imagen salen del snapshot del catálogo
+        snapshot = await catalog_cache.get(db)
         enriched_items = []
-        total_amount = 0
         
-        for item in order_items:
-            product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-            if product:
-                item_total = product.price * item.quantity
-                total_amount += item_total
-                
-                enriched_items.append({
-                    "id": item.product_id,
-                    "name": product.name,
-                    "description": product.description,
-                    "quantity": item.quantity,
-                    "price": product.price,
-                    "total": item_total,
-                    "image_url": product.image_url
-                })
+        for row in rows:
+            if row.product_id is None:
+                continue
+            product = snapshot.by_id.get(row.product_id)
+            enriched_items.append({
+                "id": row.product_id,
+                "name": row.name,
+                "description": product.description if product else "",
+                "quantity": row.quantity,
+                "price": row.unit_price,
+                "total": row.line_total,
+                "image_url": product.image_url if product else None
+            })
         
         return {
             "order_id": order_id,
             "items": enriched_items,
-            "total_amount": total_amount,
+            "total_amount": rows[0].order_total or 0,
             "currency": "COP",
-            "status": order.status
+            "status": rows[0].status
         }
         
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
         raise HTTPException(status_code=500, detail="Error al obtener resumen del pedido")
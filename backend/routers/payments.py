@@ -1,15 +1,25 @@
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Header
+from sqlalchemy import select, insert, update, delete, func, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Iterable, Optional, Tuple
+import logging
 import secrets
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+import os
 
-from .. import models, schemas, auth
-from ..database import get_db
-from .cart import _get_or_create_cart, _enrich_cart
+from .. import models, schemas, auth, inventory, idempotency, read_your_writes
+from ..expiry import is_expired
+from ..routing import get_db, SessionReleasingRoute
+from ..ids import new_id
+from ..money import same_amount
+from .cart import _get_or_create_cart
 
-router = APIRouter()
+router = APIRouter(route_class=SessionReleasingRoute)
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_INTENT_TTL = int(os.environ.get('PAYMENT_INTENT_TTL', '1800'))
 
 def validate_card_number(card_number: str) -> bool:
     """Validar número de tarjeta usando el algoritmo de Luhn"""
@@ -65,19 +75,198 @@ def validate_expiry_date(expiry_date: str) -> bool:
     except:
         return False
 
+def _intent_error(
+    intent: models.PaymentIntent,
+    cart_version: Optional[int],
+    order_status: Optional[str],
+    payment_request: schemas.PaymentRequest
+) -> Optional[str]:
+    if intent.status != "requires_payment":
+        return "El intento de pago ya fue procesado"
+    if is_expired(intent.expires_at):
+        return "El intento de pago expiró, vuelve a iniciar el pago"
+    if payment_request.currency != intent.currency or not same_amount(payment_request.amount, intent.amount):
+        return "El monto no coincide con el intento de pago"
+    if intent.cart_id and intent.cart_version != cart_version:
+        return "El carrito cambió, vuelve a iniciar el pago"
+    if intent.order_id and order_status != "pending":
+        return "El pedido ya no está pendiente de pago"
+    return None
+
+async def _cart_total(cart_id: str, db: AsyncSession):
+    """(líneas, total) del carrito con SUM(precio * cantidad) en MySQL, en una consulta"""
+    result = await db.execute(
+        select(
+            func.count(models.CartItem.id),
+            type_coerce(func.sum(models.Product.price * models.CartItem.quantity), models.Money()),
+        )
+        .join(models.Product, models.Product.id == models.CartItem.product_id)
+        .filter(models.CartItem.cart_id == cart_id)
+    )
+    return result.one()
+
+@router.post("/payments/create-intent", response_model=schemas.PaymentIntentResponse)
+async def create_payment_intent(
+    intent_data: schemas.PaymentIntentCreate,
+    current_user_id: str = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Congela importe, moneda y versión del carrito (o el pedido) al iniciar el pago
+    """
+    cart_id = cart_version = None
+    if intent_data.order_id:
+        result = await db.execute(select(models.Order.total_amount, models.Order.status).filter(
+            models.Order.id == intent_data.order_id,
+            models.Order.user_id == current_user_id
+        ))
+        order = result.first()
+        if order is None:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        if order.status != "pending":
+            raise HTTPException(status_code=409, detail="El pedido ya no está pendiente de pago")
+        amount = order.total_amount
+    else:
+        cart = await _get_or_create_cart(current_user_id, db)
+        lines, amount = await _cart_total(cart.id, db)
+        if not lines:
+            raise HTTPException(status_code=400, detail="El carrito está vacío")
+        cart_id, cart_version = cart.id, cart.version
+    
+    if not same_amount(intent_data.amount, amount):
+        raise HTTPException(status_code=400, detail="El monto no coincide con el carrito actual")
+    
+    intent = models.PaymentIntent(
+        id=new_id(),
+        user_id=current_user_id,
+        amount=amount,
+        currency=intent_data.currency,
+        cart_id=cart_id,
+        cart_version=cart_version,
+        order_id=intent_data.order_id,
+        status="requires_payment",
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=PAYMENT_INTENT_TTL)
+    )
+    db.add(intent)
+    await db.commit()
+    
+    return schemas.PaymentIntentResponse(
+        id=intent.id,
+        amount=intent.amount,
+        currency=intent.currency,
+        status=intent.status,
+        order_id=intent.order_id,
+        expires_at=intent.expires_at
+    )
+
+async def _create_order(db: AsyncSession, user_id: str, items: Iterable) -> Tuple[str, int]:
+    """
+    Pedido pendiente con sus líneas (nombre y precio congelados) y la reserva de stock, sin commit.
+    Lanza InsufficientStock si algún producto no existe o no alcanza (el llamador hace rollback).
+    """
+    items = list(items)
+    # Todos los productos del pedido y el total, SUM(precio * cantidad) OVER (), en una sola consulta IN (...)
+    quantities = inventory.quantities_by_product(items)
+    products, total_amount = {}, 0
+    if quantities:
+        result = await db.execute(
+            select(
+                models.Product.id,
+                models.Product.name,
+                models.Product.price,
+                type_coerce(
+                    func.sum(models.Product.price * inventory.quantity_case(quantities)).over(), models.Money()
+                ).label("order_total"),
+            )
+            .filter(models.Product.id.in_(list(quantities)))
+        )
+        rows = result.all()
+        products = {row.id: row for row in rows}
+        total_amount = rows[0].order_total if rows else 0
+    missing = sorted(quantities.keys() - products.keys())
+    if missing:
+        raise inventory.InsufficientStock(missing)
+    
+    order_id = new_id()
+    order_items = []
+    for item in items:
+        product = products[item.product_id]
+        order_items.append({
+            "id": new_id(),
+            "order_id": order_id,
+            "product_id": item.product_id,
+            "quantity": max(1, item.quantity),
+            "prescription_file": item.prescription_file,
+            "name": product.name,
+            "unit_price": product.price
+        })
+    
+    # Pedido, líneas (un INSERT multi-fila) y reserva de stock en la transacción del llamador
+    db.add(models.Order(id=order_id, user_id=user_id, total_amount=total_amount, status="pending"))
+    await db.flush()
+    if order_items:
+        await db.execute(insert(models.OrderItem), order_items)
+    # Reserva al final para que los bloqueos de fila en products duren lo mínimo
+    await inventory.reserve_stock(db, order_id, items)
+    return order_id, total_amount
+
+async def _order_from_cart(intent: models.PaymentIntent, user_id: str, db: AsyncSession) -> Optional[str]:
+    """
+    Convierte el carrito del intento en un pedido con stock reservado y vacía el carrito, sin commit.
+    None si el carrito o sus precios cambiaron desde el intento; InsufficientStock si algo no alcanza.
+    """
+    # Solo si el carrito sigue en la versión congelada; el UPDATE bloquea su fila hasta el commit,
+    # así ningún cambio de líneas se cuela entre la lectura y el vaciado
+    result = await db.execute(
+        update(models.Cart)
+        .where(models.Cart.id == intent.cart_id, models.Cart.version == intent.cart_version)
+        .values(version=models.Cart.version + 1, updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        return None
+    result = await db.execute(select(models.CartItem).filter(models.CartItem.cart_id == intent.cart_id))
+    order_id, total_amount = await _create_order(db, user_id, result.scalars().all())
+    if not same_amount(total_amount, intent.amount):
+        return None
+    await db.execute(delete(models.CartItem).where(models.CartItem.cart_id == intent.cart_id))
+    return order_id
+
 @router.post("/payments/process", response_model=schemas.PaymentResponse)
 async def process_payment(
     payment_request: schemas.PaymentRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    return await idempotency.run(
+        db, idempotency_key, current_user_id, "payments.process", payment_request,
+        lambda: _process_payment(payment_request, current_user_id, db)
+    )
+
+async def _process_payment(payment_request: schemas.PaymentRequest, current_user_id: str, db: AsyncSession):
     try:
-        cart = await _get_or_create_cart(current_user_id, db)
-        enriched_cart = await _enrich_cart(cart, db)
-        cart_total = sum(item["price"] * item["quantity"] for item in enriched_cart["items"])
+        if not payment_request.payment_intent_id:
+            return schemas.PaymentResponse(success=False, error="Falta el intento de pago (payment_intent_id)")
         
-        if abs(payment_request.amount - cart_total) > 0.01:
-            return schemas.PaymentResponse(success=False, error="El monto no coincide con el carrito actual")
+        # Una sola lectura por clave primaria: el intento, la versión actual de su carrito y el estado de su pedido
+        result = await db.execute(
+            select(models.PaymentIntent, models.Cart.version, models.Order.status)
+            .outerjoin(models.Cart, models.Cart.id == models.PaymentIntent.cart_id)
+            .outerjoin(models.Order, models.Order.id == models.PaymentIntent.order_id)
+            .filter(
+                models.PaymentIntent.id == payment_request.payment_intent_id,
+                models.PaymentIntent.user_id == current_user_id
+            )
+        )
+        row = result.first()
+        if row is None:
+            return schemas.PaymentResponse(success=False, error="Intento de pago no encontrado")
+        intent, cart_version, order_status = row
+        
+        error = _intent_error(intent, cart_version, order_status, payment_request)
+        if error:
+            return schemas.PaymentResponse(success=False, error=error)
         
         if not validate_card_number(payment_request.card.cardNumber):
             return schemas.PaymentResponse(success=False, error="Número de tarjeta inválido")
@@ -89,41 +278,75 @@ async def process_payment(
         if not (3 <= len(cvv) <= 4 and cvv.isdigit()):
             return schemas.PaymentResponse(success=False, error="CVV inválido")
         
+        order_id = intent.order_id
+        if intent.cart_id:
+            # Pedido y reserva de stock antes de cobrar, en la misma transacción que el cobro:
+            # si el banco rechaza el pago, el rollback devuelve el stock y deja el carrito como estaba
+            await inventory.sweep_expired(db)
+            try:
+                order_id = await _order_from_cart(intent, current_user_id, db)
+            except inventory.InsufficientStock:
+                await db.rollback()
+                return schemas.PaymentResponse(success=False, error="Stock insuficiente para algunos productos del carrito")
+            if order_id is None:
+                await db.rollback()
+                return schemas.PaymentResponse(success=False, error="El carrito cambió, vuelve a iniciar el pago")
+        
         success = secrets.SystemRandom().random() > 0.3
         
         if success:
             transaction_id = f"TXN_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
             
+            # Cada intento se cobra una sola vez
+            result = await db.execute(
+                update(models.PaymentIntent)
+                .where(models.PaymentIntent.id == intent.id, models.PaymentIntent.status == "requires_payment")
+                .values(status="succeeded", order_id=order_id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                return schemas.PaymentResponse(success=False, error="El intento de pago ya fue procesado")
+            
+            # Consolida la reserva de stock; falla si el barrido expiró el pedido mientras tanto
+            if not await inventory.confirm_order_payment(db, order_id, current_user_id, transaction_id):
+                await db.rollback()
+                return schemas.PaymentResponse(success=False, error="El pedido expiró, vuelve a iniciar el pago")
+            
             transaction_data = models.PaymentTransaction(
-                id=str(uuid.uuid4()),
+                id=new_id(),
                 transaction_id=transaction_id,
                 email=payment_request.email,
                 user_id=current_user_id,
-                amount=payment_request.amount,
-                currency=payment_request.currency,
+                amount=intent.amount,
+                currency=intent.currency,
                 card_last_four=payment_request.card.cardNumber[-4:],
                 card_type=get_card_type(payment_request.card.cardNumber),
                 status="completed",
-                order_id=payment_request.order_id
+                order_id=order_id
             )
             
             db.add(transaction_data)
-            
-            if payment_request.order_id:
-                order = db.query(models.Order).filter(models.Order.id == payment_request.order_id).first()
-                if order:
-                    order.status = "paid"
-                    order.payment_session_id = transaction_id
-            
-            db.commit()
+            await db.commit()
+            await read_your_writes.mark_write(current_user_id)
             
             return schemas.PaymentResponse(success=True, transactionId=transaction_id)
         else:
+            if intent.cart_id:
+                # Pedido, reserva y vaciado del carrito aún sin confirmar: el rollback los deshace
+                await db.rollback()
+            else:
+                # Pago rechazado: el stock reservado vuelve a estar disponible
+                await inventory.release_order(db, order_id, "payment_failed")
+                await db.commit()
+                await read_your_writes.mark_write(current_user_id)
             return schemas.PaymentResponse(success=False, error="Tarjeta rechazada por el banco emisor")
             
     except Exception as e:
-        db.rollback()
-        return schemas.PaymentResponse(success=False, error="Error interno del servidor")
+        logger.error(f"Error processing payment {payment_request.payment_intent_id}: {str(e)}")
+        await db.rollback()
+        # 5xx y no una respuesta 200: idempotency.run libera la clave y el reintento vuelve a procesar
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @router.post("/payments/validate-card", response_model=schemas.CardValidationResponse)
 async def validate_card(card_request: schemas.CardValidationRequest):
@@ -143,50 +366,45 @@ async def validate_card(card_request: schemas.CardValidationRequest):
         return schemas.CardValidationResponse(valid=True, cardType=card_type)
         
     except Exception as e:
+        logger.error(f"Error validating card: {str(e)}")
         return schemas.CardValidationResponse(valid=False, error="Error interno del servidor")
 
 @router.post("/payments/checkout")
 async def create_checkout_session(
     checkout_data: schemas.CheckoutRequest, 
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user_id: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    # Un reintento con la misma clave devuelve el mismo pedido en lugar de crear otro
+    return await idempotency.run(
+        db, idempotency_key, current_user_id, "payments.checkout", checkout_data,
+        lambda: _create_checkout_session(checkout_data, current_user_id, db)
+    )
+
+async def _create_checkout_session(checkout_data: schemas.CheckoutRequest, current_user_id: str, db: AsyncSession):
+    # Devuelve al stock las reservas de pedidos pendientes que ya vencieron
+    await inventory.sweep_expired(db)
     try:
-        total_amount = 0
-        for item in checkout_data.cart_items:
-            product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-            if product:
-                total_amount += product.price * item.quantity
-        
-        order = models.Order(
-            id=str(uuid.uuid4()),
-            user_id=current_user_id,
-            total_amount=total_amount,
-            status="pending"
-        )
-        db.add(order)
-        db.commit()
-        db.refresh(order)
-        
-        for item in checkout_data.cart_items:
-            order_item = models.OrderItem(
-                id=str(uuid.uuid4()),
-                order_id=order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                prescription_file=item.prescription_file
-            )
-            db.add(order_item)
-        
-        db.commit()
+        order_id, total_amount = await _create_order(db, current_user_id, checkout_data.cart_items)
+        await db.commit()
+        await read_your_writes.mark_write(current_user_id)
         
         return {
-            "order_id": order.id,
+            "order_id": order_id,
             "total_amount": total_amount,
             "currency": "COP",
-            "status": "pending"
+            "status": "pending",
+            "reservation_expires_in": inventory.STOCK_RESERVATION_TTL
         }
         
+    except inventory.InsufficientStock as e:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail={
+            "message": "Stock insuficiente",
+            "product_ids": e.product_ids
+        })
     except Exception as e:
-        db.rollback()
+        logger.error(f"Error creating checkout for user {current_user_id}: {str(e)}")
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Error al crear sesión de checkout")
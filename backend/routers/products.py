@@ -1,32 +1,140 @@
-
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import base64
+import json
+import os
 
 from .. import models, schemas
-from ..database import get_db
+from ..routing import get_read_db, SessionReleasingRoute
+from ..catalog_cache import catalog_cache
+from ..cache_backend import cached_json, product_key
+from ..http_cache import make_etag, is_not_modified, not_modified_response, set_cache_headers
+from ..search import search_index
+from ..suggest import product_suggester
+
+router = APIRouter(route_class=SessionReleasingRoute)
+
+PRODUCTS_PAGE_SIZE = 50
+PRODUCTS_MAX_PAGE_SIZE = 200
+SUGGEST_MAX_RESULTS = 20
+CATALOG_CACHE_CONTROL = f"public, max-age={os.environ.get('CATALOG_HTTP_MAX_AGE', '30')}"
+
+def _encode_cursor(position) -> str:
+    raw = json.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
-router = APIRouter()
+def _decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _search_products(
+    response: Response,
+    snapshot,
+    search: str,
+    category: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    include_total: bool
+) -> List[schemas.ProductResponse]:
+    # Búsqueda por relevancia en el índice invertido; el cursor es la posición en el ranking
+    offset = 0
+    if cursor:
+        position = _decode_cursor(cursor)
+        if not isinstance(position, dict) or not isinstance(position.get("offset"), int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        offset = max(0, position["offset"])
+    
+    page_ids, has_more, total = search_index.search(
+        search, category=category, offset=offset, limit=limit, with_total=include_total
+    )
+    if include_total:
+        response.headers["X-Total-Count"] = str(total)
+    if has_more:
+        response.headers["X-Next-Cursor"] = _encode_cursor({"offset": offset + limit})
+    
+    return [snapshot.by_id[product_id] for product_id in page_ids if product_id in snapshot.by_id]
+
+async def _load_product(product_id: str, db: AsyncSession):
+    result = await db.execute(select(models.Product).filter(models.Product.id == product_id, models.Product.active == True))
+    product = result.scalars().first()
+    return schemas.ProductResponse.from_orm(product).model_dump(mode="json") if product else None
 
 @router.get("/products", response_model=List[schemas.ProductResponse])
 async def get_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = None, 
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    limit: int = Query(PRODUCTS_PAGE_SIZE, ge=1, le=PRODUCTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(models.Product).filter(models.Product.active == True)
+    snapshot = await catalog_cache.get(db)
+    # Con la primera carga del catálogo empieza a construirse el autocompletado, antes de que se pida
+    product_suggester.start_loading(snapshot)
+    # La página depende solo de la URL y del contenido del catálogo
+    if is_not_modified(request, snapshot.etag):
+        return not_modified_response(snapshot.etag, CATALOG_CACHE_CONTROL)
+    set_cache_headers(response, snapshot.etag, CATALOG_CACHE_CONTROL)
     
-    if category:
-        query = query.filter(models.Product.category == category)
     if search:
-        query = query.filter(models.Product.name.ilike(f"%{search}%"))
+        await search_index.sync(snapshot)
+        return _search_products(response, snapshot, search, category, limit, cursor, include_total)
+    
+    # Paginación keyset sobre (name, id): orden estable y sin OFFSET
+    after = None
+    if cursor:
+        position = _decode_cursor(cursor)
+        # (name, id) del último producto: cualquier otra cosa haría fallar la comparación en bisect
+        if not (isinstance(position, list) and len(position) == 2 and all(isinstance(part, str) for part in position)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = tuple(position)
+    
+    products, has_more, total = snapshot.page(category=category, after=after, limit=limit)
+    if include_total:
+        response.headers["X-Total-Count"] = str(total)
+    if has_more:
+        response.headers["X-Next-Cursor"] = _encode_cursor([products[-1].name, products[-1].id])
     
-    products = query.all()
-    return [schemas.ProductResponse.from_orm(product) for product in products]
+    return products
+
+@router.get("/products/suggest", response_model=List[schemas.ProductSuggestion])
+async def suggest_products(
+    q: str,
+    limit: int = Query(10, ge=1, le=SUGGEST_MAX_RESULTS),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Carga inicial desde el snapshot del catálogo, en segundo plano; después se actualiza con cada
+    # cambio de producto. Hasta que termina no hay sugerencias (la búsqueda de /products sí funciona)
+    if not product_suggester.loaded:
+        product_suggester.start_loading(await catalog_cache.get(db))
+        return []
+    return product_suggester.suggest(q, limit=limit)
 
 @router.get("/products/{product_id}", response_model=schemas.ProductResponse)
-async def get_product(product_id: str, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id, models.Product.active == True).first()
+async def get_product(
+    product_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
+):
+    snapshot = catalog_cache.peek()
+    if snapshot is not None:
+        product = snapshot.by_id.get(product_id)
+        etag = snapshot.product_etags.get(product_id)
+    else:
+        # Worker sin snapshot vigente: una fila desde la caché compartida en lugar de todo el catálogo
+        data = await cached_json(product_key(product_id), lambda: _load_product(product_id, db))
+        product = schemas.ProductResponse.model_validate(data) if data else None
+        etag = make_etag(product.model_dump_json()) if product else None
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return schemas.ProductResponse.from_orm(product)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, CATALOG_CACHE_CONTROL)
+    set_cache_headers(response, etag, CATALOG_CACHE_CONTROL)
+    return product
@@ -0,0 +1,60 @@
+"""Capa web de las sesiones: dependencias get_db/get_read_db y la ruta que las libera al retornar el endpoint."""
+from fastapi import Request
+from fastapi.routing import APIRoute
+from contextvars import ContextVar
+from typing import List, Optional
+import functools
+import inspect
+
+from .database import AsyncSessionLocal, ReadSessionLocal, LazyAsyncSession
+
+_request_sessions: ContextVar[Optional[List[LazyAsyncSession]]] = ContextVar("request_sessions", default=None)
+
+def _route_path(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
+def _open_session(request: Request, factory, read_only: bool) -> LazyAsyncSession:
+    if factory is None:
+        raise RuntimeError("Async database engine disabled (DB_MODE=sync)")
+    db = LazyAsyncSession(factory, f"{request.method} {_route_path(request)}", read_only=read_only)
+    sessions = _request_sessions.get()
+    if sessions is None:
+        sessions = []
+        _request_sessions.set(sessions)
+    sessions.append(db)
+    return db
+
+async def get_db(request: Request):
+    db = _open_session(request, AsyncSessionLocal, read_only=False)
+    try:
+        yield db
+    finally:
+        await db.release()
+
+async def get_read_db(request: Request):
+    """Sesión para endpoints de solo lectura: réplica en round-robin con failover al primario"""
+    db = _open_session(request, ReadSessionLocal, read_only=True)
+    try:
+        yield db
+    finally:
+        await db.release()
+
+def _release_after(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            # Antes de serializar y enviar la respuesta, no al cerrar las dependencias
+            for db in _request_sessions.get() or ():
+                await db.release()
+    return wrapper
+
+class SessionReleasingRoute(APIRoute):
+    """Ruta que libera las sesiones de get_db/get_read_db en cuanto el endpoint (async) retorna"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _release_after(endpoint)
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,183 @@
+"""Migraciones versionadas: backend/migrations/NNNN_nombre.(sql|py) y la tabla schema_version con las aplicadas."""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Set
+import importlib.util
+import logging
+import re
+
+# Sin imports del paquete: lo usan tanto server.py (from schema_migrations) como backend.migrate
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+VERSION_TABLE = "schema_version"
+# Sentencias ya aplicadas de una migración .sql a medias: al repetirla no se vuelven a ejecutar
+STEPS_TABLE = "schema_version_steps"
+# Un solo proceso migra a la vez aunque se lance desde varias máquinas
+MIGRATION_LOCK = "farmachelo_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+_MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+def available_migrations() -> List[Migration]:
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.iterdir()):
+        match = _MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+    return migrations
+
+def latest_version() -> int:
+    migrations = available_migrations()
+    return migrations[-1].version if migrations else 0
+
+def _has_table(connection: Connection, table: str) -> bool:
+    return connection.execute(text(
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {"table": table}).scalar() > 0
+
+def current_version(connection: Connection) -> Optional[int]:
+    """Última versión aplicada; None si la base nunca pasó por el runner o no completó ninguna migración"""
+    if not _has_table(connection, VERSION_TABLE):
+        return None
+    return connection.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar()
+
+def check_schema_version(connection: Connection):
+    """
+    Comprobación de arranque: una lectura de schema_version, sin reflejar tablas ni hacer DDL.
+    Falla si faltan migraciones; una versión mayor (despliegue escalonado) se acepta.
+    """
+    version, expected = current_version(connection), latest_version()
+    if version is None or version < expected:
+        raise SchemaVersionError(
+            f"Esquema en la versión {version if version is not None else '(sin migrar)'}, se esperaba {expected}: "
+            f"ejecuta python -m backend.migrate upgrade"
+        )
+    logger.info(f"Schema version {version} (expected {expected})")
+
+def _record(connection: Connection, migration: Migration):
+    connection.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, UTC_TIMESTAMP())"),
+        {"version": migration.version, "name": migration.name}
+    )
+
+def _record_step(connection: Connection, migration: Migration, step: int):
+    connection.execute(
+        text(f"INSERT INTO {STEPS_TABLE} (version, step, applied_at) VALUES (:version, :step, UTC_TIMESTAMP())"),
+        {"version": migration.version, "step": step}
+    )
+
+def _applied_steps(connection: Connection, migration: Migration) -> Set[int]:
+    return set(connection.execute(
+        text(f"SELECT step FROM {STEPS_TABLE} WHERE version = :version"), {"version": migration.version}
+    ).scalars().all())
+
+def _create_version_table(connection: Connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        ) ENGINE=InnoDB
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STEPS_TABLE} (
+            version INT NOT NULL,
+            step INT NOT NULL,
+            applied_at DATETIME NOT NULL,
+            PRIMARY KEY (version, step)
+        ) ENGINE=InnoDB
+    """))
+
+def _sql_statements(script: str) -> List[str]:
+    # Sentencias separadas por ';' a final de línea; los comentarios '--' de línea completa se quitan
+    lines = [line for line in script.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in re.split(r";\s*$", "\n".join(lines), flags=re.MULTILINE) if statement.strip()]
+
+def _apply(connection: Connection, migration: Migration):
+    if migration.path.suffix == ".sql":
+        # Progreso por sentencia: si la migración falla a medias, al repetirla se salta lo ya aplicado
+        # (un UPDATE ... * 100 no se repite). Un UPDATE y su registro van en el mismo commit; el DDL
+        # de MySQL hace commit implícito, así que se registra justo después.
+        done = _applied_steps(connection, migration)
+        for step, statement in enumerate(_sql_statements(migration.path.read_text(encoding="utf-8"))):
+            if step in done:
+                continue
+            connection.exec_driver_sql(statement)
+            _record_step(connection, migration, step)
+            connection.commit()
+    else:
+        # Las migraciones .py comprueban el estado antes de cada cambio y se pueden repetir enteras
+        spec = importlib.util.spec_from_file_location(f"migration_{migration.version:04d}", migration.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(connection)
+    _record(connection, migration)
+    connection.execute(text(f"DELETE FROM {STEPS_TABLE} WHERE version = :version"), {"version": migration.version})
+    connection.commit()
+
+def _locked(engine: Engine, action: Callable[[Connection], None]):
+    with engine.connect() as connection:
+        if not connection.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                                  {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT}).scalar():
+            raise SchemaVersionError("Otra migración está en curso")
+        try:
+            action(connection)
+        finally:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
+
+def upgrade(engine: Engine, create_schema: Callable[[Connection], None]) -> List[Migration]:
+    """
+    Aplica las migraciones pendientes en orden. Una base vacía se crea entera con create_schema
+    (el esquema actual de models.py) y queda en la última versión; una base anterior al runner
+    (tablas creadas por create_all al arrancar) empieza desde 0000_baseline, que completa ese esquema.
+    """
+    applied: List[Migration] = []
+
+    def run(connection: Connection):
+        version = current_version(connection)
+        migrations = available_migrations()
+        fresh = version is None and not _has_table(connection, "users")
+        _create_version_table(connection)
+        if fresh:
+            create_schema(connection)
+            for migration in migrations:
+                _record(connection, migration)
+            connection.commit()
+            logger.info(f"Empty database: created the current schema at version {latest_version()}")
+            return
+        connection.commit()
+        if version is None:
+            version = -1
+        for migration in migrations:
+            if migration.version > version:
+                logger.info(f"Applying migration {migration.path.name}")
+                _apply(connection, migration)
+                applied.append(migration)
+
+    _locked(engine, run)
+    return applied
+
+def stamp(engine: Engine, version: int):
+    """Marca la base como migrada hasta version sin ejecutar nada (bases ya al día por otra vía)"""
+    def run(connection: Connection):
+        _create_version_table(connection)
+        current = current_version(connection)
+        if current is None:
+            current = -1
+        for migration in available_migrations():
+            if current < migration.version <= version:
+                _record(connection, migration)
+        connection.commit()
+
+    _locked(engine, run)
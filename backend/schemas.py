@@ -51,6 +51,10 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductSuggestion(BaseModel):
+    id: str
+    name: str
+
 class CartItemModel(BaseModel):
     product_id: str
     quantity: int
@@ -78,12 +82,26 @@ class PaymentCard(BaseModel):
     cardholderName: str
     country: str
 
+class PaymentIntentCreate(BaseModel):
+    amount: float
+    currency: str = "COP"
+    order_id: Optional[str] = None
+
+class PaymentIntentResponse(BaseModel):
+    id: str
+    amount: float
+    currency: str
+    status: str
+    order_id: Optional[str] = None
+    expires_at: datetime
+
 class PaymentRequest(BaseModel):
     email: EmailStr
     card: PaymentCard
     amount: float
     currency: str = "COP"
     order_id: Optional[str] = None
+    payment_intent_id: Optional[str] = None
 
 class PaymentResponse(BaseModel):
     success: bool
@@ -0,0 +1,218 @@
+"""Índice invertido en memoria para la búsqueda de productos (nombre y descripción)."""
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from itertools import islice
+import asyncio
+import bisect
+import heapq
+import math
+import os
+import re
+import unicodedata
+
+NAME_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Un último término más corto no se expande como prefijo ("vitamina c" -> solo "c"): con una o dos
+# letras la expansión abarca miles de términos y la búsqueda deja de costar unos pocos milisegundos
+SEARCH_MIN_PREFIX = int(os.environ.get('SEARCH_MIN_PREFIX', '3'))
+
+STOPWORDS = {"a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los", "para", "por", "un", "una", "y"}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes: 'Acetaminofén' -> 'acetaminofen'"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(normalize(text)) if t not in STOPWORDS]
+
+class SearchState(NamedTuple):
+    """Índice completo e inmutable: se construye aparte y se publica con una sola asignación"""
+    version: int
+    source_version: int
+    postings: Dict[str, Dict[int, float]]
+    ranked: Dict[str, List[int]]
+    terms: List[str]
+    product_ids: List[str]
+    sort_names: List[str]
+    categories: List[str]
+
+    def expand_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\uffff")
+        return self.terms[start:end]
+
+    def weighted_stream(self, term: str) -> Iterator[Tuple[float, str, int]]:
+        weights = self.postings[term]
+        for doc in self.ranked[term]:
+            yield -weights[doc], self.sort_names[doc], doc
+
+    def iter_single_token(self, terms: List[str]) -> Iterator[int]:
+        """Recorre los productos de un solo término (o de sus expansiones) en orden de relevancia sin puntuar todo"""
+        if len(terms) == 1:
+            yield from self.ranked[terms[0]]
+            return
+        streams = [self.weighted_stream(term) for term in terms]
+        seen = set()
+        for _, _, doc in heapq.merge(*streams):
+            if doc not in seen:
+                seen.add(doc)
+                yield doc
+
+    def iter_multi_token(self, token_terms: List[List[str]]) -> Iterator[int]:
+        candidates = None
+        for terms in sorted(token_terms, key=lambda ts: sum(len(self.postings[t]) for t in ts)):
+            postings = [self.postings[t] for t in terms]
+            if candidates is None:
+                candidates = set().union(*postings)
+            else:
+                # Se filtra el conjunto más pequeño en lugar de construir el de un término frecuente
+                candidates = {doc for doc in candidates if any(doc in weights for weights in postings)}
+            if not candidates:
+                return
+        scores = dict.fromkeys(candidates, 0.0)
+        for terms in token_terms:
+            if len(terms) == 1:
+                weights = self.postings[terms[0]]
+                for doc in candidates:
+                    scores[doc] += weights[doc]
+            else:
+                for doc in candidates:
+                    scores[doc] += max(self.postings[t].get(doc, 0.0) for t in terms)
+        # Orden perezoso: una página cuesta O(n + k log n) en lugar de ordenar todos los candidatos
+        heap = [(-score, self.sort_names[doc], doc) for doc, score in scores.items()]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+EMPTY_STATE = SearchState(0, 0, {}, {}, [], [], [], [])
+
+def build_state(rows, version: int, source_version: int = 0) -> SearchState:
+    """rows: iterable de (id, name, description, category)"""
+    product_ids: List[str] = []
+    sort_names: List[str] = []
+    categories: List[str] = []
+    doc_lengths: List[int] = []
+    term_freqs: Dict[str, Dict[int, int]] = {}
+
+    for doc, (product_id, name, description, category) in enumerate(rows):
+        name_tokens = tokenize(name)
+        description_tokens = tokenize(description)
+        product_ids.append(product_id)
+        sort_names.append(normalize(name))
+        categories.append(category)
+        doc_lengths.append(NAME_WEIGHT * len(name_tokens) + len(description_tokens))
+        for token in name_tokens:
+            freqs = term_freqs.setdefault(token, {})
+            freqs[doc] = freqs.get(doc, 0) + NAME_WEIGHT
+        for token in description_tokens:
+            freqs = term_freqs.setdefault(token, {})
+            freqs[doc] = freqs.get(doc, 0) + 1
+
+    # Pesos BM25 precalculados por (término, producto) y listas ya ordenadas por peso
+    total_docs = len(product_ids) or 1
+    avg_length = (sum(doc_lengths) / total_docs) or 1
+    postings: Dict[str, Dict[int, float]] = {}
+    ranked: Dict[str, List[int]] = {}
+    for term, freqs in term_freqs.items():
+        idf = math.log(1 + (total_docs - len(freqs) + 0.5) / (len(freqs) + 0.5))
+        weights = {
+            doc: idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc] / avg_length))
+            for doc, tf in freqs.items()
+        }
+        postings[term] = weights
+        ranked[term] = sorted(weights, key=lambda doc: (-weights[doc], sort_names[doc]))
+
+    return SearchState(
+        version=version,
+        source_version=source_version,
+        postings=postings,
+        ranked=ranked,
+        terms=sorted(postings),
+        product_ids=product_ids,
+        sort_names=sort_names,
+        categories=categories,
+    )
+
+class ProductSearchIndex:
+    def __init__(self):
+        # Las búsquedas leen self._state una sola vez: nunca ven un índice a medio publicar
+        self._state: SearchState = EMPTY_STATE
+        self._building: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> int:
+        return self._state.version
+
+    @property
+    def source_version(self) -> int:
+        return self._state.source_version
+
+    def build(self, rows, source_version: int = 0):
+        self._state = build_state(rows, self._state.version + 1, source_version)
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+        with_total: bool = False,
+    ) -> Tuple[List[str], bool, Optional[int]]:
+        """Productos que contienen todos los términos, ordenados por relevancia.
+        El último término se trata como prefijo para la búsqueda mientras se escribe
+        (desde SEARCH_MIN_PREFIX caracteres; más corto debe coincidir completo).
+        Devuelve (ids de la página, hay más páginas, total si se pidió)."""
+        state = self._state
+        tokens = tokenize(query)
+        token_terms = []
+        for position, token in enumerate(tokens):
+            if position == len(tokens) - 1 and len(token) >= SEARCH_MIN_PREFIX:
+                terms = state.expand_prefix(token)
+            else:
+                terms = [token] if token in state.postings else []
+            if not terms:
+                return [], False, 0 if with_total else None
+            token_terms.append(terms)
+        if not token_terms:
+            return [], False, 0 if with_total else None
+
+        if len(token_terms) == 1:
+            matches = state.iter_single_token(token_terms[0])
+        else:
+            matches = state.iter_multi_token(token_terms)
+        if category:
+            matches = (doc for doc in matches if state.categories[doc] == category)
+
+        if with_total:
+            ordered = list(matches)
+            page = ordered[offset:offset + limit]
+            has_more = offset + limit < len(ordered)
+            total = len(ordered)
+        else:
+            window = list(islice(matches, offset, offset + limit + 1))
+            page = window[:limit]
+            has_more = len(window) > limit
+            total = None
+
+        return [state.product_ids[doc] for doc in page], has_more, total
+
+    async def sync(self, snapshot):
+        """Reconstruye el índice cuando cambia la versión del snapshot del catálogo.
+        Mientras tanto se sigue respondiendo con el índice anterior."""
+        if self.source_version == snapshot.version:
+            return
+        if self._building is None or self._building.done():
+            rows = [(p.id, p.name, p.description, p.category) for p in snapshot.products]
+            self._building = asyncio.create_task(self._rebuild(snapshot.version, rows))
+        if self.version == 0:
+            await asyncio.shield(self._building)
+
+    async def _rebuild(self, source_version: int, rows):
+        # El hilo solo construye; la publicación es una única asignación de referencia
+        state = await asyncio.to_thread(build_state, rows, self._state.version + 1, source_version)
+        self._state = state
+
+search_index = ProductSearchIndex()
@@ -0,0 +1,69 @@
+# seed.py
+# Datos iniciales (productos de ejemplo y administrador por defecto). Se ejecuta una vez, a mano,
+# después de python -m backend.migrate upgrade:
+#   python -m backend.seed
+import os
+
+from backend import sync_mode
+sync_mode.use_sync_engine()
+
+from backend import models
+from backend.auth import hash_password
+from backend.database import SessionLocal
+from backend.ids import new_id
+
+ADMIN_EMAIL = os.environ.get('SEED_ADMIN_EMAIL', 'admin@farmachelo.com')
+ADMIN_PASSWORD = os.environ.get('SEED_ADMIN_PASSWORD', 'admin123')
+
+SAMPLE_PRODUCTS = [
+    {
+        "name": "Paracetamol 500mg",
+        "description": "Analgésico y antipirético para alivio del dolor y fiebre",
+        "price": 8500,
+        "category": "over_counter",
+        "stock": 100,
+        "image_url": "https://images.unsplash.com/photo-1631549916768-4119b2e5f926?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2Mzl8MHwxfHNlYXJjaHw0fHxwaGFybWFjeXxlbnwwfHx8fDE3NTYyNTEyMjd8MA&ixlib=rb-4.1.0&q=85",
+        "requires_prescription": False,
+    },
+    {
+        "name": "Ibuprofeno 400mg",
+        "description": "Antiinflamatorio no esteroideo para dolor e inflamación",
+        "price": 12000,
+        "category": "over_counter",
+        "stock": 85,
+        "image_url": "https://images.pexels.com/photos/139398/thermometer-headache-pain-pills-139398.jpeg",
+        "requires_prescription": False,
+    },
+]
+
+def seed():
+    db = SessionLocal()
+    try:
+        if db.query(models.Product.id).first() is None:
+            print("➕ Añadiendo productos de ejemplo...")
+            db.add_all(models.Product(id=new_id(), **product) for product in SAMPLE_PRODUCTS)
+            db.commit()
+            print(f"✅ {len(SAMPLE_PRODUCTS)} productos añadidos")
+        else:
+            print("ℹ️ Ya hay productos: no se añaden los de ejemplo")
+
+        if db.query(models.AdminUser.id).filter(models.AdminUser.email == ADMIN_EMAIL).first() is None:
+            print("➕ Creando administrador por defecto...")
+            db.add(models.AdminUser(
+                id=new_id(),
+                email=ADMIN_EMAIL,
+                name="Administrador Principal",
+                password=hash_password(ADMIN_PASSWORD)
+            ))
+            db.commit()
+            print(f"✅ Administrador creado. Email: {ADMIN_EMAIL}, Password: {ADMIN_PASSWORD}")
+        else:
+            print(f"ℹ️ El administrador {ADMIN_EMAIL} ya existe")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    seed()
@@ -16,7 +16,8 @@ import base64
 import secrets
 import os
 import logging
-import uuid
+from ids import new_id
+from schema_migrations import check_schema_version
 import hashlib
 import json
 import shutil
@@ -90,66 +91,12 @@ def validate_expiry_date(expiry_date: str) -> bool:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup - Crear tablas
-    logger.info("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    
-    # Inicializar datos de ejemplo
-    db = SessionLocal()
-    try:
-        # Verificar si ya existen productos
-        existing_products = db.query(Product).count()
-        if existing_products == 0:
-            logger.info("Initializing database with sample products...")
-            
-            sample_products = [
-                Product(
-                    id=str(uuid.uuid4()),
-                    name="Paracetamol 500mg",
-                    description="Analgésico y antipirético para alivio del dolor y fiebre",
-                    price=8500.0,
-                    category="over_counter",
-                    stock=100,
-                    image_url="https://images.unsplash.com/photo-1631549916768-4119b2e5f926?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2Mzl8MHwxfHNlYXJjaHw0fHxwaGFybWFjeXxlbnwwfHx8fDE3NTYyNTEyMjd8MA&ixlib=rb-4.1.0&q=85",
-                    requires_prescription=False
-                ),
-                Product(
-                    id=str(uuid.uuid4()),
-                    name="Ibuprofeno 400mg",
-                    description="Antiinflamatorio no esteroideo para dolor e inflamación",
-                    price=12000.0,
-                    category="over_counter",
-                    stock=85,
-                    image_url="https://images.pexels.com/photos/139398/thermometer-headache-pain-pills-139398.jpeg",
-                    requires_prescription=False
-                )
-            ]
-            
-            for product in sample_products:
-                db.add(product)
-            db.commit()
-            logger.info("Sample products added successfully!")
-        
-        # Crear administrador por defecto si no existe
-        admin_email = "admin@farmachelo.com"
-        existing_admin = db.query(AdminUser).filter(AdminUser.email == admin_email).first()
-        if not existing_admin:
-            logger.info("Creating default admin user...")
-            admin_user = AdminUser(
-                id=str(uuid.uuid4()),
-                email=admin_email,
-                name="Administrador Principal",
-                password=hash_password("admin123")
-            )
-            db.add(admin_user)
-            db.commit()
-            logger.info("Default admin user created! Email: admin@farmachelo.com, Password: admin123")
-            
-    except Exception as e:
-        logger.error(f"Error during startup: {str(e)}")
-        db.rollback()
-    finally:
-        db.close()
+    # Startup - Solo se comprueba la versión del esquema (una lectura de schema_version).
+    # Migraciones y datos iniciales son comandos aparte que se ejecutan una vez por despliegue:
+    #   python -m backend.migrate upgrade
+    #   python -m backend.seed
+    with engine.connect() as connection:
+        check_schema_version(connection)
     
     yield
     
@@ -170,6 +117,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Next-Before", "Idempotent-Replayed"],
 )
 
 # Logging
@@ -222,7 +170,7 @@ async def process_payment(
             transaction_id = f"TXN_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
             
             transaction_data = PaymentTransaction(
-                id=str(uuid.uuid4()),
+                id=new_id(),
                 transaction_id=transaction_id,
                 email=payment_request.email,
                 user_id=current_user_id,
@@ -297,7 +245,7 @@ async def create_checkout_session(
         
         # Crear orden
         order = Order(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=current_user_id,
             total_amount=total_amount,
             status="pending"
@@ -309,7 +257,7 @@ async def create_checkout_session(
         # Crear items de la orden
         for item in checkout_data.cart_items:
             order_item = OrderItem(
-                id=str(uuid.uuid4()),
+                id=new_id(),
                 order_id=order.id,
                 product_id=item.product_id,
                 quantity=item.quantity,
@@ -341,7 +289,7 @@ async def admin_register(admin_data: AdminUserCreate, db: Session = Depends(get_
     
     # Crear administrador
     admin_user = AdminUser(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         email=admin_data.email,
         name=admin_data.name,
         password=hash_password(admin_data.password)
@@ -0,0 +1,233 @@
+"""Autocompletado de productos: trie de prefijos y trigramas para tolerar errores de escritura."""
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import logging
+
+from . import catalog_events
+from .search import normalize, tokenize
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_MIN_SIMILARITY = 0.3
+
+class _TrieNode:
+    __slots__ = ("children", "ids", "size")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[str] = set()
+        self.size = 0
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProductSuggester:
+    def __init__(self):
+        self._root = _TrieNode()
+        self._names: Dict[str, str] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._word_products: Dict[str, Set[str]] = {}
+        self._word_grams: Dict[str, int] = {}
+        self._trigram_words: Dict[str, Set[str]] = {}
+        self._loaded = False
+        self._pending: Optional[List[catalog_events.ProductChange]] = None
+        self._lock = asyncio.Lock()
+        self._loading: Optional[asyncio.Task] = None
+
+    # -------- trie --------
+
+    def _trie_insert(self, key: str, product_id: str):
+        node = self._root
+        node.size += 1
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            node.size += 1
+        node.ids.add(product_id)
+
+    def _trie_remove(self, key: str, product_id: str):
+        path = [self._root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        if product_id not in path[-1].ids:
+            return
+        path[-1].ids.discard(product_id)
+        for node in path:
+            node.size -= 1
+        # Podar ramas vacías para que el recorrido no las visite
+        for depth in range(len(key), 0, -1):
+            if path[depth].size == 0:
+                del path[depth - 1].children[key[depth - 1]]
+            else:
+                break
+
+    def _trie_complete(self, prefix: str) -> Iterator[str]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield from sorted(node.ids)
+            stack.extend(node.children[char] for char in sorted(node.children, reverse=True))
+
+    # -------- trigramas --------
+
+    def _add_word(self, word: str, product_id: str):
+        products = self._word_products.setdefault(word, set())
+        if not products:
+            grams = trigrams(word)
+            self._word_grams[word] = len(grams)
+            for gram in grams:
+                self._trigram_words.setdefault(gram, set()).add(word)
+        products.add(product_id)
+
+    def _remove_word(self, word: str, product_id: str):
+        products = self._word_products.get(word)
+        if products is None:
+            return
+        products.discard(product_id)
+        if not products:
+            del self._word_products[word]
+            del self._word_grams[word]
+            for gram in trigrams(word):
+                words = self._trigram_words.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._trigram_words[gram]
+
+    def _similar_words(self, word: str) -> List[Tuple[float, str]]:
+        query_grams = trigrams(word)
+        shared: Dict[str, int] = {}
+        for gram in query_grams:
+            for candidate in self._trigram_words.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        scored = []
+        for candidate, count in shared.items():
+            similarity = count / (len(query_grams) + self._word_grams[candidate] - count)
+            if similarity >= SUGGEST_MIN_SIMILARITY:
+                scored.append((similarity, candidate))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    # -------- mantenimiento --------
+
+    def upsert(self, product_id: str, name: str):
+        self.remove(product_id)
+        normalized = normalize(name)
+        words = normalized.split()
+        # Nombre completo y cada palabra como punto de entrada ("forte" -> "Dolex Forte")
+        keys = sorted({" ".join(words[i:]) for i in range(len(words))})
+        for key in keys:
+            self._trie_insert(key, product_id)
+        for word in set(tokenize(name)):
+            self._add_word(word, product_id)
+        self._names[product_id] = name
+        self._keys[product_id] = keys
+
+    def remove(self, product_id: str):
+        name = self._names.pop(product_id, None)
+        if name is None:
+            return
+        for key in self._keys.pop(product_id):
+            self._trie_remove(key, product_id)
+        for word in set(tokenize(name)):
+            self._remove_word(word, product_id)
+
+    def apply(self, changes: List[catalog_events.ProductChange]):
+        if self._pending is not None:
+            self._pending.extend(changes)
+            return
+        if not self._loaded:
+            return
+        for change in changes:
+            if change.stock_only:
+                continue
+            if change.active and not change.deleted:
+                self.upsert(change.id, change.name)
+            else:
+                self.remove(change.id)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def _load(self, rows):
+        for product_id, name in rows:
+            self.upsert(product_id, name)
+
+    def start_loading(self, snapshot):
+        """
+        Lanza la carga inicial en segundo plano (una sola vez) y vuelve enseguida: con catálogos
+        grandes tarda decenas de segundos y ninguna petición debe esperarla
+        """
+        if self._loaded or (self._loading is not None and not self._loading.done()):
+            return
+        self._loading = asyncio.get_running_loop().create_task(self._load_in_background(snapshot))
+
+    async def _load_in_background(self, snapshot):
+        try:
+            await self.ensure_loaded(snapshot)
+        except Exception as e:
+            # La siguiente petición vuelve a intentarlo
+            logger.error(f"Error building product suggestions: {str(e)}")
+
+    async def ensure_loaded(self, snapshot):
+        """Carga inicial desde el snapshot del catálogo; después solo cambios incrementales"""
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            # Los cambios confirmados durante la carga se aplican después
+            self._pending = []
+            try:
+                rows = [(product.id, product.name) for product in snapshot.products]
+                await asyncio.to_thread(self._load, rows)
+            finally:
+                pending, self._pending = self._pending, None
+            self._loaded = True
+            self.apply(pending)
+
+    # -------- consulta --------
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        normalized = " ".join(normalize(query).split())
+        if not normalized:
+            return []
+
+        found: List[str] = []
+        seen: Set[str] = set()
+
+        def take(product_ids) -> bool:
+            for product_id in product_ids:
+                if product_id not in seen:
+                    seen.add(product_id)
+                    found.append(product_id)
+                    if len(found) >= limit:
+                        return True
+            return False
+
+        if not take(self._trie_complete(normalized)):
+            # Sin suficientes prefijos exactos: palabras parecidas por trigramas
+            words = tokenize(normalized)
+            if words:
+                for _, word in self._similar_words(words[-1]):
+                    products = self._word_products[word]
+                    if take(heapq.nsmallest(limit + len(found), products, key=lambda pid: self._names[pid])):
+                        break
+
+        return [{"id": product_id, "name": self._names[product_id]} for product_id in found]
+
+product_suggester = ProductSuggester()
+
+@catalog_events.subscribe
+def _refresh_on_product_change(changes):
+    product_suggester.apply(changes)
@@ -0,0 +1,8 @@
+"""Scripts de línea de comandos: DB_MODE=sync, solo el engine síncrono (PyMySQL), sin engine async ni réplicas."""
+import os
+
+# Solo biblioteca estándar: lo importan tanto los scripts de backend/ (import sync_mode) como los del paquete
+
+def use_sync_engine():
+    """Llamar antes del primer import de database; un DB_MODE ya definido en el entorno se respeta"""
+    os.environ.setdefault('DB_MODE', 'sync')
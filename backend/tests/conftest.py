@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Los tests importan el paquete como backend.* (igual que python -m backend.<script>)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
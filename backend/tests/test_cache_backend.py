@@ -0,0 +1,122 @@
+"""Caché compartida: lectura con carga única, TTL y aviso por pub/sub a los demás workers."""
+import asyncio
+import json
+
+import pytest
+
+from backend import cache_backend, catalog_events
+from backend.catalog_cache import catalog_cache
+
+@pytest.fixture(autouse=True)
+def shared_cache(monkeypatch):
+    backend = cache_backend.MemoryCacheBackend()
+    monkeypatch.setattr(cache_backend, "cache_backend", backend)
+    return backend
+
+class _Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.value
+
+def test_cached_json_loads_once():
+    loader = _Loader({"stock": 5})
+
+    async def run():
+        first = await cache_backend.cached_json("clave", loader)
+        second = await cache_backend.cached_json("clave", loader)
+        return first, second
+
+    assert asyncio.run(run()) == ({"stock": 5}, {"stock": 5})
+    assert loader.calls == 1
+
+def test_none_is_not_cached():
+    loader = _Loader(None)
+
+    async def run():
+        await cache_backend.cached_json("clave", loader)
+        await cache_backend.cached_json("clave", loader)
+
+    asyncio.run(run())
+    assert loader.calls == 2
+
+def test_unreachable_cache_falls_back_to_the_loader(shared_cache, monkeypatch):
+    async def broken(*args):
+        raise ConnectionError("caída")
+
+    monkeypatch.setattr(shared_cache, "get", broken)
+    monkeypatch.setattr(shared_cache, "set", broken)
+    assert asyncio.run(cache_backend.cached_json("clave", _Loader([1]))) == [1]
+
+def test_entries_expire(shared_cache):
+    async def run():
+        await shared_cache.set("clave", b"valor", ttl=0)
+        return await shared_cache.get("clave")
+
+    assert asyncio.run(run()) is None
+
+def test_workers_sharing_a_broker_receive_each_others_messages():
+    broker = {}
+    sender = cache_backend.MemoryCacheBackend(broker)
+    receiver = cache_backend.MemoryCacheBackend(broker)
+
+    async def run():
+        received = []
+        listener = asyncio.create_task(receiver.listen("canal", received.append))
+        await asyncio.sleep(0)
+        await sender.publish("canal", "hola")
+        await asyncio.sleep(0)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        return received
+
+    assert asyncio.run(run()) == ["hola"]
+    # El receptor se da de baja al cancelar la escucha
+    assert broker["canal"] == []
+
+def test_commit_broadcasts_and_deletes_shared_copies(shared_cache):
+    received = []
+    change = catalog_events.ProductChange("1", "Dolex", "over_counter", True, False)
+
+    async def run():
+        await shared_cache.set(cache_backend.CATALOG_KEY, b"[]")
+        await shared_cache.set(cache_backend.product_key("1"), b"{}")
+        listener = asyncio.create_task(shared_cache.listen(cache_backend.INVALIDATION_CHANNEL, received.append))
+        await asyncio.sleep(0)
+        await cache_backend._broadcast_product_changes([change])
+        await asyncio.sleep(0)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        return await shared_cache.get(cache_backend.CATALOG_KEY), await shared_cache.get(cache_backend.product_key("1"))
+
+    assert asyncio.run(run()) == (None, None)
+    payload = json.loads(received[0])
+    assert payload["origin"] == cache_backend.WORKER_ID
+    assert payload["products"] == [change._asdict()]
+
+def test_message_from_another_worker_invalidates_local_caches(shared_cache):
+    message = json.dumps({
+        "origin": "otro-worker",
+        "products": [catalog_events.ProductChange("1", "Dolex", "over_counter", True, False)._asdict()],
+    })
+
+    async def run():
+        await shared_cache.set(cache_backend.product_key("1"), b"{}")
+        before = catalog_cache.invalidations
+        cache_backend._handle_invalidation(message)
+        await asyncio.sleep(0)
+        return catalog_cache.invalidations - before, await shared_cache.get(cache_backend.product_key("1"))
+
+    assert asyncio.run(run()) == (1, None)
+
+def test_own_messages_are_ignored():
+    message = json.dumps({
+        "origin": cache_backend.WORKER_ID,
+        "products": [catalog_events.ProductChange("1", "Dolex", "over_counter", True, False)._asdict()],
+    })
+    before = catalog_cache.invalidations
+    cache_backend._handle_invalidation(message)
+    assert catalog_cache.invalidations == before
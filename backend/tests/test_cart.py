@@ -0,0 +1,52 @@
+"""_enrich_cart: el número de consultas no crece con el número de líneas del carrito."""
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import models
+from backend.database import Base
+from backend.ids import new_id
+from backend.routers.cart import _enrich_cart
+
+async def _enrich_cart_statements(lines: int):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    try:
+        async with session_factory() as db:
+            user_id, cart_id = new_id(), new_id()
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", name="Test", password="x"))
+            db.add(models.Cart(id=cart_id, user_id=user_id))
+            for index in range(lines):
+                product_id = new_id()
+                db.add(models.Product(
+                    id=product_id, name=f"Producto {index}", description="", price=1000,
+                    category="over_counter", stock=10
+                ))
+                db.add(models.CartItem(id=new_id(), cart_id=cart_id, product_id=product_id, quantity=1))
+            await db.commit()
+            cart = await db.get(models.Cart, cart_id)
+
+            event.listen(engine.sync_engine, "before_cursor_execute", record)
+            try:
+                enriched = await _enrich_cart(cart, db)
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", record)
+    finally:
+        await engine.dispose()
+
+    assert len(enriched["items"]) == lines
+    return statements
+
+def test_enrich_cart_runs_one_statement_regardless_of_lines():
+    one_line = asyncio.run(_enrich_cart_statements(1))
+    many_lines = asyncio.run(_enrich_cart_statements(25))
+    assert len(one_line) == len(many_lines) == 1
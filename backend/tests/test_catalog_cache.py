@@ -0,0 +1,103 @@
+"""Caché del catálogo: una sola reconstrucción para peticiones simultáneas, TTL e invalidación al confirmar cambios."""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import cache_backend, models
+from backend.catalog_cache import CatalogCache, catalog_cache
+from backend.database import Base
+from backend.ids import new_id
+
+@pytest.fixture(autouse=True)
+def shared_cache(monkeypatch):
+    # Copia compartida vacía en cada test: la del módulo sobrevive entre tests
+    backend = cache_backend.MemoryCacheBackend()
+    monkeypatch.setattr(cache_backend, "cache_backend", backend)
+    return backend
+
+async def _with_catalog(action):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    selects = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    try:
+        async with session_factory() as db:
+            product_id = new_id()
+            db.add(models.Product(
+                id=product_id, name="Acetaminofén", description="", price=1000, category="over_counter", stock=5
+            ))
+            await db.commit()
+            event.listen(engine.sync_engine, "before_cursor_execute", record)
+            return await action(db, product_id), len(selects)
+    finally:
+        await engine.dispose()
+
+def test_concurrent_misses_rebuild_once():
+    cache = CatalogCache(ttl=60)
+
+    async def run(db, product_id):
+        snapshots = await asyncio.gather(*(cache.get(db) for _ in range(5)))
+        return {snapshot.version for snapshot in snapshots}, cache.stats()
+
+    (versions, stats), selects = asyncio.run(_with_catalog(run))
+    assert versions == {1}
+    assert selects == 1
+    assert (stats["rebuilds"], stats["misses"], stats["coalesced"]) == (1, 1, 4)
+
+def test_fresh_snapshot_is_served_without_queries():
+    cache = CatalogCache(ttl=60)
+
+    async def run(db, product_id):
+        first = await cache.get(db)
+        second = await cache.get(db)
+        return first is second, cache.hits
+
+    (same, hits), selects = asyncio.run(_with_catalog(run))
+    assert same and hits == 1
+    assert selects == 1
+
+def test_expired_snapshot_is_rebuilt():
+    cache = CatalogCache(ttl=0)
+
+    async def run(db, product_id):
+        await cache.get(db)
+        await cache.get(db)
+        return cache.rebuilds
+
+    rebuilds, _ = asyncio.run(_with_catalog(run))
+    assert rebuilds == 2
+
+def test_committed_product_change_invalidates_the_snapshot():
+    async def run(db, product_id):
+        catalog_cache.invalidate()
+        before = (await catalog_cache.get(db)).by_id[product_id].name
+        product = await db.get(models.Product, product_id)
+        product.name = "Acetaminofén Forte"
+        await db.commit()
+        after = await catalog_cache.get(db)
+        return before, after.by_id[product_id].name
+
+    (before, after), _ = asyncio.run(_with_catalog(run))
+    assert (before, after) == ("Acetaminofén", "Acetaminofén Forte")
+
+def test_rolled_back_change_keeps_the_snapshot():
+    async def run(db, product_id):
+        catalog_cache.invalidate()
+        before = await catalog_cache.get(db)
+        product = await db.get(models.Product, product_id)
+        product.name = "Descartado"
+        await db.flush()
+        await db.rollback()
+        return before is await catalog_cache.get(db)
+
+    same, _ = asyncio.run(_with_catalog(run))
+    assert same
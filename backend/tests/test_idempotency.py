@@ -0,0 +1,125 @@
+"""Idempotency-Key: la primera respuesta se repite, los 5xx liberan la clave, otro cuerpo da 422 y una clave abandonada se retoma."""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import idempotency, models, schemas
+from backend.database import Base
+from backend.ids import new_id
+
+ENDPOINT = "tests.idempotency"
+
+async def _with_session(action):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            return await action(db)
+    finally:
+        await engine.dispose()
+
+def _payload(quantity: int = 1) -> schemas.CartItemModel:
+    return schemas.CartItemModel(product_id="producto", quantity=quantity)
+
+class _Handler:
+    """Cuenta las ejecuciones; cada llamada consume el siguiente resultado (o excepción) de outcomes"""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def test_retry_with_same_key_replays_the_first_response():
+    handler = _Handler({"order_id": "uno"}, {"order_id": "dos"})
+
+    async def run(db):
+        user_id = new_id()
+        first = await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+        replay = await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+        return first, replay
+
+    first, replay = asyncio.run(_with_session(run))
+    assert first == {"order_id": "uno"}
+    assert replay.status_code == 200
+    assert replay.headers[idempotency.REPLAY_HEADER] == "true"
+    assert replay.body == b'{"order_id":"uno"}'
+    assert handler.calls == 1
+
+def test_server_error_releases_the_key():
+    handler = _Handler(HTTPException(status_code=500, detail="caído"), {"order_id": "uno"})
+
+    async def run(db):
+        user_id = new_id()
+        with pytest.raises(HTTPException):
+            await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+        return await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+
+    assert asyncio.run(_with_session(run)) == {"order_id": "uno"}
+    assert handler.calls == 2
+
+def test_client_error_is_stored_and_replayed():
+    handler = _Handler(HTTPException(status_code=409, detail="Stock insuficiente"), {"order_id": "uno"})
+
+    async def run(db):
+        user_id = new_id()
+        with pytest.raises(HTTPException):
+            await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+        return await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+
+    replay = asyncio.run(_with_session(run))
+    assert replay.status_code == 409
+    assert handler.calls == 1
+
+def test_same_key_with_another_body_is_rejected():
+    handler = _Handler({"order_id": "uno"}, {"order_id": "dos"})
+
+    async def run(db):
+        user_id = new_id()
+        await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(1), handler)
+        await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(2), handler)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(_with_session(run))
+    assert error.value.status_code == 422
+    assert handler.calls == 1
+
+def test_keys_are_scoped_per_user():
+    handler = _Handler({"user": "a"}, {"user": "b"})
+
+    async def run(db):
+        first = await idempotency.run(db, "clave", new_id(), ENDPOINT, _payload(), handler)
+        second = await idempotency.run(db, "clave", new_id(), ENDPOINT, _payload(), handler)
+        return first, second
+
+    assert asyncio.run(_with_session(run)) == ({"user": "a"}, {"user": "b"})
+    assert handler.calls == 2
+
+def test_abandoned_in_progress_key_is_taken_over():
+    handler = _Handler({"order_id": "uno"})
+
+    async def run(db):
+        user_id = new_id()
+        now = datetime.now(timezone.utc)
+        # Registro de un worker que murió a mitad de la petición
+        db.add(models.IdempotencyKey(
+            id=idempotency._record_id(user_id, ENDPOINT, "clave"), user_id=user_id, endpoint=ENDPOINT,
+            request_hash=idempotency._request_hash(_payload()), status="in_progress",
+            created_at=now - timedelta(seconds=idempotency.IDEMPOTENCY_LOCK_TIMEOUT + 1),
+            expires_at=now + timedelta(days=1)
+        ))
+        await db.commit()
+        return await idempotency.run(db, "clave", user_id, ENDPOINT, _payload(), handler)
+
+    assert asyncio.run(_with_session(run)) == {"order_id": "uno"}
+    assert handler.calls == 1
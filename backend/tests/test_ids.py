@@ -0,0 +1,46 @@
+"""Ids UUIDv7: versión y variante RFC 9562, orden por creación, marca de tiempo en los 48 bits altos y columna BINARY(16)."""
+import time
+import uuid
+
+from backend import ids, models
+
+def test_version_and_variant():
+    value = ids.new_uuid()
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+
+def test_new_id_is_canonical_text():
+    value = ids.new_id()
+    assert len(value) == 36
+    assert str(uuid.UUID(value)) == value
+
+def test_ids_sort_in_creation_order():
+    values = [ids.new_uuid() for _ in range(10_000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+    # El texto ordena igual que los bytes (VARCHAR y BINARY(16) comparten orden)
+    assert sorted(str(value) for value in values) == [str(value) for value in values]
+
+def test_timestamp_is_the_current_millisecond():
+    before = time.time_ns() // 1_000_000
+    ms = ids.new_uuid().int >> 80
+    after = time.time_ns() // 1_000_000
+    # Puede ir por delante si el contador de un milisegundo se agotó
+    assert before <= ms <= after + 1
+
+def test_counter_overflow_advances_the_clock(monkeypatch):
+    monkeypatch.setattr(ids, "_last_ms", time.time_ns() // 1_000_000 + 60_000)
+    monkeypatch.setattr(ids, "_counter", ids._COUNTER_MAX)
+    last_ms = ids._last_ms
+    first, second = ids.new_uuid(), ids.new_uuid()
+    assert first.int >> 80 == last_ms + 1
+    assert first < second
+
+def test_binary_uuid_round_trip():
+    column = models.BinaryUUID()
+    value = ids.new_id()
+    stored = column.process_bind_param(value, None)
+    assert len(stored) == 16
+    assert column.process_result_value(stored, None) == value
+    # Un id mal formado no coincide con ninguna fila en lugar de fallar
+    assert column.process_bind_param("no-es-un-id", None) is None
@@ -0,0 +1,152 @@
+"""Reservas de stock: descuento atómico, 409 sin stock, expiración por TTL y catálogo cacheado al día tras el commit."""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import inventory, models, schemas
+from backend.catalog_cache import catalog_cache
+from backend.database import Base
+from backend.ids import new_id
+from backend.routers import payments, products
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+async def _product_stock(product_id: str, db) -> int:
+    product = await products.get_product(product_id, _request(), Response(), db)
+    return product.stock
+
+async def _catalog_stock(product_id: str, db) -> int:
+    page = await products.get_products(_request(), Response(), db=db, limit=products.PRODUCTS_PAGE_SIZE)
+    return next(product.stock for product in page if product.id == product_id)
+
+async def _stock_after_checkout_and_release():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user_id, product_id = new_id(), new_id()
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", name="Test", password="x"))
+            db.add(models.Product(
+                id=product_id, name="Acetaminofén", description="", price=1000, category="over_counter", stock=5
+            ))
+            await db.commit()
+            catalog_cache.invalidate()
+
+            # Snapshot y copia compartida del producto cargados antes del checkout
+            before = (await _catalog_stock(product_id, db), await _product_stock(product_id, db))
+
+            checkout = await payments._create_checkout_session(
+                schemas.CheckoutRequest(
+                    cart_items=[schemas.CartItemModel(product_id=product_id, quantity=3)],
+                    origin_url="http://localhost"
+                ), user_id, db
+            )
+            # La invalidación de la caché compartida corre en segundo plano
+            await asyncio.sleep(0)
+            reserved = (await _product_stock(product_id, db), await _catalog_stock(product_id, db))
+
+            await inventory.release_order(db, checkout["order_id"], "cancelled")
+            await db.commit()
+            await asyncio.sleep(0)
+            released = (await _product_stock(product_id, db), await _catalog_stock(product_id, db))
+    finally:
+        await engine.dispose()
+    return before, reserved, released
+
+def test_checkout_and_release_refresh_cached_stock():
+    before, reserved, released = asyncio.run(_stock_after_checkout_and_release())
+    assert before == (5, 5)
+    assert reserved == (2, 2)
+    assert released == (5, 5)
+
+async def _with_products(stocks, action):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user_id = new_id()
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", name="Test", password="x"))
+            product_ids = []
+            for index, stock in enumerate(stocks):
+                product_ids.append(new_id())
+                db.add(models.Product(
+                    id=product_ids[-1], name=f"Producto {index}", description="", price=1000,
+                    category="over_counter", stock=stock
+                ))
+            await db.commit()
+            return await action(db, user_id, product_ids)
+    finally:
+        await engine.dispose()
+
+async def _stocks(db, product_ids):
+    result = await db.execute(select(models.Product.id, models.Product.stock).filter(models.Product.id.in_(product_ids)))
+    stocks = dict(result.all())
+    return [stocks[product_id] for product_id in product_ids]
+
+def _checkout(user_id, quantities):
+    return schemas.CheckoutRequest(
+        cart_items=[schemas.CartItemModel(product_id=product_id, quantity=quantity) for product_id, quantity in quantities],
+        origin_url="http://localhost"
+    )
+
+def test_oversell_is_409_and_reserves_nothing():
+    async def run(db, user_id, product_ids):
+        with pytest.raises(HTTPException) as error:
+            await payments._create_checkout_session(
+                _checkout(user_id, [(product_ids[0], 2), (product_ids[1], 3)]), user_id, db
+            )
+        orders = (await db.execute(select(models.Order.id))).scalars().all()
+        reservations = (await db.execute(select(models.StockReservation.id))).scalars().all()
+        return error.value, product_ids, await _stocks(db, product_ids), orders, reservations
+
+    error, product_ids, stocks, orders, reservations = asyncio.run(_with_products([5, 2], run))
+    assert error.status_code == 409
+    assert error.detail["product_ids"] == [product_ids[1]]
+    # El producto que sí alcanzaba tampoco se descuenta: todo o nada
+    assert stocks == [5, 2]
+    assert orders == [] and reservations == []
+
+def test_repeated_lines_are_reserved_together():
+    async def run(db, user_id, product_ids):
+        await payments._create_checkout_session(
+            _checkout(user_id, [(product_ids[0], 2), (product_ids[0], 3)]), user_id, db
+        )
+        return await _stocks(db, product_ids)
+
+    assert asyncio.run(_with_products([5], run)) == [0]
+
+def test_expired_reservations_return_stock():
+    async def run(db, user_id, product_ids):
+        checkout = await payments._create_checkout_session(_checkout(user_id, [(product_ids[0], 3)]), user_id, db)
+        await db.execute(
+            update(models.StockReservation).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        await db.commit()
+        released = await inventory.release_expired(db)
+        status = await db.scalar(select(models.Order.status).filter(models.Order.id == checkout["order_id"]))
+        reservation = await db.scalar(select(models.StockReservation.status))
+        return released, status, reservation, await _stocks(db, product_ids)
+
+    assert asyncio.run(_with_products([5], run)) == (1, "expired", "released", [5])
+
+def test_paid_order_cannot_be_released():
+    async def run(db, user_id, product_ids):
+        checkout = await payments._create_checkout_session(_checkout(user_id, [(product_ids[0], 3)]), user_id, db)
+        assert await inventory.confirm_order_payment(db, checkout["order_id"], user_id, "TXN_TEST")
+        await db.commit()
+        released = await inventory.release_order(db, checkout["order_id"], "expired")
+        await db.commit()
+        return released, await _stocks(db, product_ids)
+
+    assert asyncio.run(_with_products([5], run)) == (False, [2])
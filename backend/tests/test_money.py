@@ -0,0 +1,60 @@
+"""Importes en centavos: conversión exacta desde float, redondeo al centavo y sumas calculadas en la base de datos."""
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, func, select, type_coerce
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import models
+from backend.database import Base
+from backend.ids import new_id
+from backend.money import from_cents, same_amount, to_cents
+
+def test_to_cents_ignores_float_representation_error():
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents(19.99) == 1999
+    assert to_cents(Decimal("1000")) == 100000
+    assert to_cents(7) == 700
+
+def test_to_cents_rounds_half_up():
+    assert to_cents("0.005") == 1
+    assert to_cents("19.994") == 1999
+    assert to_cents("19.995") == 2000
+
+def test_from_cents_has_two_decimals():
+    assert from_cents(1999) == Decimal("19.99")
+    assert str(from_cents(100)) == "1.00"
+
+def test_same_amount_is_exact_to_the_cent():
+    assert same_amount(0.1 + 0.2, 0.3)
+    assert same_amount(Decimal("19.990"), 19.99)
+    assert not same_amount(19.99, 19.98)
+
+def test_money_column_round_trip_and_sql_sum():
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        try:
+            async with session_factory() as db:
+                for price, stock in ((0.1, 3), (19.99, 2)):
+                    db.add(models.Product(
+                        id=new_id(), name="Producto", description="", price=price, category="over_counter", stock=stock
+                    ))
+                await db.commit()
+                prices = (await db.execute(select(models.Product.price).order_by(models.Product.price))).scalars().all()
+                raw = (await db.execute(select(type_coerce(models.Product.price, BigInteger())))).scalars().all()
+                total = await db.scalar(
+                    select(type_coerce(func.sum(models.Product.price * models.Product.stock), models.Money()))
+                )
+        finally:
+            await engine.dispose()
+        return prices, sorted(raw), total
+
+    prices, raw, total = asyncio.run(run())
+    assert prices == [Decimal("0.10"), Decimal("19.99")]
+    # En la base son centavos enteros; la suma se hace sobre enteros y vuelve como Decimal exacto
+    assert raw == [10, 1999]
+    assert total == Decimal("40.28")
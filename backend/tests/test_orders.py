@@ -0,0 +1,47 @@
+"""Historial y resumen de pedidos: cursor de la página siguiente y 404 de un pedido inexistente."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import models
+from backend.database import Base
+from backend.ids import new_id
+from backend.routers import orders
+
+async def _with_user(action):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user_id = new_id()
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", name="Test", password="x"))
+            await db.commit()
+            return await action(user_id, db)
+    finally:
+        await engine.dispose()
+
+def test_missing_order_summary_is_404():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(_with_user(lambda user_id, db: orders.get_order_summary(new_id(), user_id, db)))
+    assert error.value.status_code == 404
+
+def _next_before_header(order_count: int, limit: int):
+    async def list_orders(user_id, db):
+        for _ in range(order_count):
+            db.add(models.Order(id=new_id(), user_id=user_id, total_amount=1000, status="paid"))
+        await db.commit()
+        response = Response()
+        page = await orders.get_user_orders(response, before=None, limit=limit, current_user_id=user_id, db=db)
+        return len(page), response.headers.get("X-Next-Before")
+    return asyncio.run(_with_user(list_orders))
+
+def test_next_before_only_when_another_page_exists():
+    returned, next_before = _next_before_header(order_count=3, limit=2)
+    assert returned == 2 and next_before is not None
+    returned, next_before = _next_before_header(order_count=2, limit=2)
+    assert returned == 2 and next_before is None
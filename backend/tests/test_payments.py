@@ -0,0 +1,209 @@
+"""Intentos de pago: importe y versión del carrito congelados, un solo cobro, y pedido con reserva antes de cobrar."""
+import asyncio
+import secrets
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import models, schemas
+from backend.database import Base
+from backend.ids import new_id
+from backend.routers import cart, payments
+
+CARD = schemas.PaymentCard(
+    cardNumber="4111111111111111", expiryDate="12/99", cvv="123", cardholderName="Test", country="CO"
+)
+
+class _Bank:
+    """Sustituye a secrets.SystemRandom: aprueba o rechaza siempre"""
+    def __init__(self, approve: bool):
+        self.approve = approve
+
+    def __call__(self):
+        return self
+
+    def random(self) -> float:
+        return 0.99 if self.approve else 0.0
+
+@pytest.fixture
+def bank(monkeypatch):
+    def set_outcome(approve: bool):
+        monkeypatch.setattr(secrets, "SystemRandom", _Bank(approve))
+    return set_outcome
+
+async def _pay_cart(stock: int, quantity: int, mutate_cart=None):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user_id, product_id = new_id(), new_id()
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", name="Test", password="x"))
+            db.add(models.Product(
+                id=product_id, name="Acetaminofén", description="", price=1000, category="over_counter", stock=stock
+            ))
+            await db.commit()
+            await cart.add_cart_item(schemas.CartItemModel(product_id=product_id, quantity=quantity), user_id, db)
+
+            intent = await payments.create_payment_intent(
+                schemas.PaymentIntentCreate(amount=1000 * quantity), user_id, db
+            )
+            if mutate_cart is not None:
+                await mutate_cart(product_id, user_id, db)
+            response = await payments._process_payment(
+                schemas.PaymentRequest(
+                    email=f"{user_id}@example.com", card=CARD, amount=1000 * quantity, payment_intent_id=intent.id
+                ), user_id, db
+            )
+
+            state = {
+                "response": response,
+                "stock": await db.scalar(select(models.Product.stock).filter(models.Product.id == product_id)),
+                "cart_lines": await db.scalar(select(func.count(models.CartItem.id))),
+                "orders": (await db.execute(select(models.Order.status))).scalars().all(),
+                "reservations": (await db.execute(select(models.StockReservation.status))).scalars().all(),
+                "intent": (await db.execute(
+                    select(models.PaymentIntent.status, models.PaymentIntent.order_id)
+                    .filter(models.PaymentIntent.id == intent.id)
+                )).one(),
+            }
+    finally:
+        await engine.dispose()
+    return state
+
+def test_approved_cart_payment_creates_paid_order_and_empties_cart(bank):
+    bank(approve=True)
+    state = asyncio.run(_pay_cart(stock=5, quantity=3))
+    assert state["response"].success
+    assert state["stock"] == 2
+    assert state["cart_lines"] == 0
+    assert state["orders"] == ["paid"]
+    assert state["reservations"] == ["committed"]
+    assert state["intent"].status == "succeeded" and state["intent"].order_id is not None
+
+def test_declined_cart_payment_keeps_cart_and_stock(bank):
+    bank(approve=False)
+    state = asyncio.run(_pay_cart(stock=5, quantity=3))
+    assert not state["response"].success
+    assert state["stock"] == 5
+    assert state["cart_lines"] == 1
+    assert state["orders"] == []
+    assert state["intent"].status == "requires_payment"
+
+def test_cart_payment_does_not_oversell(bank):
+    bank(approve=True)
+    state = asyncio.run(_pay_cart(stock=2, quantity=3))
+    assert not state["response"].success
+    assert "Stock insuficiente" in state["response"].error
+    assert state["stock"] == 2
+    assert state["cart_lines"] == 1
+    assert state["orders"] == []
+
+def test_cart_changed_after_intent_is_rejected(bank):
+    bank(approve=True)
+
+    async def change_quantity(product_id, user_id, db):
+        await cart.update_cart_item(product_id, {"quantity": 1}, user_id, db)
+
+    state = asyncio.run(_pay_cart(stock=5, quantity=3, mutate_cart=change_quantity))
+    assert not state["response"].success
+    assert state["response"].error == "El carrito cambió, vuelve a iniciar el pago"
+    assert state["stock"] == 5
+    assert state["orders"] == []
+    assert state["intent"].status == "requires_payment"
+
+async def _with_cart(quantity: int, action):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user_id, product_id = new_id(), new_id()
+            db.add(models.User(id=user_id, email=f"{user_id}@example.com", name="Test", password="x"))
+            db.add(models.Product(
+                id=product_id, name="Acetaminofén", description="", price=1000, category="over_counter", stock=10
+            ))
+            await db.commit()
+            await cart.add_cart_item(schemas.CartItemModel(product_id=product_id, quantity=quantity), user_id, db)
+            return await action(db, user_id)
+    finally:
+        await engine.dispose()
+
+def _payment(user_id: str, intent_id: str, amount: float) -> schemas.PaymentRequest:
+    return schemas.PaymentRequest(email=f"{user_id}@example.com", card=CARD, amount=amount, payment_intent_id=intent_id)
+
+def test_intent_amount_must_match_the_cart():
+    async def run(db, user_id):
+        with pytest.raises(HTTPException) as error:
+            await payments.create_payment_intent(schemas.PaymentIntentCreate(amount=1999.99), user_id, db)
+        return error.value
+
+    error = asyncio.run(_with_cart(2, run))
+    assert error.status_code == 400
+
+def test_intent_freezes_the_cart_version_as_an_integer():
+    async def run(db, user_id):
+        intent = await payments.create_payment_intent(schemas.PaymentIntentCreate(amount=2000), user_id, db)
+        stored = await db.get(models.PaymentIntent, intent.id)
+        current = await db.scalar(select(models.Cart.version).filter(models.Cart.user_id == user_id))
+        return stored.cart_version, current
+
+    cart_version, current = asyncio.run(_with_cart(2, run))
+    assert isinstance(cart_version, int) and cart_version == current
+
+def test_payment_amount_must_match_the_intent(bank):
+    bank(approve=True)
+
+    async def run(db, user_id):
+        intent = await payments.create_payment_intent(schemas.PaymentIntentCreate(amount=2000), user_id, db)
+        return await payments._process_payment(_payment(user_id, intent.id, 1000), user_id, db)
+
+    response = asyncio.run(_with_cart(2, run))
+    assert not response.success
+    assert response.error == "El monto no coincide con el intento de pago"
+
+def test_intent_is_charged_once(bank):
+    bank(approve=True)
+
+    async def run(db, user_id):
+        intent = await payments.create_payment_intent(schemas.PaymentIntentCreate(amount=2000), user_id, db)
+        first = await payments._process_payment(_payment(user_id, intent.id, 2000), user_id, db)
+        second = await payments._process_payment(_payment(user_id, intent.id, 2000), user_id, db)
+        transactions = await db.scalar(select(func.count(models.PaymentTransaction.id)))
+        return first, second, transactions
+
+    first, second, transactions = asyncio.run(_with_cart(2, run))
+    assert first.success
+    assert not second.success and second.error == "El intento de pago ya fue procesado"
+    assert transactions == 1
+
+def test_order_intent_confirms_the_checkout_reservation(bank):
+    bank(approve=True)
+
+    async def run(db, user_id):
+        product_id = await db.scalar(select(models.Product.id))
+        checkout = await payments._create_checkout_session(
+            schemas.CheckoutRequest(
+                cart_items=[schemas.CartItemModel(product_id=product_id, quantity=4)], origin_url="http://localhost"
+            ), user_id, db
+        )
+        intent = await payments.create_payment_intent(
+            schemas.PaymentIntentCreate(amount=4000, order_id=checkout["order_id"]), user_id, db
+        )
+        response = await payments._process_payment(_payment(user_id, intent.id, 4000), user_id, db)
+        status = await db.scalar(select(models.Order.status).filter(models.Order.id == checkout["order_id"]))
+        reservation = await db.scalar(select(models.StockReservation.status))
+        cart_lines = await db.scalar(select(func.count(models.CartItem.id)))
+        return response, status, reservation, cart_lines
+
+    response, status, reservation, cart_lines = asyncio.run(_with_cart(1, run))
+    assert response.success
+    assert (status, reservation) == ("paid", "committed")
+    # Un pedido de /payments/checkout no toca el carrito
+    assert cart_lines == 1
@@ -0,0 +1,59 @@
+"""Catálogo paginado: el cursor keyset recorre todo el catálogo y los cursores mal formados dan 400."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import models
+from backend.catalog_cache import catalog_cache
+from backend.database import Base
+from backend.ids import new_id
+from backend.routers import products
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+async def _with_catalog(names, action):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            for name in names:
+                db.add(models.Product(
+                    id=new_id(), name=name, description="", price=1000, category="over_counter", stock=10
+                ))
+            await db.commit()
+            catalog_cache.invalidate()
+            return await action(db)
+    finally:
+        await engine.dispose()
+
+def test_cursor_walks_the_whole_catalog():
+    names = [f"Producto {index:02d}" for index in range(7)]
+
+    async def walk(db):
+        seen, cursor = [], None
+        while True:
+            response = Response()
+            page = await products.get_products(_request(), response, cursor=cursor, limit=3, db=db)
+            seen.extend(product.name for product in page)
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return seen
+
+    assert asyncio.run(_with_catalog(names, walk)) == names
+
+@pytest.mark.parametrize("position", [[1, 2], ["a"], {"offset": 3}, "x"])
+def test_malformed_cursor_is_400(position):
+    cursor = products._encode_cursor(position)
+
+    async def page(db):
+        return await products.get_products(_request(), Response(), cursor=cursor, limit=3, db=db)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(_with_catalog(["Producto"], page))
+    assert error.value.status_code == 400
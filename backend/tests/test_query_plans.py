@@ -0,0 +1,66 @@
+"""
+check_query_plans: captura las sentencias que ejecutan de verdad los routers (SQLite), aplica la regla
+de recorridos completos y, si hay un MySQL accesible con la configuración de database.py, hace EXPLAIN.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.check_query_plans import CapturedStatement, capture_statements, check_query_plans, full_scans
+from backend.database import Base, SQLALCHEMY_ASYNC_DATABASE_URL
+
+async def _captured_statements():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        return [" ".join(captured.statement.split()) for captured in await capture_statements(engine)]
+    finally:
+        await engine.dispose()
+
+def test_capture_includes_update_and_delete_paths():
+    statements = asyncio.run(_captured_statements())
+
+    def captured(prefix):
+        return any(statement.startswith(prefix) for statement in statements)
+
+    # reserve_stock / release_order: UPDATE con CASE por producto
+    assert captured("UPDATE products SET stock=(products.stock - CASE")
+    assert captured("UPDATE products SET stock=(products.stock + CASE")
+    assert captured("UPDATE stock_reservations SET status=")
+    # Carrito: cambio de cantidad y borrado de línea
+    assert captured("UPDATE cart_items SET quantity=")
+    assert captured("DELETE FROM cart_items WHERE")
+    # Idempotencia: barrido de vencidas y toma de control condicional de una clave abandonada
+    assert captured("DELETE FROM idempotency_keys WHERE idempotency_keys.id IN")
+    assert captured("DELETE FROM idempotency_keys WHERE idempotency_keys.id = ? AND idempotency_keys.status = ?")
+
+def test_full_scan_fails_even_with_possible_keys_unless_allowlisted():
+    rows = [
+        {"table": "orders", "type": "ALL", "possible_keys": "ix_orders_user_created"},
+        {"table": "order_items", "type": "ref", "possible_keys": "ix_order_items_order_id"},
+        {"table": "<derived2>", "type": "ALL", "possible_keys": None},
+        {"table": "products", "type": "ALL", "possible_keys": None},
+    ]
+    assert full_scans(CapturedStatement("orders: historial", "SELECT ...", ()), rows) == ["orders", "products"]
+    assert full_scans(CapturedStatement("products: catálogo", "SELECT ...", ()), rows) == ["orders"]
+
+async def _mysql_full_scans():
+    engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL)
+    try:
+        try:
+            async with engine.connect():
+                pass
+        except (DBAPIError, OSError):
+            return None
+        return await check_query_plans(engine)
+    finally:
+        await engine.dispose()
+
+def test_no_full_scans_outside_allowlist_on_mysql():
+    failures = asyncio.run(_mysql_full_scans())
+    if failures is None:
+        pytest.skip("MySQL no disponible (MYSQL_HOST/MYSQL_PORT de database.py)")
+    assert failures == 0
@@ -0,0 +1,77 @@
+"""Migraciones: numeración de los ficheros, separación de sentencias y reanudación de un .sql que falló a medias."""
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+
+from backend import schema_migrations
+from backend.schema_migrations import Migration, STEPS_TABLE, VERSION_TABLE
+
+def test_migrations_are_numbered_without_gaps():
+    versions = [migration.version for migration in schema_migrations.available_migrations()]
+    assert versions == list(range(len(versions)))
+    assert schema_migrations.latest_version() == versions[-1]
+
+def test_sql_statements_split_on_line_ending_semicolons():
+    script = """
+-- Comentario; con punto y coma
+ALTER TABLE products MODIFY price BIGINT NOT NULL;
+UPDATE payment_intents SET cart_version = NULL
+WHERE cart_version NOT REGEXP '^[0-9;]+$';
+
+"""
+    assert schema_migrations._sql_statements(script) == [
+        "ALTER TABLE products MODIFY price BIGINT NOT NULL",
+        "UPDATE payment_intents SET cart_version = NULL\nWHERE cart_version NOT REGEXP '^[0-9;]+$'",
+    ]
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _utc_timestamp(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "UTC_TIMESTAMP", 0, lambda: datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+    with engine.connect() as connection:
+        # Mismas tablas que _create_version_table, sin ENGINE=InnoDB
+        connection.execute(text(
+            f"CREATE TABLE {VERSION_TABLE} (version INT PRIMARY KEY, name VARCHAR(255), applied_at DATETIME)"
+        ))
+        connection.execute(text(
+            f"CREATE TABLE {STEPS_TABLE} (version INT, step INT, applied_at DATETIME, PRIMARY KEY (version, step))"
+        ))
+        connection.execute(text("CREATE TABLE prices (value INT)"))
+        connection.execute(text("INSERT INTO prices (value) VALUES (12)"))
+        connection.commit()
+        yield connection
+    engine.dispose()
+
+def test_failed_sql_migration_resumes_after_the_last_applied_statement(connection, tmp_path):
+    path = tmp_path / "0005_prueba.sql"
+    path.write_text(
+        "UPDATE prices SET value = value * 100;\n"
+        "INSERT INTO audit (note) VALUES ('centavos');\n",
+        encoding="utf-8",
+    )
+    migration = Migration(5, "prueba", path)
+
+    with pytest.raises(OperationalError):
+        schema_migrations._apply(connection, migration)
+    connection.rollback()
+    assert connection.execute(text("SELECT value FROM prices")).scalar() == 1200
+    assert schema_migrations._applied_steps(connection, migration) == {0}
+
+    # Se corrige la causa del fallo y se repite: el UPDATE * 100 no vuelve a ejecutarse
+    connection.execute(text("CREATE TABLE audit (note VARCHAR(50))"))
+    connection.commit()
+    schema_migrations._apply(connection, migration)
+
+    assert connection.execute(text("SELECT value FROM prices")).scalar() == 1200
+    assert connection.execute(text("SELECT note FROM audit")).scalar() == "centavos"
+    assert connection.execute(text(f"SELECT version, name FROM {VERSION_TABLE}")).one() == (5, "prueba")
+    assert schema_migrations._applied_steps(connection, migration) == set()
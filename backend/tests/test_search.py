@@ -0,0 +1,55 @@
+"""Índice de búsqueda: ranking BM25 con el nombre por delante, todos los términos, filtros, páginas y prefijo desde SEARCH_MIN_PREFIX."""
+from backend import search
+
+PRODUCTS = [
+    ("1", "Vitamina C 500 mg", "Ácido ascórbico", "over_counter"),
+    ("2", "Vitamina Calcio + D3", "Suplemento", "over_counter"),
+    ("3", "Vitamina E", "Antioxidante", "over_counter"),
+]
+
+def _search(query: str):
+    index = search.ProductSearchIndex()
+    index.build(PRODUCTS)
+    ids, _, _ = index.search(query)
+    return ids
+
+def test_short_last_token_matches_whole_term_only():
+    assert _search("vitamina c") == ["1"]
+
+def test_last_token_from_min_prefix_is_expanded():
+    assert _search("vitamina cal") == ["2"]
+    assert set(_search("vit")) == {"1", "2", "3"}
+
+RANKED = [
+    ("desc", "Jarabe para la tos", "Con ibuprofeno", "over_counter"),
+    ("name", "Ibuprofeno 400 mg", "Analgésico", "over_counter"),
+    ("rx", "Ibuprofeno 800 mg", "Analgésico", "prescription"),
+    ("other", "Acetaminofén 500 mg", "Analgésico", "over_counter"),
+]
+
+def _ranked(query: str, **kwargs):
+    index = search.ProductSearchIndex()
+    index.build(RANKED)
+    return index.search(query, **kwargs)
+
+def test_name_match_outranks_description_match():
+    ids, _, _ = _ranked("ibuprofeno")
+    assert ids[-1] == "desc"
+    assert set(ids) == {"desc", "name", "rx"}
+
+def test_accents_and_case_are_ignored():
+    assert _ranked("ACETAMINOFEN")[0] == ["other"]
+
+def test_every_term_must_match():
+    assert _ranked("ibuprofeno 800")[0] == ["rx"]
+    assert _ranked("ibuprofeno inexistente")[0] == []
+
+def test_category_filter():
+    assert set(_ranked("ibuprofeno", category="over_counter")[0]) == {"desc", "name"}
+
+def test_pagination_reports_more_pages_and_total():
+    first, has_more, total = _ranked("analgesico", limit=2)
+    assert len(first) == 2 and has_more and total is None
+    rest, has_more, total = _ranked("analgesico", offset=2, limit=2, with_total=True)
+    assert len(rest) == 1 and not has_more and total == 3
+    assert set(first + rest) == {"name", "rx", "other"}
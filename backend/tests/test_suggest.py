@@ -0,0 +1,64 @@
+"""Autocompletado: carga inicial en segundo plano, prefijos, palabras internas, tolerancia a errores y cambios incrementales."""
+import asyncio
+from types import SimpleNamespace
+
+from backend import catalog_events
+from backend.suggest import ProductSuggester
+
+NAMES = ["Dolex Forte", "Ibuprofeno 400 mg", "Ibuprofeno 800 mg", "Acetaminofén 500 mg"]
+
+def _snapshot(names=NAMES):
+    return SimpleNamespace(products=[SimpleNamespace(id=str(index), name=name) for index, name in enumerate(names)])
+
+def test_start_loading_does_not_wait_for_the_build():
+    async def run():
+        suggester = ProductSuggester()
+        suggester.start_loading(_snapshot())
+        # Vuelve antes de construir: mientras tanto el endpoint responde sin sugerencias
+        started_loaded = suggester.loaded
+        await suggester._loading
+        return started_loaded, suggester.loaded, suggester.suggest("dol")
+
+    started_loaded, loaded, suggestions = asyncio.run(run())
+    assert not started_loaded
+    assert loaded
+    assert suggestions == [{"id": "0", "name": "Dolex Forte"}]
+
+def _loaded(names=NAMES) -> ProductSuggester:
+    suggester = ProductSuggester()
+    asyncio.run(suggester.ensure_loaded(_snapshot(names)))
+    return suggester
+
+def _names(suggestions):
+    return [suggestion["name"] for suggestion in suggestions]
+
+def test_prefix_ignores_case_and_accents():
+    suggester = _loaded()
+    assert _names(suggester.suggest("IBU")) == ["Ibuprofeno 400 mg", "Ibuprofeno 800 mg"]
+    assert _names(suggester.suggest("acetaminofen")) == ["Acetaminofén 500 mg"]
+
+def test_inner_word_is_an_entry_point():
+    assert _names(_loaded().suggest("forte")) == ["Dolex Forte"]
+
+def test_typo_falls_back_to_similar_words():
+    assert _names(_loaded().suggest("ibuprofno")) == ["Ibuprofeno 400 mg", "Ibuprofeno 800 mg"]
+    assert _loaded().suggest("zzzz") == []
+
+def test_limit():
+    assert len(_loaded().suggest("ibu", limit=1)) == 1
+
+def test_product_changes_are_applied_incrementally():
+    suggester = _loaded()
+    suggester.apply([
+        catalog_events.ProductChange("4", "Dolex Gripa", "over_counter", True, False),
+        catalog_events.ProductChange("0", None, None, True, True),
+        # Un cambio solo de stock no toca el índice
+        catalog_events.ProductChange("1", None, None, True, False, stock_only=True),
+    ])
+    assert _names(suggester.suggest("dolex")) == ["Dolex Gripa"]
+    assert _names(suggester.suggest("ibuprofeno 4")) == ["Ibuprofeno 400 mg"]
+
+def test_inactive_product_is_removed():
+    suggester = _loaded()
+    suggester.apply([catalog_events.ProductChange("1", "Ibuprofeno 400 mg", "over_counter", False, False)])
+    assert _names(suggester.suggest("ibu")) == ["Ibuprofeno 800 mg"]
@@ -1,27 +1,11 @@
 # verify-admin.py
 import asyncio
 import hashlib
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
-from pathlib import Path
-from dotenv import load_dotenv
 
-# Cargar variables de entorno (igual que en server.py)
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+import sync_mode
+sync_mode.use_sync_engine()
 
-# MySQL connection (igual que en server.py)
-MYSQL_USER = os.environ.get('MYSQL_USER', 'root')
-MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', 'Cod1029144695')
-MYSQL_HOST = os.environ.get('MYSQL_HOST', 'localhost')
-MYSQL_PORT = os.environ.get('MYSQL_PORT', '3306')
-MYSQL_DB = os.environ.get('MYSQL_DB', 'farmachelo_db')
-
-# Crear engine de SQLAlchemy (igual que en server.py)
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from database import SessionLocal
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
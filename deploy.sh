@@ -37,7 +37,11 @@ Próximos pasos:
    sudo a2enmod proxy_http
    sudo a2enmod rewrite
    sudo systemctl restart apache2
-4. Inicia el backend en segundo plano con uvicorn:
+4. Aplica las migraciones de la base de datos (y, solo la primera vez, los datos iniciales):
+   cd /var/www/farmachelo-ubuntu
+   python -m backend.migrate upgrade
+   python -m backend.seed
+5. Inicia el backend en segundo plano con uvicorn:
    cd /var/www/farmachelo-ubuntu/backend
    uvicorn server:app --host 0.0.0.0 --port 8000 &
    (Para producción real, considera usar un servicio systemd para uvicorn)
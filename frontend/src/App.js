@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { BrowserRouter, Routes, Route } from 'react-router-dom';
 import axios from 'axios';
 import './App.css';
@@ -129,6 +129,10 @@ const App = () => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(null);
   const [products, setProducts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [productFilters, setProductFilters] = useState({ search: '', category: 'all' });
+  const [suggestions, setSuggestions] = useState([]);
+  const productsRequest = useRef(0);
   const [cart, setCart] = useState(null);
   const [showCart, setShowCart] = useState(false);
   const [showAuth, setShowAuth] = useState(false);
@@ -151,18 +155,43 @@ const App = () => {
     setLoading(false);
   }, []);
 
-  useEffect(() => {
-    const loadProducts = async () => {
-      try {
-        const response = await axios.get(`${API}/products`);
-        setProducts(response.data);
-      } catch (error) {
-        console.error('Error cargando productos:', error);
-      }
-    };
+  // Catálogo paginado por cursor: se muestra la primera página y el resto se pide bajo demanda.
+  // Búsqueda y categoría las resuelve el backend sobre todo el catálogo, no solo sobre lo ya cargado
+  const loadProducts = async (cursor = null) => {
+    const requestId = ++productsRequest.current;
+    const params = {};
+    if (cursor) params.cursor = cursor;
+    if (productFilters.search) params.search = productFilters.search;
+    if (productFilters.category !== 'all') params.category = productFilters.category;
+    try {
+      const response = await axios.get(`${API}/products`, { params });
+      // Una respuesta de filtros anteriores que llega tarde no pisa la actual
+      if (requestId !== productsRequest.current) return;
+      setProducts(prev => (cursor ? prev.concat(response.data) : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error cargando productos:', error);
+    }
+  };
 
+  // Al cambiar la búsqueda o la categoría se vuelve a la primera página (el cursor anterior no aplica)
+  useEffect(() => {
+    setNextCursor(null);
     loadProducts();
-  }, []);
+  }, [productFilters]);
+
+  const loadSuggestions = async (query) => {
+    if (query.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    try {
+      const response = await axios.get(`${API}/products/suggest`, { params: { q: query, limit: 8 } });
+      setSuggestions(response.data);
+    } catch (error) {
+      console.error('Error cargando sugerencias:', error);
+    }
+  };
 
   useEffect(() => {
     if (user && token) {
@@ -328,6 +357,12 @@ const App = () => {
               products={products} 
               onAddToCart={handleAddToCart}
               user={user}
+              hasMore={Boolean(nextCursor)}
+              onLoadMore={() => loadProducts(nextCursor)}
+              filters={productFilters}
+              onFiltersChange={setProductFilters}
+              suggestions={suggestions}
+              onSearchInput={loadSuggestions}
             />
 
             {/* Sección de categorías */}
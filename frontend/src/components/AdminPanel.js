@@ -4,6 +4,7 @@ const AdminPanel = ({ onBack }) => {
   const [admin, setAdmin] = useState(null);
   const [token, setToken] = useState(localStorage.getItem('token'));
   const [products, setProducts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [showLogin, setShowLogin] = useState(!token);
   const [showProductModal, setShowProductModal] = useState(false);
@@ -156,13 +157,15 @@ const verifyToken = async () => {
     }
   };
 
-  const loadProducts = async () => {
+  // Primera página del catálogo; las siguientes se piden con "Cargar más" (X-Next-Cursor)
+  const loadProducts = async (cursor = null) => {
     try {
-      const response = await fetch(`${API_BASE}/products`);
-      if (response.ok) {
-        const productsData = await response.json();
-        setProducts(productsData);
-      }
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${API_BASE}/products${query}`);
+      if (!response.ok) return;
+      const productsData = await response.json();
+      setProducts(prev => (cursor ? prev.concat(productsData) : productsData));
+      setNextCursor(response.headers.get('X-Next-Cursor'));
     } catch (error) {
       console.error('Error loading products:', error);
     }
@@ -510,6 +513,23 @@ const verifyToken = async () => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div style={{textAlign: 'center', marginTop: '1.5rem'}}>
+                <button 
+                  onClick={() => loadProducts(nextCursor)}
+                  style={{
+                    padding: '0.5rem 1.25rem', 
+                    background: '#3b82f6', 
+                    color: 'white', 
+                    border: 'none', 
+                    borderRadius: '6px', 
+                    cursor: 'pointer'
+                  }}
+                >
+                  ⬇️ Cargar más productos
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -1,16 +1,26 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import ProductCard from './ProductCard';
 
-const ProductCatalog = ({ products, onAddToCart, user }) => {
-  const [searchTerm, setSearchTerm] = useState('');
-  const [selectedCategory, setSelectedCategory] = useState('all');
+const SEARCH_DEBOUNCE_MS = 300;
 
-  const filteredProducts = products.filter(product => {
-    const matchesSearch = product.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         product.description.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesCategory = selectedCategory === 'all' || product.category === selectedCategory;
-    return matchesSearch && matchesCategory && product.active;
-  });
+const ProductCatalog = ({
+  products, onAddToCart, user, hasMore, onLoadMore, filters, onFiltersChange, suggestions, onSearchInput
+}) => {
+  const [searchTerm, setSearchTerm] = useState(filters.search);
+
+  // La búsqueda va al backend (todo el catálogo): se espera a que el usuario deje de escribir
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      const search = searchTerm.trim();
+      onFiltersChange(prev => (prev.search === search ? prev : { ...prev, search }));
+    }, SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const handleSearchChange = (value) => {
+    setSearchTerm(value);
+    onSearchInput(value);
+  };
 
   const categories = [
     { value: 'all', label: 'Todos los productos' },
@@ -30,16 +40,23 @@ const ProductCatalog = ({ products, onAddToCart, user }) => {
               type="text"
               placeholder="Buscar productos..."
               value={searchTerm}
-              onChange={(e) => setSearchTerm(e.target.value)}
+              onChange={(e) => handleSearchChange(e.target.value)}
               className="search-input"
+              list="product-suggestions"
             />
+            {/* Autocompletado desde /products/suggest */}
+            <datalist id="product-suggestions">
+              {suggestions.map(suggestion => (
+                <option key={suggestion.id} value={suggestion.name} />
+              ))}
+            </datalist>
             <span className="search-icon">🔍</span>
           </div>
           
           <div className="category-filter">
             <select
-              value={selectedCategory}
-              onChange={(e) => setSelectedCategory(e.target.value)}
+              value={filters.category}
+              onChange={(e) => onFiltersChange(prev => ({ ...prev, category: e.target.value }))}
               className="category-select"
             >
               {categories.map(category => (
@@ -53,12 +70,12 @@ const ProductCatalog = ({ products, onAddToCart, user }) => {
 
         {/* Grid de productos */}
         <div className="products-grid">
-          {filteredProducts.length === 0 ? (
+          {products.length === 0 ? (
             <div className="no-products">
               <p>No se encontraron productos con los filtros seleccionados.</p>
             </div>
           ) : (
-            filteredProducts.map(product => (
+            products.map(product => (
               <ProductCard
                 key={product.id}
                 product={product}
@@ -68,6 +85,15 @@ const ProductCatalog = ({ products, onAddToCart, user }) => {
             ))
           )}
         </div>
+
+        {/* Siguiente página del catálogo (X-Next-Cursor) */}
+        {hasMore && (
+          <div className="catalog-load-more">
+            <button className="btn load-more-button" onClick={onLoadMore}>
+              Cargar más productos
+            </button>
+          </div>
+        )}
       </div>
     </section>
   );
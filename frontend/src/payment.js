@@ -14,6 +14,7 @@ const API_CONFIG = {
   endpoints: {
     login: "/auth/login",
     payment: "/payments/process",
+    createIntent: "/payments/create-intent",
     validateCard: "/payments/validate-card",
     getOrderSummary: "/orders/summary",
   },
@@ -72,23 +73,47 @@ class FormHandler {
 
   async processPayment(paymentData) {
     try {
-      const response = await fetch(`${API_CONFIG.baseURL}/payments/create-intent`, {
+      const headers = {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${this.getAuthToken()}`
+      }
+      // 1) El backend congela importe, moneda y versión del carrito
+      const intentResponse = await fetch(`${API_CONFIG.baseURL}${API_CONFIG.endpoints.createIntent}`, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${this.getAuthToken()}`
-        },
+        headers,
         body: JSON.stringify({
           amount: paymentData.amount,
-          currency: paymentData.currency,
-          cart: this.orderManager.items || []
+          currency: paymentData.currency
+        })
+      })
+      const intent = await intentResponse.json()
+      if (!intentResponse.ok) {
+        return { success: false, error: intent.detail || "Error al crear el intento de pago" }
+      }
+      // 2) El cobro se valida contra ese intento
+      const response = await fetch(`${API_CONFIG.baseURL}${API_CONFIG.endpoints.payment}`, {
+        method: 'POST',
+        // Un reintento del mismo intento recibe la respuesta ya guardada en vez de cobrar otra vez
+        headers: { ...headers, 'Idempotency-Key': intent.id },
+        body: JSON.stringify({
+          email: paymentData.email,
+          card: {
+            cardNumber: paymentData.cardNumber,
+            expiryDate: paymentData.expiryDate,
+            cvv: paymentData.cvv,
+            cardholderName: paymentData.cardholderName,
+            country: paymentData.country
+          },
+          amount: intent.amount,
+          currency: intent.currency,
+          payment_intent_id: intent.id
         })
       })
       const data = await response.json()
       if (!response.ok) {
-        return { success: false, error: data.detail || "Error al crear el intento de pago" }
+        return { success: false, error: data.detail || "Error al procesar el pago" }
       }
-      return { success: true, clientSecret: data.clientSecret, message: 'PaymentIntent creado. Integra Stripe.js aquí.' }
+      return data
     } catch (error) {
       console.error("Payment processing error:", error)
       return { success: false, error: "Error de conexión con el servidor" }